@@ -0,0 +1 @@
+"""Lets the tests import the app's modules when pytest runs from the repository root."""
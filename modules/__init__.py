@@ -10,6 +10,8 @@ MODELS_STORAGE_PATH = "data/models.json"
 API_KEYS_STORAGE_PATH = "data/api_keys.json"
 SECRET_KEY_PATH = "secret.key"
 CHAIN_STORAGE_PATH = "data/chains.json"
+RESPONSE_CACHE_PATH = "data/response_cache.sqlite"
+HTTP_SETTINGS_PATH = "data/http_settings.json"
 
 
 class AbstractWidget(QWidget):
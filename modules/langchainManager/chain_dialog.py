@@ -1,9 +1,12 @@
 from PyQt6.QtWidgets import (
     QDialog, QFormLayout, QLineEdit, QComboBox,
-    QPushButton, QHBoxLayout, QMessageBox, QLabel
+    QPushButton, QHBoxLayout, QMessageBox, QLabel, QSpinBox, QDoubleSpinBox
 )
 from PyQt6.QtCore import Qt
 
+from modules.llmRunner.hedging import DEFAULT_HEDGE_MAX_PERCENT
+from modules.llmRunner.packing import DEFAULT_PACK_ROW_TOKENS
+
 
 class ChainDialog(QDialog):
     def __init__(self, parent=None, title="Create/Edit Chain", chain_data=None, prompts=None, models=None,
@@ -37,12 +40,57 @@ class ChainDialog(QDialog):
         self.model_combo.setCurrentText(self.chain_data.get("model_name", ""))
         layout.addRow("Select Model:", self.model_combo)
 
+        # Fallback Models
+        self.fallback_models_input = QLineEdit()
+        self.fallback_models_input.setText(", ".join(self.chain_data.get("fallback_models", [])))
+        self.fallback_models_input.setPlaceholderText("Optional, e.g. backup_model, other_model")
+        self.fallback_models_input.setToolTip("Models tried in order when the selected model is failing or too slow.")
+        layout.addRow("Fallback Models:", self.fallback_models_input)
+
         # Output Parser Selection
         self.output_parser_combo = QComboBox()
         self.output_parser_combo.addItems(self.output_parsers)
         self.output_parser_combo.setCurrentText(self.chain_data.get("output_parser", ""))
         layout.addRow("Select Output Parser:", self.output_parser_combo)
 
+        # Row Packing
+        self.pack_size_input = QSpinBox()
+        self.pack_size_input.setRange(1, 50)
+        self.pack_size_input.setValue(int(self.chain_data.get("pack_size", 1)))
+        self.pack_size_input.setToolTip("Short rows sent together in one request, so the system prompt is paid "
+                                        "once per pack. Packs that come back mismatched are resent row by row.")
+        layout.addRow("Rows per Request (1 = no packing):", self.pack_size_input)
+
+        self.pack_row_tokens_input = QSpinBox()
+        self.pack_row_tokens_input.setRange(1, 100000)
+        self.pack_row_tokens_input.setValue(int(self.chain_data.get("pack_row_tokens", DEFAULT_PACK_ROW_TOKENS)))
+        self.pack_row_tokens_input.setToolTip("Rows whose values are longer than this, not counting the prompt "
+                                              "template, are always sent alone.")
+        layout.addRow("Pack Rows with Values up to (tokens):", self.pack_row_tokens_input)
+
+        # Request Hedging
+        self.hedge_percentile_input = QSpinBox()
+        self.hedge_percentile_input.setRange(0, 99)
+        self.hedge_percentile_input.setValue(int(self.chain_data.get("hedge_percentile", 0)))
+        self.hedge_percentile_input.setToolTip("A request running longer than this percentile of recent requests "
+                                               "gets a second copy; the first answer wins. 0 = no hedging.")
+        layout.addRow("Hedge Requests Slower than Percentile:", self.hedge_percentile_input)
+
+        self.hedge_max_percent_input = QDoubleSpinBox()
+        self.hedge_max_percent_input.setRange(0, 100)
+        self.hedge_max_percent_input.setSingleStep(1)
+        self.hedge_max_percent_input.setValue(float(self.chain_data.get("hedge_max_percent",
+                                                                        DEFAULT_HEDGE_MAX_PERCENT)))
+        self.hedge_max_percent_input.setToolTip("Hedged copies are capped at this share of all requests.")
+        layout.addRow("Max Hedged Requests (%):", self.hedge_max_percent_input)
+
+        self.request_deadline_input = QSpinBox()
+        self.request_deadline_input.setRange(0, 3600)
+        self.request_deadline_input.setValue(int(self.chain_data.get("request_deadline", 0)))
+        self.request_deadline_input.setToolTip("Seconds after which a request, hedged copy included, fails and "
+                                               "is retried. 0 = no deadline.")
+        layout.addRow("Request Deadline (s, 0 = none):", self.request_deadline_input)
+
         # Buttons
         button_layout = QHBoxLayout()
         self.save_button = QPushButton("Save")
@@ -76,13 +124,26 @@ class ChainDialog(QDialog):
         if not output_parser:
             QMessageBox.warning(self, "Input Error", "Please select an Output Parser.")
             return
+        unknown_models = [name for name in self.get_fallback_models() if name not in self.models]
+        if unknown_models:
+            QMessageBox.warning(self, "Input Error", f"Unknown fallback models: {', '.join(unknown_models)}")
+            return
 
         self.accept()
 
+    def get_fallback_models(self):
+        return [name.strip() for name in self.fallback_models_input.text().split(",") if name.strip()]
+
     def get_chain_data(self):
         return {
             "chain_name": self.chain_name_input.text().strip(),
             "prompt_name": self.prompt_combo.currentText().strip(),
             "model_name": self.model_combo.currentText().strip(),
-            "output_parser": self.output_parser_combo.currentText().strip()
+            "fallback_models": self.get_fallback_models(),
+            "output_parser": self.output_parser_combo.currentText().strip(),
+            "pack_size": self.pack_size_input.value(),
+            "pack_row_tokens": self.pack_row_tokens_input.value(),
+            "hedge_percentile": self.hedge_percentile_input.value(),
+            "hedge_max_percent": self.hedge_max_percent_input.value(),
+            "request_deadline": self.request_deadline_input.value()
         }
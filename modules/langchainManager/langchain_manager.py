@@ -1,5 +1,7 @@
 from modules import *
 from modules.langchainManager.chain_dialog import ChainDialog
+from modules.llmRunner.hedging import DEFAULT_HEDGE_MAX_PERCENT
+from modules.llmRunner.packing import DEFAULT_PACK_ROW_TOKENS
 from modules.promptManager.prompt_manager import PROMPTS_STORAGE_PATH
 from modules.modelManager.model_manager import MODELS_STORAGE_PATH, API_KEYS_STORAGE_PATH
 
@@ -110,6 +112,15 @@ class LangchainManagerWidget(AbstractWidget):
         # Fetch Model Details
         model_details = self.get_model_details(model_name)
 
+        pack_size = chain.get("pack_size", 1)
+        packing = (f"up to {pack_size} rows with at most {chain.get('pack_row_tokens', DEFAULT_PACK_ROW_TOKENS)} "
+                   f"tokens of values per request" if pack_size > 1 else "Off")
+        hedge_percentile = chain.get("hedge_percentile", 0)
+        hedging = (f"requests slower than p{hedge_percentile}, at most "
+                   f"{chain.get('hedge_max_percent', DEFAULT_HEDGE_MAX_PERCENT):g}% of requests"
+                   if hedge_percentile else "Off")
+        deadline = f"{chain['request_deadline']}s" if chain.get("request_deadline") else "None"
+
         # Format the details
         details = (
             f"<h2>Chain Name:</h2> {chain_name}<br><br>"
@@ -124,7 +135,13 @@ class LangchainManagerWidget(AbstractWidget):
             f"<b>Name:</b> {model_name}<br>"
             f"<b>Type:</b> {model_details.get('type', 'N/A')}<br>"
             f"<b>LLM Model:</b> {model_details.get('llm_model', 'N/A')}<br>"
-            f"<b>API Key Name:</b> {model_details.get('api_key_name', 'N/A')}<br><br>"
+            f"<b>API Key Name:</b> {model_details.get('api_key_name', 'N/A')}<br>"
+            f"<b>Rate Limits:</b> {model_details.get('rpm', 0) or 'unlimited'} RPM, "
+            f"{model_details.get('tpm', 0) or 'unlimited'} TPM<br>"
+            f"<b>Fallback Models:</b> {', '.join(chain.get('fallback_models', [])) or 'None'}<br>"
+            f"<b>Packing:</b> {packing}<br>"
+            f"<b>Hedging:</b> {hedging}<br>"
+            f"<b>Request Deadline:</b> {deadline}<br><br>"
             f"<h3>Output Parser:</h3> {output_parser}"
         )
 
@@ -179,7 +196,7 @@ class LangchainManagerWidget(AbstractWidget):
             return
 
         # Define hardcoded output parsers
-        output_parsers = ["StrOutputParser", "CustomParser"]
+        output_parsers = ["StrOutputParser", "AnalysisDictParser", "CustomParser"]
 
         dialog = ChainDialog(
             self,
@@ -205,6 +222,16 @@ class LangchainManagerWidget(AbstractWidget):
                 "model_name": model_name,
                 "output_parser": output_parser
             }
+            if chain_data['fallback_models']:
+                self.chains[chain_name]["fallback_models"] = chain_data['fallback_models']
+            if chain_data['pack_size'] > 1:
+                self.chains[chain_name]["pack_size"] = chain_data['pack_size']
+                self.chains[chain_name]["pack_row_tokens"] = chain_data['pack_row_tokens']
+            if chain_data['hedge_percentile'] > 0:
+                self.chains[chain_name]["hedge_percentile"] = chain_data['hedge_percentile']
+                self.chains[chain_name]["hedge_max_percent"] = chain_data['hedge_max_percent']
+            if chain_data['request_deadline'] > 0:
+                self.chains[chain_name]["request_deadline"] = chain_data['request_deadline']
             self.save_chains()
             self.populate_chain_list()
             QMessageBox.information(self, "Success", f"Chain '{chain_name}' created successfully.")
@@ -219,7 +246,7 @@ class LangchainManagerWidget(AbstractWidget):
         chain = self.chains.get(chain_name, {})
 
         # Define hardcoded output parsers
-        output_parsers = ["StrOutputParser", "CustomParser"]
+        output_parsers = ["StrOutputParser", "AnalysisDictParser", "CustomParser"]
 
         dialog = ChainDialog(
             self,
@@ -228,7 +255,13 @@ class LangchainManagerWidget(AbstractWidget):
                 "chain_name": chain_name,
                 "prompt_name": chain.get("prompt_name", ""),
                 "model_name": chain.get("model_name", ""),
-                "output_parser": chain.get("output_parser", "")
+                "fallback_models": chain.get("fallback_models", []),
+                "output_parser": chain.get("output_parser", ""),
+                "pack_size": chain.get("pack_size", 1),
+                "pack_row_tokens": chain.get("pack_row_tokens", DEFAULT_PACK_ROW_TOKENS),
+                "hedge_percentile": chain.get("hedge_percentile", 0),
+                "hedge_max_percent": chain.get("hedge_max_percent", DEFAULT_HEDGE_MAX_PERCENT),
+                "request_deadline": chain.get("request_deadline", 0)
             },
             prompts=self.prompts,
             models=self.models,
@@ -253,6 +286,16 @@ class LangchainManagerWidget(AbstractWidget):
                 "model_name": new_model_name,
                 "output_parser": new_output_parser
             }
+            if updated_data['fallback_models']:
+                self.chains[new_chain_name]["fallback_models"] = updated_data['fallback_models']
+            if updated_data['pack_size'] > 1:
+                self.chains[new_chain_name]["pack_size"] = updated_data['pack_size']
+                self.chains[new_chain_name]["pack_row_tokens"] = updated_data['pack_row_tokens']
+            if updated_data['hedge_percentile'] > 0:
+                self.chains[new_chain_name]["hedge_percentile"] = updated_data['hedge_percentile']
+                self.chains[new_chain_name]["hedge_max_percent"] = updated_data['hedge_max_percent']
+            if updated_data['request_deadline'] > 0:
+                self.chains[new_chain_name]["request_deadline"] = updated_data['request_deadline']
             self.save_chains()
             self.populate_chain_list()
             QMessageBox.information(self, "Success", f"Chain '{new_chain_name}' updated successfully.")
@@ -0,0 +1,232 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.output_parsers import StrOutputParser
+
+from modules.llmRunner.concurrency import AdaptiveConcurrency
+from modules.llmRunner.hedging import HedgePolicy
+from modules.llmRunner.key_pool import RATE_LIMITED, classify_error, retry_after_seconds
+from modules.llmRunner.rate_limiter import estimate_tokens
+from modules.llmRunner.routing import ModelRouter
+from modules.llmRunner.response_cache import ResponseCache, cache_key
+
+# Output tokens budgeted per request on top of the prompt estimate
+EXPECTED_RESPONSE_TOKENS = 100
+
+# Model clients return messages; their text is what gets parsed and cached
+TEXT_OUTPUT = StrOutputParser()
+
+
+class RequestCancelled(Exception):
+    """A request given up because the run was stopped; its row is left for the next run."""
+
+
+class TokenUsage:
+    """Input, cached input and output tokens as reported by the provider for a run's responses."""
+
+    def __init__(self):
+        self.responses = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, input_tokens: int, cached_tokens: int, output_tokens: int):
+        self.responses += 1
+        self.input_tokens += int(input_tokens or 0)
+        self.cached_tokens += int(cached_tokens or 0)
+        self.output_tokens += int(output_tokens or 0)
+
+    def add_message(self, message: Any):
+        """Record the `usage_metadata` of a chat model response, when the provider sent usage."""
+        usage = getattr(message, 'usage_metadata', None)
+        if not usage:
+            return
+        details = usage.get('input_token_details') or {}
+        self.add(usage.get('input_tokens', 0), details.get('cache_read', 0), usage.get('output_tokens', 0))
+
+    def cached_percent(self) -> float:
+        return 100.0 * self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+    def describe(self) -> str:
+        return (f"input tokens {self.input_tokens} ({self.cached_percent():.0f}% cached), "
+                f"output tokens {self.output_tokens}")
+
+
+class AsyncRequestEngine:
+    """Issues model requests on an asyncio loop under one global in-flight limit.
+
+    A single engine is shared by every chunk and file of a run, so the number of
+    outstanding requests stays steady instead of draining at chunk boundaries.
+    With `adaptive_concurrency` the limit follows rate limits and latency, up
+    to `max_concurrency`. Slow requests are hedged and bounded by deadlines as
+    set by `hedging`.
+    """
+
+    def __init__(self, router: ModelRouter, max_concurrency: int,
+                 cache: ResponseCache = None, model_config: Dict[str, Any] = None,
+                 adaptive_concurrency: bool = False, notify: Callable[[str], None] = None,
+                 hedging: HedgePolicy = None):
+        self.router = router
+        self.hedging = hedging or HedgePolicy()
+        self.cache = cache
+        self.model_config = model_config or {}
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.concurrency = AdaptiveConcurrency(self.max_concurrency, adaptive=adaptive_concurrency, notify=notify)
+        self.pending = {}
+        self.in_flight = 0
+        self.completed = 0
+        self.collapsed = 0
+        self.usage = TokenUsage()
+        # Request attempts under way, and those of them already waiting on the provider
+        self.attempts = set()
+        self.sending = set()
+        self.stopping = set()
+        self.accepting = True
+        self.cancelled = 0
+
+    async def invoke(self, messages, refresh: bool = False, tokens: int = 0,
+                     packed: bool = False) -> Tuple[Any, Optional[str]]:
+        """Return the response for `messages` and the model that produced it, from the cache when possible.
+
+        Identical requests already in flight share one call, with or without the
+        cache. `refresh` skips the cached copy (e.g. after it failed to parse) and
+        overwrites it. `tokens` is the prompt size when already counted; otherwise
+        it is estimated. `packed` requests hold several rows and ask for the packed
+        output format.
+        """
+        key = cache_key(self.model_config, messages)
+        if not refresh:
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                return cached
+            if key in self.pending:
+                self.collapsed += 1
+                return await asyncio.shield(self.pending[key])
+
+        future = asyncio.ensure_future(self.send(messages, tokens, packed))
+        self.pending[key] = future
+        future.add_done_callback(lambda done: self._store(key, done))
+        return await asyncio.shield(future)
+
+    def _store(self, key: str, future: asyncio.Future):
+        if self.pending.get(key) is future:
+            del self.pending[key]
+        if self.cache is None or future.cancelled() or future.exception() is not None:
+            return
+        result, model_name = future.result()
+        if isinstance(result, str):
+            self.cache.put(key, result, model_name)
+
+    async def send(self, messages, tokens: int = 0, packed: bool = False) -> Tuple[Any, str]:
+        """Send one request, with a second copy if it runs long and within its deadline when these are set."""
+        request_tokens = (tokens or estimate_tokens(messages)) + EXPECTED_RESPONSE_TOKENS
+        if not self.hedging.enabled:
+            return await self.send_once(messages, request_tokens, packed)
+        return await self.hedging.run(lambda: self.send_once(messages, request_tokens, packed))
+
+    def cancel_requests(self, drain: bool = False):
+        """Stop sending: cancel every request under way, or with `drain` only those not yet sent to the provider.
+
+        Cancelled requests raise RequestCancelled to their callers. Must be called on the engine's event loop.
+        """
+        self.accepting = False
+        for task in list(self.attempts):
+            if drain and task in self.sending:
+                continue
+            self.stopping.add(task)
+            task.cancel()
+
+    async def send_once(self, messages, request_tokens: int, packed: bool = False) -> Tuple[Any, str]:
+        if not self.accepting:
+            raise RequestCancelled("Request not sent because the run was stopped.")
+        task = asyncio.current_task()
+        self.attempts.add(task)
+        try:
+            return await self._send_attempt(messages, request_tokens, packed, task)
+        except asyncio.CancelledError:
+            if task not in self.stopping:
+                raise
+            # The caller (often a pipeline worker) carries on and records the row as not done;
+            # before Python 3.11 a task keeps no cancellation count to undo
+            if hasattr(task, 'uncancel'):
+                task.uncancel()
+            self.cancelled += 1
+            raise RequestCancelled("Request cancelled because the run was stopped.") from None
+        finally:
+            self.attempts.discard(task)
+            self.stopping.discard(task)
+
+    async def _send_attempt(self, messages, request_tokens: int, packed: bool, task: asyncio.Task) -> Tuple[Any, str]:
+        """Send one request to the first healthy model once an API key and a slot in the global budget are free.
+
+        The slot is taken after the key, so a request waiting for a cooling or paced
+        key does not hold one that requests to other keys could use.
+        """
+        route = await self.router.select(request_tokens)
+        key = None
+        try:
+            while True:
+                key = await route.key_pool.acquire(request_tokens)
+                await self.concurrency.acquire()
+                if key.cooling_seconds() == 0:
+                    break
+                # The key was taken out of rotation while this request waited for a slot
+                self.concurrency.release()
+                route.key_pool.give_back(key)
+                key = None
+        except BaseException:
+            if key is not None:
+                route.key_pool.give_back(key)
+            route.breaker.abandon()
+            raise
+        self.in_flight += 1
+        self.sending.add(task)
+        started = time.monotonic()
+        try:
+            message = await (key.pack_chain if packed else key.chain).ainvoke(messages)
+            self.usage.add_message(message)
+            result = TEXT_OUTPUT.invoke(message)
+        except Exception as e:
+            route.key_pool.release(key, e)
+            # Rate limits are a quota matter handled by the key pool, not a sign of an unhealthy model
+            if classify_error(e) == RATE_LIMITED:
+                route.breaker.abandon()
+                self.concurrency.on_rate_limit(retry_after_seconds(e))
+            else:
+                self.router.record(route, False, time.monotonic() - started)
+            raise
+        except BaseException:
+            route.key_pool.release(key)
+            route.breaker.abandon()
+            raise
+        else:
+            route.key_pool.release(key)
+            self.router.record(route, True, time.monotonic() - started)
+            self.concurrency.on_success(time.monotonic() - started)
+            return result, route.name
+        finally:
+            self.in_flight -= 1
+            self.sending.discard(task)
+            self.completed += 1
+            self.concurrency.release()
+
+    def stats(self) -> str:
+        stats = f"in flight {self.in_flight}/{self.concurrency.current}, completed {self.completed}"
+        if self.concurrency.adaptive:
+            stats += f", {self.concurrency.stats()}"
+        if self.usage.responses:
+            stats += f", {self.usage.describe()}"
+        if self.router.enabled:
+            stats += f", rate limit wait {self.router.wait_seconds:.1f}s"
+        if len(self.router.routes) > 1:
+            stats += f", {self.router.stats()}"
+        for route in self.router.routes:
+            if len(route.key_pool.keys) > 1:
+                stats += f", {route.name} {route.key_pool.stats()}"
+        if self.hedging.enabled:
+            stats += f", {self.hedging.stats()}"
+        if self.cache is not None:
+            stats += f", {self.cache.stats()}"
+        stats += f", collapsed {self.collapsed}"
+        return stats
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+REALTIME_MODE = "Real-time"
+BATCH_MODE = "Batch job"
+EXECUTION_MODES = [REALTIME_MODE, BATCH_MODE]
+
+# Provider limits for one batch input file
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_BYTES = 190 * 1024 ** 2
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# Status polling starts fast so small jobs come back quickly, then backs off
+POLL_INITIAL_SECONDS = 2
+POLL_MAX_SECONDS = 60
+# Polling gives up on a job after this many failures in a row, or at once on these statuses
+MAX_POLL_FAILURES = 5
+POLL_FATAL_STATUS_CODES = (401, 403, 404)
+
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+ROLES = {'system': 'system', 'human': 'user', 'ai': 'assistant'}
+
+
+def make_custom_id(file_name: str, row_id: int) -> str:
+    return f"{file_name}|{row_id}"
+
+
+def parse_custom_id(custom_id: str) -> Tuple[str, int]:
+    file_name, row_id = custom_id.rsplit('|', 1)
+    return file_name, int(row_id)
+
+
+def request_line(custom_id: str, model_config: Dict[str, Any], messages: List[Any],
+                 response_format: Optional[Dict[str, Any]] = None) -> str:
+    """One line of a batch input file: the chat completion request for a rendered row."""
+    body = {
+        'model': model_config['type'],
+        'messages': [{'role': ROLES.get(message.type, message.type), 'content': message.content}
+                     for message in messages],
+    }
+    for name in ('temperature', 'top_p', 'max_tokens', 'seed'):
+        if name in model_config:
+            body[name] = model_config[name]
+    if response_format:
+        body['response_format'] = response_format
+    line = {'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body}
+    return json.dumps(line, ensure_ascii=False) + '\n'
+
+
+def response_text(line: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """(content, error) of one line of a batch output or error file."""
+    if line.get('error'):
+        return None, str(line['error'].get('message', line['error']))
+    response = line.get('response') or {}
+    if response.get('status_code') != 200:
+        body = response.get('body') or {}
+        return None, str(body.get('error', {}).get('message', f"HTTP {response.get('status_code')}"))
+    return response['body']['choices'][0]['message']['content'], None
+
+
+def response_usage(line: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+    """(input, cached input, output) tokens of one line of a batch output file, if it reports usage."""
+    usage = ((line.get('response') or {}).get('body') or {}).get('usage')
+    if not usage:
+        return None
+    details = usage.get('prompt_tokens_details') or {}
+    return usage.get('prompt_tokens', 0), details.get('cached_tokens', 0), usage.get('completion_tokens', 0)
+
+
+class BatchJobStore:
+    """Batch jobs submitted but not yet merged, kept in the output directory so a restart picks them up."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.jobs = json.load(f)
+
+    def add(self, batch_id: str, request_count: int):
+        self.jobs[batch_id] = {'requests': request_count, 'submitted': time.time()}
+        self._save()
+
+    def remove(self, batch_id: str):
+        if self.jobs.pop(batch_id, None) is not None:
+            self._save()
+
+    def _save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.jobs, f, indent=4)
+        os.replace(temp_path, self.path)
+
+
+class BatchClient:
+    """Submits, polls and downloads batch jobs through the provider's Files and Batches endpoints."""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, http_client=None):
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        # A shared HTTP client is closed by its owner
+        self.owns_http_client = http_client is None
+
+    async def submit(self, input_path: str, metadata: Dict[str, str]) -> str:
+        with open(input_path, 'rb') as f:
+            input_file = await self.client.files.create(file=(os.path.basename(input_path), f), purpose='batch')
+        batch = await self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                                 completion_window=COMPLETION_WINDOW, metadata=metadata)
+        return batch.id
+
+    async def retrieve(self, batch_id: str):
+        return await self.client.batches.retrieve(batch_id)
+
+    async def download(self, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not file_id:
+            return []
+        content = await self.client.files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+    async def results(self, batch) -> List[Dict[str, Any]]:
+        """Every output and error line of a finished batch; expired batches return what was completed."""
+        return await self.download(batch.output_file_id) + await self.download(batch.error_file_id)
+
+    async def close(self):
+        if self.owns_http_client:
+            await self.client.close()
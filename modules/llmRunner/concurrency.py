@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Mapping, Optional
+
+import numpy as np
+
+# The limit starts low and doubles every round trip until the first sign of congestion
+INITIAL_LIMIT = 4
+# After that it grows by one per round trip of requests at the limit ...
+INCREASE_STEP = 1.0
+# ... and is cut on every 429, or more gently when latency climbs
+RATE_LIMIT_DECREASE = 0.5
+LATENCY_DECREASE = 0.8
+# A p95 latency this many times the baseline counts as congestion
+LATENCY_TOLERANCE = 2.0
+# The baseline follows latency up slowly, so a lasting change (e.g. longer rows) is accepted
+BASELINE_DRIFT = 1.05
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+# Below this share of the provider's quota left in the current window, the limit stops growing
+LOW_QUOTA_FRACTION = 0.05
+QUOTA_KINDS = ('requests', 'tokens')
+
+
+def quota_fraction(headers: Mapping[str, str]) -> Optional[float]:
+    """Smallest share of the request or token quota left, from `x-ratelimit-*` headers."""
+    fractions = []
+    for kind in QUOTA_KINDS:
+        try:
+            remaining = float(headers[f'x-ratelimit-remaining-{kind}'])
+            limit = float(headers[f'x-ratelimit-limit-{kind}'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if limit > 0:
+            fractions.append(remaining / limit)
+    return min(fractions) if fractions else None
+
+
+class AdaptiveConcurrency:
+    """Limit on in-flight requests that adapts by additive increase and multiplicative decrease.
+
+    Growth only happens while requests actually fill the limit. A 429 halves it,
+    at most once per round trip, and `Retry-After` holds growth for that long. A
+    p95 latency well above the run's baseline cuts it more gently, and a nearly
+    spent quota in the `x-ratelimit-remaining-*` headers stops growth. The limit
+    stays between 1 and `max_limit`; with `adaptive` off it is fixed at `max_limit`.
+    """
+
+    def __init__(self, max_limit: int, adaptive: bool = True, notify: Callable[[str], None] = None):
+        self.max_limit = max(1, int(max_limit))
+        self.adaptive = adaptive
+        self.notify = notify or logging.info
+        self.limit = float(min(self.max_limit, INITIAL_LIMIT) if adaptive else self.max_limit)
+        self.slow_start = adaptive
+        self.in_use = 0
+        self.waiters = deque()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.baseline_p95 = None
+        self.samples_since_check = 0
+        self.last_decrease = 0.0
+        self.hold_until = 0.0
+        self.quota_low = False
+        self.decreases = 0
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    async def acquire(self):
+        while self.in_use >= self.current:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # A slot handed to a cancelled waiter goes to the next one
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+        self.in_use += 1
+
+    def release(self):
+        self.in_use -= 1
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self.release()
+
+    def _wake(self):
+        free = self.current - self.in_use
+        while free > 0 and self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def on_success(self, latency: float):
+        """A request finished in `latency` seconds; called before its slot is released."""
+        if not self.adaptive:
+            return
+        self.latencies.append(latency)
+        self.samples_since_check += 1
+        if self.samples_since_check >= max(MIN_LATENCY_SAMPLES, self.current) and self._check_latency():
+            return
+        # Growing past what is in use says nothing about whether the provider can take more
+        if self.in_use < self.current or self.quota_low or time.monotonic() < self.hold_until:
+            return
+        self.limit = min(float(self.max_limit), self.limit + (1.0 if self.slow_start else INCREASE_STEP / self.limit))
+        self._wake()
+
+    def _check_latency(self) -> bool:
+        """Cut the limit if p95 latency rose well above the baseline; True when it did."""
+        self.samples_since_check = 0
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return False
+        p95 = self.p95()
+        if self.baseline_p95 is None:
+            self.baseline_p95 = p95
+            return False
+        congested = p95 > LATENCY_TOLERANCE * self.baseline_p95
+        self.baseline_p95 = min(self.baseline_p95 * BASELINE_DRIFT, p95)
+        if congested:
+            self._decrease(LATENCY_DECREASE, f"p95 latency {p95:.1f}s")
+        return congested
+
+    def on_rate_limit(self, retry_after: Optional[float] = None):
+        if not self.adaptive:
+            return
+        if retry_after:
+            self.hold_until = max(self.hold_until, time.monotonic() + retry_after)
+        reason = f"rate limited, retry after {retry_after:.0f}s" if retry_after else "rate limited"
+        self._decrease(RATE_LIMIT_DECREASE, reason)
+
+    def observe_response(self, status_code: int, headers: Mapping[str, str]):
+        """Follow the quota left in the `x-ratelimit-*` headers of every HTTP response of the run.
+
+        429s are left to `on_rate_limit`, called by the engine for each one that fails a request.
+        """
+        if not self.adaptive or status_code == 429:
+            return
+        fraction = quota_fraction(headers)
+        if fraction is not None:
+            self.quota_low = fraction < LOW_QUOTA_FRACTION
+            if self.quota_low:
+                self.slow_start = False
+
+    def _round_trip(self) -> float:
+        return float(np.median(self.latencies)) if self.latencies else 1.0
+
+    def _decrease(self, factor: float, reason: str):
+        self.slow_start = False
+        now = time.monotonic()
+        # Responses to requests sent before the last cut reflect the old limit
+        if now - self.last_decrease < self._round_trip():
+            return
+        self.last_decrease = now
+        old = self.current
+        self.limit = max(1.0, float(int(self.limit * factor)))
+        if self.current < old:
+            self.decreases += 1
+            self.notify(f"Concurrency limit lowered {old} -> {self.current} ({reason}).")
+
+    def p95(self) -> float:
+        return float(np.percentile(self.latencies, 95)) if self.latencies else 0.0
+
+    def describe(self) -> str:
+        if not self.adaptive:
+            return f"fixed concurrency limit {self.max_limit}"
+        return f"adaptive concurrency limit starting at {self.current}, up to {self.max_limit}"
+
+    def stats(self) -> str:
+        stats = f"concurrency limit {self.current} of max {self.max_limit}"
+        if self.latencies:
+            stats += f", p95 latency {self.p95():.1f}s"
+        if self.quota_low:
+            stats += ", quota low"
+        return stats
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from modules.llmRunner.pipeline import RowJob, RowFailure
+
+# Finished results remembered for duplicates showing up in later chunks or files
+DEFAULT_MAX_FINISHED = 200000
+
+LEADER = 'leader'
+FOLLOWER = 'follower'
+FINISHED = 'finished'
+
+
+class RowDeduplicator:
+    """Exact deduplication of rendered requests across chunks and files.
+
+    The first row with a given request key is sent to the model; identical rows
+    arriving while it is in flight wait on it, and identical rows arriving later
+    reuse its result from a bounded in-memory table.
+    """
+
+    def __init__(self, max_finished: int = DEFAULT_MAX_FINISHED):
+        self.max_finished = max_finished
+        self.in_flight: Dict[str, RowJob] = {}
+        self.finished: OrderedDict = OrderedDict()
+        self.followers: Dict[str, List[RowJob]] = {}
+
+    def claim(self, job: RowJob) -> str:
+        """Register a job and say whether it must be sent, waits on a leader, or is already answered."""
+        if job.key in self.finished:
+            self.finished.move_to_end(job.key)
+            return FINISHED
+        if job.key in self.in_flight:
+            self.followers[job.key].append(job)
+            return FOLLOWER
+        self.in_flight[job.key] = job
+        self.followers[job.key] = []
+        return LEADER
+
+    def remember(self, key: str, result: Any):
+        """Record a result answered by an earlier run, so duplicates of it are not sent again."""
+        self.finished[key] = result
+        if len(self.finished) > self.max_finished:
+            self.finished.popitem(last=False)
+
+    def finished_result(self, key: str) -> Any:
+        return self.finished[key]
+
+    def complete(self, job: RowJob, result: Any) -> List[RowJob]:
+        """Record the leader's result and return the rows that were waiting on it."""
+        if self.in_flight.get(job.key) is not job:
+            return []
+        del self.in_flight[job.key]
+        followers = self.followers.pop(job.key)
+        # Failed rows are not remembered, so a later duplicate gets its own attempt
+        if result is not None and not isinstance(result, RowFailure):
+            self.remember(job.key, result)
+        return followers
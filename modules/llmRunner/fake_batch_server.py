@@ -0,0 +1,183 @@
+"""Local stand-in for the provider's Files and Batches endpoints, for running batch jobs offline.
+
+Start it with `python -m modules.llmRunner.fake_batch_server --port 8808` and set
+`"base_url": "http://127.0.0.1:8808/v1"` on a model in data/models.json. Batches
+complete after `--delay` seconds with responses made by a responder function.
+"""
+import argparse
+import email
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+
+def neutral_analysis(body: Dict[str, Any]) -> str:
+    """Default responder: a neutral result in the shape the stored prompts ask for."""
+    return json.dumps({'date': '', 'sentiment': 0.0, 'reliability': 0.0, 'relevance': [], 'prediction': []})
+
+
+class FakeBatchServer:
+    def __init__(self, responder: Callable[[Dict[str, Any]], str] = neutral_analysis, complete_after: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.responder = responder
+        self.complete_after = complete_after
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_file(self, filename: str, content: bytes, purpose: str) -> Dict[str, Any]:
+        file_id = 'file-' + uuid.uuid4().hex
+        self.files[file_id] = {
+            'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+            'filename': filename, 'purpose': purpose, 'status': 'processed', 'content': content,
+        }
+        return self.files[file_id]
+
+    def create_batch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        batch_id = 'batch_' + uuid.uuid4().hex
+        input_file = self.files[request['input_file_id']]
+        total = sum(1 for line in input_file['content'].splitlines() if line.strip())
+        self.batches[batch_id] = {
+            'id': batch_id, 'object': 'batch', 'endpoint': request['endpoint'], 'errors': None,
+            'input_file_id': request['input_file_id'], 'completion_window': request['completion_window'],
+            'status': 'in_progress', 'output_file_id': None, 'error_file_id': None,
+            'created_at': int(time.time()), 'metadata': request.get('metadata'),
+            'request_counts': {'total': total, 'completed': 0, 'failed': 0},
+        }
+        self.batches[batch_id]['_ready_at'] = time.monotonic() + self.complete_after
+        return self.batches[batch_id]
+
+    def refresh_batch(self, batch: Dict[str, Any]):
+        """Run the batch once its delay has passed, writing the output and error files."""
+        if batch['status'] != 'in_progress' or time.monotonic() < batch['_ready_at']:
+            return
+        outputs, errors = [], []
+        for line in self.files[batch['input_file_id']]['content'].decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            entry = {'id': 'batch_req_' + uuid.uuid4().hex, 'custom_id': request['custom_id']}
+            try:
+                content = self.responder(request['body'])
+            except Exception as e:
+                entry['response'] = {'status_code': 500, 'request_id': uuid.uuid4().hex,
+                                     'body': {'error': {'message': str(e), 'type': 'server_error'}}}
+                entry['error'] = None
+                errors.append(entry)
+                continue
+            entry['response'] = {'status_code': 200, 'request_id': uuid.uuid4().hex, 'body': {
+                'id': 'chatcmpl-' + uuid.uuid4().hex, 'object': 'chat.completion', 'created': int(time.time()),
+                'model': request['body'].get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            }}
+            entry['error'] = None
+            outputs.append(entry)
+        if outputs:
+            output = self.add_file('output.jsonl', self._jsonl(outputs), 'batch_output')
+            batch['output_file_id'] = output['id']
+        if errors:
+            error = self.add_file('errors.jsonl', self._jsonl(errors), 'batch_output')
+            batch['error_file_id'] = error['id']
+        batch['request_counts'].update(completed=len(outputs), failed=len(errors))
+        batch['status'] = 'completed'
+
+    @staticmethod
+    def _jsonl(entries) -> bytes:
+        return ''.join(json.dumps(entry) + '\n' for entry in entries).encode('utf-8')
+
+    @staticmethod
+    def _public(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in record.items() if not key.startswith('_') and key != 'content'}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, payload: Any, raw: bool = False):
+                body = payload if raw else json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/octet-stream' if raw else 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _not_found(self):
+                self._send(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def do_POST(self):
+                parts = self.path.split('?')[0].strip('/').split('/')
+                with server.lock:
+                    if parts == ['v1', 'files']:
+                        # Multipart upload: a 'purpose' field and a 'file' part
+                        message = email.message_from_bytes(
+                            b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + self._body()
+                        )
+                        fields = {part.get_param('name', header='content-disposition'): part
+                                  for part in message.get_payload()}
+                        record = server.add_file(fields['file'].get_filename() or 'input.jsonl',
+                                                 fields['file'].get_payload(decode=True),
+                                                 fields['purpose'].get_payload(decode=True).decode())
+                        self._send(200, server._public(record))
+                    elif parts == ['v1', 'batches']:
+                        self._send(200, server._public(server.create_batch(json.loads(self._body()))))
+                    elif len(parts) == 4 and parts[:2] == ['v1', 'batches'] and parts[3] == 'cancel':
+                        batch = server.batches.get(parts[2])
+                        if batch is None:
+                            return self._not_found()
+                        if batch['status'] == 'in_progress':
+                            batch['status'] = 'cancelled'
+                        self._send(200, server._public(batch))
+                    else:
+                        self._not_found()
+
+            def do_GET(self):
+                parts = self.path.split('?')[0].strip('/').split('/')
+                with server.lock:
+                    if len(parts) == 3 and parts[:2] == ['v1', 'batches'] and parts[2] in server.batches:
+                        batch = server.batches[parts[2]]
+                        server.refresh_batch(batch)
+                        self._send(200, server._public(batch))
+                    elif len(parts) == 4 and parts[:2] == ['v1', 'files'] and parts[3] == 'content' \
+                            and parts[2] in server.files:
+                        self._send(200, server.files[parts[2]]['content'], raw=True)
+                    else:
+                        self._not_found()
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the batch API.")
+    parser.add_argument('--port', type=int, default=8808)
+    parser.add_argument('--delay', type=float, default=5.0, help="Seconds before a batch completes.")
+    args = parser.parse_args()
+    fake_server = FakeBatchServer(complete_after=args.delay, port=args.port)
+    print(f"Fake batch server listening on {fake_server.base_url}")
+    fake_server.server.serve_forever()
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+
+DEFAULT_HEDGE_MAX_PERCENT = 5.0
+# Latencies the hedge delay is computed from; no request is hedged before the first few arrive
+LATENCY_WINDOW = 500
+MIN_LATENCY_SAMPLES = 20
+
+
+class DeadlineExceeded(TimeoutError):
+    """A request that got no answer, from any of its copies, within its hard deadline."""
+
+
+class HedgePolicy:
+    """Sends a second copy of a request that runs longer than most, and keeps whichever answers first.
+
+    A request is hedged once it has run past the `percentile` of recent request
+    latencies, as long as hedges stay within `max_percent` of all requests sent.
+    The slower copy is cancelled. With `percentile` 0 nothing is hedged. A
+    `deadline` in seconds fails a request, copies included, that has not been
+    answered by then; 0 means no deadline.
+    """
+
+    def __init__(self, percentile: float = 0, max_percent: float = DEFAULT_HEDGE_MAX_PERCENT, deadline: float = 0):
+        self.percentile = float(percentile)
+        self.max_fraction = max(0.0, float(max_percent)) / 100
+        self.deadline = float(deadline)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.percentile > 0 or self.deadline > 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds after which a request still running gets a second copy, once enough latencies are known."""
+        if self.percentile <= 0 or len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        return float(np.percentile(self.latencies, self.percentile))
+
+    def may_hedge(self) -> bool:
+        return self.hedges + 1 <= self.max_fraction * self.requests
+
+    async def run(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `attempt`, hedged and under the deadline as configured."""
+        self.requests += 1
+        if not self.deadline:
+            return await self._hedged(attempt)
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(self._hedged(attempt), self.deadline)
+        except asyncio.TimeoutError:
+            if time.monotonic() - started < self.deadline:
+                # A timeout of the request itself, not of the deadline
+                raise
+            self.deadline_misses += 1
+            raise DeadlineExceeded(f"Request not answered within its {self.deadline:.0f}s deadline.")
+
+    async def _timed(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await attempt()
+        self.latencies.append(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        primary = asyncio.ensure_future(self._timed(attempt))
+        tasks = [primary]
+        try:
+            delay = self.delay()
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+                if not primary.done() and self.may_hedge():
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(self._timed(attempt)))
+            error = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            # Every copy failed; the first error is the one reported
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # The losing copy releases its key and concurrency slot before the request returns
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def describe(self) -> str:
+        parts = []
+        if self.percentile > 0:
+            parts.append(f"hedging requests slower than p{self.percentile:g} (at most {self.max_fraction:.0%} "
+                         f"of requests)")
+        if self.deadline > 0:
+            parts.append(f"{self.deadline:g}s request deadline")
+        return ", ".join(parts)
+
+    def stats(self) -> str:
+        stats = []
+        if self.percentile > 0:
+            stats.append(f"hedged {self.hedges} ({self.hedge_wins} won)")
+        if self.deadline > 0:
+            stats.append(f"deadline misses {self.deadline_misses}")
+        return ", ".join(stats)
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+# Extra connections beyond the request budget, for retries and connections being recycled
+CONNECTION_HEADROOM = 8
+
+DEFAULT_HTTP_SETTINGS = {
+    'max_connections': 0,  # 0 = the run's max concurrent requests plus headroom
+    'max_keepalive_connections': 0,  # 0 = same as max_connections
+    'keepalive_expiry': 30.0,
+    'http2': True,
+    'connect_timeout': 10.0,
+    'read_timeout': 120.0,
+    'write_timeout': 30.0,
+    'pool_timeout': 60.0,
+}
+
+
+def load_http_settings(path: str) -> Dict[str, Any]:
+    """Transport settings from `path` on top of the defaults; a missing file means all defaults."""
+    settings = dict(DEFAULT_HTTP_SETTINGS)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            settings.update(json.load(f))
+    return settings
+
+
+class SharedHttpClient:
+    """One pooled async HTTP client shared by every model client of a run.
+
+    Connections are kept alive and reused across requests, keys and models, so a
+    busy run does not pay a TLS handshake per request or run out of sockets.
+    """
+
+    def __init__(self, settings: Dict[str, Any], max_concurrency: int, notify: Callable[[str], None] = None):
+        notify = notify or logging.warning
+        self.max_connections = int(settings['max_connections']) or max_concurrency + CONNECTION_HEADROOM
+        self.timeout = httpx.Timeout(
+            connect=settings['connect_timeout'], read=settings['read_timeout'],
+            write=settings['write_timeout'], pool=settings['pool_timeout'],
+        )
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=int(settings['max_keepalive_connections']) or self.max_connections,
+            keepalive_expiry=settings['keepalive_expiry'],
+        )
+        self.http2 = bool(settings['http2'])
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                notify("HTTP/2 needs the 'h2' package; using HTTP/1.1.")
+                self.http2 = False
+        self.requests = 0
+        self.opened_connections = 0
+        # Called with the status code and headers of every response, e.g. to follow rate-limit headers
+        self.response_listeners: List[Callable[[int, httpx.Headers], None]] = []
+        self.client = httpx.AsyncClient(limits=limits, timeout=self.timeout, http2=self.http2,
+                                        event_hooks={'request': [self._on_request], 'response': [self._on_response]})
+
+    async def _on_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions['trace'] = self._trace
+
+    async def _on_response(self, response: httpx.Response):
+        for listener in self.response_listeners:
+            listener(response.status_code, response.headers)
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == 'connection.connect_tcp.complete':
+            self.opened_connections += 1
+
+    def _connections(self) -> Optional[list]:
+        # httpx does not expose its connection pool publicly, so None if its internals change
+        try:
+            pool = getattr(self.client._transport, '_pool', None)
+            return list(getattr(pool, 'connections', []))
+        except Exception:
+            return None
+
+    def describe(self) -> str:
+        return (f"HTTP pool of {self.max_connections} connections ({'HTTP/2' if self.http2 else 'HTTP/1.1'}, "
+                f"connect timeout {self.timeout.connect}s, read timeout {self.timeout.read}s)")
+
+    def stats(self) -> str:
+        opened = f"{self.opened_connections} opened for {self.requests} requests"
+        connections = self._connections()
+        try:
+            active = sum(1 for connection in connections if not connection.is_idle())
+        except Exception:
+            return f"HTTP connections {opened}"
+        return f"HTTP connections {active} active, {len(connections) - active} idle, {opened}"
+
+    async def aclose(self):
+        await self.client.aclose()
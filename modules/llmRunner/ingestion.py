@@ -0,0 +1,65 @@
+import logging
+from typing import IO, Iterable, Iterator, Optional
+
+import pandas as pd
+
+# Low-cardinality columns stored as categoricals to keep chunks small
+CATEGORICAL_COLUMNS = ('subreddit',)
+
+
+class CsvChunkReader:
+    """Reads only the prompt columns of a CSV in chunks with the fast C parser.
+
+    Every other column is skipped while parsing, and the chunk index carries the
+    row id within the file. If the C parser rejects the file partway (malformed or
+    pathological quoting), reading resumes with the python engine right after the
+    last row already delivered, which still copes with the very large quoted fields
+    allowed by `csv.field_size_limit`.
+    """
+
+    def __init__(self, input_file: IO[bytes], columns: Iterable[str], chunksize: int):
+        self.input_file = input_file
+        self.columns = set(columns)
+        self.chunksize = chunksize
+        self.rows_read = 0
+        self.engine = 'c'
+        self.iterator = self._open(skip_rows=0)
+
+    def _open(self, skip_rows: int) -> Iterator[pd.DataFrame]:
+        dtype = {column: 'category' if column in CATEGORICAL_COLUMNS else str for column in self.columns}
+        options = dict(
+            chunksize=self.chunksize,
+            encoding='utf-8',
+            engine=self.engine,
+            usecols=lambda column: column in self.columns,  # Missing prompt keys are tolerated
+            dtype=dtype,
+            keep_default_na=False,  # Empty fields stay empty strings instead of "nan"
+        )
+        if skip_rows:
+            options['skiprows'] = range(1, skip_rows + 1)
+        return pd.read_csv(self.input_file, **options)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> pd.DataFrame:
+        try:
+            chunk = next(self.iterator)
+        except (pd.errors.ParserError, ValueError, OverflowError) as e:
+            if self.engine != 'c':
+                raise
+            logging.warning(f"C parser failed after {self.rows_read} rows ({str(e)}); switching to python engine.")
+            self.engine = 'python'
+            # Closing detaches the failed reader; left to the garbage collector, it would close the input file
+            self.iterator.close()
+            self.input_file.seek(0)
+            self.iterator = self._open(skip_rows=self.rows_read)
+            chunk = next(self.iterator)
+        # Row ids continue across chunks and survive an engine switch
+        chunk.index = pd.RangeIndex(self.rows_read, self.rows_read + len(chunk))
+        self.rows_read += len(chunk)
+        return chunk
+
+    def next_chunk(self) -> Optional[pd.DataFrame]:
+        """Next chunk, or None once the file is exhausted."""
+        return next(self, None)
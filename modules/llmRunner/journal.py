@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from modules.llmRunner.pipeline import RowFailure
+
+
+def atomic_write_csv(df: pd.DataFrame, output_path: str):
+    """Write a CSV next to its destination and rename it into place, so readers never see a partial file."""
+    temp_path = output_path + '.tmp'
+    df.to_csv(temp_path, index=False)
+    os.replace(temp_path, output_path)
+
+
+class RowJournal:
+    """Append-only record of finished rows (row id -> parsed result) for one input file.
+
+    Every result is written and flushed as soon as it arrives, so a crash loses
+    at most the requests still in flight. The first line stores how the file was
+    cut into chunks (row cap, token budget and tokenizer), so outputs cut
+    differently can be told apart from current ones.
+    """
+
+    def __init__(self, path: str, layout: Dict[str, Any]):
+        self.path = path
+        self.results: Dict[int, Any] = {}
+        self.layout_changed = False
+        previous_layout = None
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave the last line half written
+                        logging.warning(f"Ignoring truncated journal line in {path}")
+                        continue
+                    if 'batch_size' in entry:
+                        previous_layout = entry
+                    else:
+                        self.results[entry['row']] = entry['result']
+
+        self.file = open(path, 'a', encoding='utf-8')
+        if previous_layout != layout:
+            self.layout_changed = previous_layout is not None
+            self._write(layout)
+
+    @staticmethod
+    def stored_layout(path: str) -> Optional[Dict[str, Any]]:
+        """The latest chunk layout recorded in the journal at `path`, without loading its rows."""
+        layout = None
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # Layout entries start with their batch size; row entries with their row id
+                    if line.startswith('{"batch_size"'):
+                        try:
+                            layout = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+        return layout
+
+    def _write(self, entry: Dict[str, Any]):
+        self.file.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        self.file.flush()
+
+    def __contains__(self, row_id: int) -> bool:
+        return row_id in self.results
+
+    def get(self, row_id: int) -> Any:
+        return self.results.get(row_id)
+
+    def record(self, row_id: int, result: Any):
+        # Failed rows are left out so the next run tries them again
+        if result is None or isinstance(result, RowFailure) or row_id in self.results:
+            return
+        self.results[row_id] = result
+        self._write({'row': row_id, 'result': result})
+
+    def sync(self):
+        """Force journaled rows to disk; called whenever an output file is committed."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
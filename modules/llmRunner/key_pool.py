@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, List, Mapping, Optional
+
+from modules.llmRunner.rate_limiter import RateLimiter
+
+# A rate-limited key sits out for the provider's Retry-After, or this long doubled per consecutive 429
+RATE_LIMIT_COOLDOWN = 5
+MAX_RATE_LIMIT_COOLDOWN = 120
+# A rejected key (revoked, wrong org, no access to the model) sits out much longer
+AUTH_ERROR_COOLDOWN = 600
+
+RATE_LIMITED = 'rate_limited'
+REJECTED = 'rejected'
+
+
+def split_key_names(api_key_name: str) -> List[str]:
+    """Key names of a model; several names separated by commas form a pool."""
+    return [name.strip() for name in str(api_key_name).split(',') if name.strip()]
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    status = getattr(error, 'status_code', None)
+    message = str(error).lower()
+    if status == 429 or 'rate limit' in message or 'error code: 429' in message:
+        return RATE_LIMITED
+    if status in (401, 403) or 'error code: 401' in message or 'error code: 403' in message:
+        return REJECTED
+    return None
+
+
+def retry_after_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from `retry-after-ms` or `retry-after`, when the provider sent either."""
+    try:
+        return float(headers.get('retry-after-ms')) / 1000
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    return retry_after_from_headers(getattr(response, 'headers', None) or {})
+
+
+class PooledKey:
+    """One API key of the pool with its own model client and rate limits.
+
+    `pack_chain` is the same client asking for the output format of packed requests.
+    """
+
+    def __init__(self, name: str, chain: Any, rate_limiter: RateLimiter, pack_chain: Any = None):
+        self.name = name
+        self.chain = chain
+        self.pack_chain = pack_chain
+        self.rate_limiter = rate_limiter
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_rate_limits = 0
+        self.available_at = 0.0
+        self.rejected = False
+
+    def cooling_seconds(self) -> float:
+        return max(0.0, self.available_at - time.monotonic())
+
+
+class ApiKeyPool:
+    """Spreads requests over several API keys, each paced by its own rate limits.
+
+    Every request goes to the usable key that can send soonest, then to the least
+    loaded one. A key answering with a 429 or an authentication error is taken out
+    of rotation for a while.
+    """
+
+    def __init__(self, keys: List[PooledKey], notify: Callable[[str], None] = None):
+        if not keys:
+            raise ValueError("An API key pool needs at least one key.")
+        self.keys = keys
+        self.notify = notify or logging.warning
+
+    @property
+    def enabled(self) -> bool:
+        return any(key.rate_limiter.enabled for key in self.keys)
+
+    @property
+    def wait_seconds(self) -> float:
+        return sum(key.rate_limiter.wait_seconds for key in self.keys)
+
+    async def acquire(self, tokens: int) -> PooledKey:
+        """Wait for a key that may send a request of `tokens` estimated tokens and reserve it."""
+        while True:
+            usable = [key for key in self.keys if key.cooling_seconds() == 0]
+            if not usable:
+                if all(key.rejected for key in self.keys):
+                    raise RuntimeError("Every API key in the pool was rejected by the provider.")
+                await asyncio.sleep(min(key.cooling_seconds() for key in self.keys))
+                continue
+            # Keys that were rate limited lately get traffic only when the others are busier
+            key = min(usable, key=lambda k: (k.rate_limiter.estimated_wait(tokens), k.consecutive_rate_limits,
+                                             k.in_flight, k.requests))
+            await key.rate_limiter.acquire(tokens)
+            if key.cooling_seconds() > 0:
+                # Taken out of rotation while this request waited for its budget
+                continue
+            key.in_flight += 1
+            key.requests += 1
+            return key
+
+    def give_back(self, key: PooledKey):
+        """Return a key reserved for a request that was not sent after all."""
+        key.in_flight -= 1
+        key.requests -= 1
+
+    def release(self, key: PooledKey, error: Exception = None):
+        key.in_flight -= 1
+        if error is None:
+            key.consecutive_rate_limits = 0
+            key.rejected = False
+            return
+        key.failures += 1
+        kind = classify_error(error)
+        if kind == RATE_LIMITED:
+            key.consecutive_rate_limits += 1
+            cooldown = retry_after_seconds(error) or min(
+                MAX_RATE_LIMIT_COOLDOWN, RATE_LIMIT_COOLDOWN * 2 ** (key.consecutive_rate_limits - 1)
+            )
+        elif kind == REJECTED:
+            key.rejected = True
+            cooldown = AUTH_ERROR_COOLDOWN
+        else:
+            return
+        if key.cooling_seconds() < cooldown:
+            key.available_at = time.monotonic() + cooldown
+            self.notify(f"API key '{key.name}' taken out of rotation for {cooldown:.0f}s ({kind}).")
+
+    def describe(self) -> str:
+        if len(self.keys) == 1:
+            return self.keys[0].rate_limiter.describe()
+        return f"{len(self.keys)} API keys, each {self.keys[0].rate_limiter.describe()}"
+
+    def stats(self) -> str:
+        parts = []
+        for key in self.keys:
+            part = f"{key.name} {key.requests} req"
+            if key.cooling_seconds() > 0:
+                part += f" (out {key.cooling_seconds():.0f}s)"
+            parts.append(part)
+        return "keys " + ", ".join(parts)
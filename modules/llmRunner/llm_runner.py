@@ -2,7 +2,7 @@
 import os
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton, QFileDialog, QHBoxLayout,
-    QLabel, QLineEdit, QProgressBar, QTextEdit, QMessageBox, QComboBox, QSpinBox
+    QLabel, QLineEdit, QProgressBar, QTextEdit, QMessageBox, QComboBox, QSpinBox, QCheckBox
 )
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 import pandas as pd
@@ -53,13 +53,75 @@ class LLMRunnerWidget(QWidget):
 
         # Batch Size
         batch_layout = QHBoxLayout()
-        self.batch_label = QLabel("Batch Size:")
+        self.batch_label = QLabel("Output Flush Size (rows):")
         self.batch_size = QSpinBox()
         self.batch_size.setRange(1, 100000000)
         self.batch_size.setValue(3000)
+        self.batch_size.setToolTip("Most input rows written to each output file. "
+                                   "Requests are streamed and do not wait for a full batch.")
         batch_layout.addWidget(self.batch_label)
         batch_layout.addWidget(self.batch_size)
 
+        # Token Budget
+        self.batch_tokens_label = QLabel("Output Flush Size (tokens):")
+        self.batch_tokens = QSpinBox()
+        self.batch_tokens.setRange(0, 2000000000)
+        self.batch_tokens.setSingleStep(100000)
+        self.batch_tokens.setValue(DEFAULT_BATCH_TOKENS)
+        self.batch_tokens.setToolTip("Estimated prompt tokens per output file, so long articles make smaller "
+                                     "files than short posts. 0 = cut by row count only.")
+        batch_layout.addWidget(self.batch_tokens_label)
+        batch_layout.addWidget(self.batch_tokens)
+
+        # Max Concurrency
+        self.concurrency_label = QLabel("Max Concurrent Requests:")
+        self.max_concurrency = QSpinBox()
+        self.max_concurrency.setRange(1, 1000)
+        self.max_concurrency.setValue(32)
+        batch_layout.addWidget(self.concurrency_label)
+        batch_layout.addWidget(self.max_concurrency)
+
+        # Adaptive Concurrency
+        self.adaptive_concurrency = QCheckBox("Adaptive Concurrency")
+        self.adaptive_concurrency.setChecked(True)
+        self.adaptive_concurrency.setToolTip("Raise concurrency while requests go through and lower it on rate limits "
+                                             "or rising latency, up to the max concurrent requests.")
+        batch_layout.addWidget(self.adaptive_concurrency)
+
+        # Parallel Files
+        self.parallel_files_label = QLabel("Files in Parallel:")
+        self.parallel_files = QSpinBox()
+        self.parallel_files.setRange(1, 64)
+        self.parallel_files.setValue(DEFAULT_PARALLEL_FILES)
+        self.parallel_files.setToolTip("Input files read at the same time. "
+                                       "They take turns and share the concurrent request budget.")
+        batch_layout.addWidget(self.parallel_files_label)
+        batch_layout.addWidget(self.parallel_files)
+
+        # Response Cache
+        self.use_cache = QCheckBox("Use Response Cache")
+        self.use_cache.setChecked(True)
+        batch_layout.addWidget(self.use_cache)
+
+        # Output Format
+        self.format_label = QLabel("Output Format:")
+        self.output_format = QComboBox()
+        self.output_format.addItems(OUTPUT_FORMATS)
+        self.output_format.setToolTip("CSV: one file per flushed chunk. Parquet: one file per input file. "
+                                      "SQLite: one llm_results.sqlite database for the whole run.")
+        batch_layout.addWidget(self.format_label)
+        batch_layout.addWidget(self.output_format)
+
+        # Execution Mode
+        self.mode_label = QLabel("Execution Mode:")
+        self.execution_mode = QComboBox()
+        self.execution_mode.addItems(EXECUTION_MODES)
+        self.execution_mode.setToolTip("Batch job: rows are submitted to the provider's batch endpoint at a lower "
+                                       "price and collected when the job finishes (up to 24 hours). "
+                                       "Pending jobs are picked up again by the next run.")
+        batch_layout.addWidget(self.mode_label)
+        batch_layout.addWidget(self.execution_mode)
+
         # Execute Button and Progress Bar
         execute_layout = QHBoxLayout()
         self.execute_button = QPushButton("Execute")
@@ -67,9 +129,15 @@ class LLMRunnerWidget(QWidget):
         self.stop_button = QPushButton("Stop")
         self.stop_button.clicked.connect(self.stop_llm)
         self.stop_button.setEnabled(False)
+        self.stop_button.setToolTip("Cancel requests in flight right away. Rows answered so far are kept.")
+        self.drain_button = QPushButton("Finish In-Flight")
+        self.drain_button.clicked.connect(self.drain_llm)
+        self.drain_button.setEnabled(False)
+        self.drain_button.setToolTip("Send no new requests, wait for the ones already sent, then stop.")
         self.progress_bar = QProgressBar()
         execute_layout.addWidget(self.execute_button)
         execute_layout.addWidget(self.stop_button)
+        execute_layout.addWidget(self.drain_button)
         execute_layout.addWidget(self.progress_bar)
 
         # Log/Output
@@ -114,6 +182,13 @@ class LLMRunnerWidget(QWidget):
         input_dir = self.input_path.text()
         output_dir = self.output_path.text()
         batch_size = self.batch_size.value()
+        max_concurrency = self.max_concurrency.value()
+        use_cache = self.use_cache.isChecked()
+        output_format = self.output_format.currentText()
+        execution_mode = self.execution_mode.currentText()
+        parallel_files = self.parallel_files.value()
+        batch_tokens = self.batch_tokens.value()
+        adaptive_concurrency = self.adaptive_concurrency.isChecked()
 
         if not os.path.isdir(input_dir):
             QMessageBox.warning(self, "Error", "Please select a valid input data directory.")
@@ -131,24 +206,31 @@ class LLMRunnerWidget(QWidget):
                 QMessageBox.warning(self, "Error", "Selected LangChain configuration not found.")
                 return
 
-        # Disable execute button and enable stop button
+        # Disable execute button and enable stop buttons
         self.execute_button.setEnabled(False)
         self.stop_button.setEnabled(True)
+        self.drain_button.setEnabled(True)
 
         # Initialize and start the thread
-        self.thread = LLMRunnerThread(chain_config, input_dir, output_dir, batch_size)
+        self.thread = LLMRunnerThread(chain_config, input_dir, output_dir, batch_size, max_concurrency, use_cache,
+                                     output_format, execution_mode, parallel_files, batch_tokens,
+                                     adaptive_concurrency)
         self.thread.progress.connect(self.update_progress)
         self.thread.log.connect(self.append_log)
         self.thread.finished_signal.connect(self.execution_finished)
         self.thread.start()
 
     def stop_llm(self):
+        # The thread winds down on its own and signals when done, so the GUI never waits on it
         if self.thread and self.thread.isRunning():
             self.thread.stop()
-            self.thread.wait()
-            self.append_log("LLM Runner stopped by user.")
-            self.execute_button.setEnabled(True)
             self.stop_button.setEnabled(False)
+            self.drain_button.setEnabled(False)
+
+    def drain_llm(self):
+        if self.thread and self.thread.isRunning():
+            self.thread.stop(drain=True)
+            self.drain_button.setEnabled(False)
 
     def update_progress(self, value):
         self.progress_bar.setValue(value)
@@ -159,4 +241,8 @@ class LLMRunnerWidget(QWidget):
     def execution_finished(self):
         self.execute_button.setEnabled(True)
         self.stop_button.setEnabled(False)
+        self.drain_button.setEnabled(False)
+        if self.thread and not self.thread.is_running:
+            self.append_log("LLM Runner stopped by user.")
+            return
         QMessageBox.information(self, "Execution Finished", "LLM Runner has completed the process.")
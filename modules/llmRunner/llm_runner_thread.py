@@ -1,15 +1,18 @@
 import os
+import re
 import json
 import time
+import asyncio
 import logging
+from collections import deque
 
 # Disable all loggin messages
 logging.disable(logging.WARNING)
 
 import pandas as pd
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import QThread, pyqtSignal
 from cryptography.fernet import Fernet
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 import ast
 import csv
 import sys
@@ -23,12 +26,39 @@ except OverflowError:
     csv.field_size_limit(2147483647)  # 2^31 - 1
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import StrOutputParser, BaseOutputParser
 
 from modules.langchainManager.langchain_manager import *
 from modules import *
+from modules.llmRunner.async_engine import AsyncRequestEngine, EXPECTED_RESPONSE_TOKENS, RequestCancelled, TokenUsage
+from modules.llmRunner.hedging import DEFAULT_HEDGE_MAX_PERCENT, HedgePolicy
+from modules.llmRunner.rate_limiter import RateLimiter
+from modules.llmRunner.key_pool import ApiKeyPool, PooledKey, split_key_names
+from modules.llmRunner.routing import ModelRoute, ModelRouter
+from modules.llmRunner.http_transport import SharedHttpClient, load_http_settings
+from modules.llmRunner.preprocessing import InputPreprocessor
+from modules.llmRunner.token_budget import (
+    READ_CHUNK_ROWS, TOKENS_PER_MESSAGE, TokenBudgetChunker, TokenCounter
+)
+from modules.llmRunner.ingestion import CsvChunkReader
+from modules.llmRunner.prompt_renderer import PromptRenderer
+from modules.llmRunner.response_cache import ResponseCache, cache_key
+from modules.llmRunner.dedup import RowDeduplicator, LEADER, FINISHED
+from modules.llmRunner.journal import RowJournal
+from modules.llmRunner.batch_jobs import (
+    EXECUTION_MODES, REALTIME_MODE, BATCH_MODE, MAX_BATCH_REQUESTS, MAX_BATCH_BYTES, POLL_INITIAL_SECONDS,
+    POLL_MAX_SECONDS, MAX_POLL_FAILURES, POLL_FATAL_STATUS_CODES, TERMINAL_STATUSES, BatchClient, BatchJobStore,
+    make_custom_id, parse_custom_id, request_line, response_text, response_usage
+)
+from modules.llmRunner.sinks import OUTPUT_FORMATS, create_sink, fields_from_schema
+from modules.llmRunner.output_parsers import (
+    AnalysisDictParser, ANALYSIS_FIELDS, schema_response_format, validate_against_schema
+)
+from modules.llmRunner.pipeline import (
+    END_OF_STREAM, SKIPPED, RETRY_SCHEDULED, FileState, ChunkState, RowJob, PackJob, RowFailure, ByteProgress
+)
+from modules.llmRunner.packing import DEFAULT_PACK_ROW_TOKENS, pack_messages, pack_schema, unpack_results
 
 # Configure logging
 logging.basicConfig(
@@ -37,18 +67,61 @@ logging.basicConfig(
     format='%(asctime)s:%(levelname)s:%(message)s'
 )
 
+# Chunks read ahead of the render stage while requests are in flight
+CHUNK_QUEUE_SIZE = 2
+
+# Input files read at the same time, so the request pipe stays full across file boundaries
+DEFAULT_PARALLEL_FILES = 4
+
+# Estimated prompt tokens per chunk; `batch_size` caps the rows of a chunk on top of it
+DEFAULT_BATCH_TOKENS = 1000000
+# Marks the chunk layout of a file whose outputs were written before row journals existed
+LEGACY_OUTPUTS = 'legacy_outputs'
+
+# Attempts per row for request errors and, separately, for unparseable responses
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 2  # Seconds, doubled on every failed attempt of a row
+
 class LLMRunnerThread(QThread):
     progress = pyqtSignal(int)
     log = pyqtSignal(str)
     finished_signal = pyqtSignal()
 
-    def __init__(self, chain_config, input_dir, output_dir, batch_size):
+    def __init__(self, chain_config, input_dir, output_dir, batch_size, max_concurrency=32, use_cache=True,
+                 output_format='CSV', execution_mode=REALTIME_MODE, parallel_files=DEFAULT_PARALLEL_FILES,
+                 batch_tokens=DEFAULT_BATCH_TOKENS, adaptive_concurrency=True):
         super().__init__()
         self.chain_config = chain_config
         self.input_dir = input_dir
         self.output_dir = output_dir
         self.batch_size = batch_size
+        self.batch_tokens = max(0, int(batch_tokens))
+        self.token_counter = None
+        self.preprocessor = None
+        self.tokens_saved = 0
+        self.token_usage = TokenUsage()
+        self.prompt_fields = []
+        self.template_tokens = 0
+        self.context_limit = 0
+        self.max_concurrency = max_concurrency
+        self.adaptive_concurrency = adaptive_concurrency
+        self.use_cache = use_cache
+        self.output_format = output_format
+        self.execution_mode = execution_mode
+        self.parallel_files = max(1, int(parallel_files))
+        self.active_files: Dict[str, FileState] = {}
+        self.sink = None
+        self.batch_store = None
+        self.batch_tasks = set()
+        self.resumed_journals = {}
+        self.byte_progress = ByteProgress(0)
+        self.journals = []
+        self.retry_tasks = set()
+        self.output_parser = None
         self.is_running = True
+        # Set while the event loop runs, so stop() can cancel requests from the GUI thread
+        self.loop = None
+        self.engine = None
 
         # Load prompts
         with open(PROMPTS_STORAGE_PATH, 'r') as f:
@@ -58,131 +131,825 @@ class LLMRunnerThread(QThread):
         # Load model configurations
         with open(MODELS_STORAGE_PATH, 'r') as f:
             models_data = json.load(f)
-            self.model_config = models_data[chain_config['model_name']]
+            # The primary model first, then the chain's fallbacks in order
+            self.model_names = [chain_config['model_name']] + [
+                name for name in chain_config.get('fallback_models', []) if name != chain_config['model_name']
+            ]
+            self.model_configs = {name: models_data[name] for name in self.model_names}
+            self.model_config = self.model_configs[chain_config['model_name']]
 
         self.output_parser_type = chain_config['output_parser']
 
+        # A prompt may declare a JSON schema for its output, which the provider then enforces
+        self.output_schema = self.prompt.get('output_schema')
+        self.response_format = None
+        if self.output_schema:
+            schema_name = re.sub(r'[^a-zA-Z0-9_-]', '_', chain_config['prompt_name'])
+            self.response_format = schema_response_format(schema_name, self.output_schema)
+
+        # Short rows can be packed several to a request, so the system prompt is paid once per pack
+        self.pack_size = max(1, int(chain_config.get('pack_size', 1) or 1))
+        self.pack_row_tokens = int(chain_config.get('pack_row_tokens', DEFAULT_PACK_ROW_TOKENS))
+        self.pack_response_format = {'type': 'json_object'}
+        if self.output_schema:
+            self.pack_response_format = schema_response_format(schema_name + '_pack', pack_schema(self.output_schema))
+        self.packed_rows = 0
+        self.pack_requests = 0
+        self.pack_fallbacks = 0
+
+        # Requests slower than most get a second copy, and every request may have a hard deadline
+        self.hedging = HedgePolicy(chain_config.get('hedge_percentile', 0),
+                                   chain_config.get('hedge_max_percent', DEFAULT_HEDGE_MAX_PERCENT),
+                                   chain_config.get('request_deadline', 0))
+
     def run(self):
         try:
             self.log.emit("Starting LLM Runner...")
             logging.info("LLM Runner started.")
 
+            # Chunks are cut by estimated tokens, counted with the primary model's tokenizer when available
+            self.token_counter = TokenCounter(self.model_config['type'])
+
+            # Prompt values are cleaned and truncated per key as configured for the prompt
+            self.preprocessor = InputPreprocessor(self.prompt.get('preprocessing', {}), self.prompt['keys'],
+                                                  self.token_counter)
+            if self.preprocessor.enabled:
+                self.log.emit(self.preprocessor.describe())
+                logging.info(self.preprocessor.describe())
+
             # Initialize prompt template
             prompt_template = self.initialize_prompt_template()
 
-            # Initialize LLM model
-            model = self.initialize_model()
+            # Every model client of the run sends its requests over one pooled HTTP client
+            self.http_client = SharedHttpClient(load_http_settings(HTTP_SETTINGS_PATH), self.max_concurrency,
+                                                notify=self.log_warning)
+            self.log.emit(self.http_client.describe())
+            logging.info(self.http_client.describe())
+
+            # Initialize one LLM model per API key of each model in the chain
+            models = self.initialize_models()
 
             # Initialize output parser
             output_parser = self.initialize_output_parser()
 
+            # Requests from every chunk and file go through one event loop
+            asyncio.run(self.run_async(prompt_template, models, output_parser))
+
+            if self.preprocessor.enabled:
+                self.log.emit(f"Preprocessing saved ~{self.tokens_saved} input tokens.")
+                logging.info(f"Preprocessing saved ~{self.tokens_saved} input tokens.")
+            if isinstance(output_parser, AnalysisDictParser) and output_parser.repaired:
+                self.log.emit(f"Repaired {output_parser.repaired} malformed responses locally instead of "
+                              f"requesting them again.")
+                logging.info(f"Repaired {output_parser.repaired} malformed responses locally.")
+            if self.token_usage.responses:
+                self.log.emit(f"Provider-reported usage: {self.token_usage.describe()}")
+                logging.info(f"Provider-reported usage: {self.token_usage.describe()}")
+            if self.hedging.enabled and self.hedging.requests:
+                self.log.emit(f"Tail latency: {self.hedging.stats()} of {self.hedging.requests} requests")
+                logging.info(f"Tail latency: {self.hedging.stats()} of {self.hedging.requests} requests")
+            if self.pack_size > 1:
+                self.log.emit(f"Packing sent {self.packed_rows} rows in {self.pack_requests} requests; "
+                              f"{self.pack_fallbacks} rows fell back to single requests.")
+                logging.info(f"Packing sent {self.packed_rows} rows in {self.pack_requests} requests; "
+                             f"{self.pack_fallbacks} rows fell back to single requests.")
+            if self.is_running:
+                self.log.emit("LLM Runner completed successfully.")
+                logging.info("LLM Runner completed successfully.")
+            else:
+                self.log.emit(f"LLM Runner stopped ({self.engine.cancelled if self.engine else 0} requests "
+                              f"cancelled). Rows answered so far are kept and are not requested again next run.")
+                logging.info("LLM Runner stopped by user.")
+            self.finished_signal.emit()
+
+        except Exception as e:
+            self.log.emit(f"Critical error: {str(e)}")
+            logging.exception(f"Critical error: {str(e)}")
+            self.finished_signal.emit()
+
+    async def run_async(self, prompt_template: PromptRenderer, models: Dict[str, Dict[str, ChatOpenAI]],
+                        output_parser: BaseOutputParser):
+        # Results go to the chosen sink, one row per input row with its file name and row index
+        self.sink = create_sink(self.output_format, self.output_dir, self.result_fields(output_parser))
+        self.log.emit(f"Writing {self.sink.name} output to: {self.output_dir}")
+        logging.info(f"Writing {self.sink.name} output to: {self.output_dir}")
+        # Requests go to the first healthy model of the chain and are balanced over its API keys,
+        # each paced against its own quota
+        routes = []
+        if self.execution_mode == BATCH_MODE and self.pack_size > 1:
+            self.log_warning("Row packing is not used for batch jobs; every row is its own request.")
+            self.pack_size = 1
+        for model_name, key_models in models.items():
+            model_config = self.model_configs[model_name]
+            key_pool = ApiKeyPool(
+                [PooledKey(key_name, model, RateLimiter.from_model_config(model_config),
+                           pack_chain=self.pack_chain(model))
+                 for key_name, model in key_models.items()],
+                notify=self.log_warning,
+            )
+            routes.append(ModelRoute(model_name, model_config, key_pool))
+        router = ModelRouter(routes, notify=self.log_warning)
+        # Rows too long for the primary model go to a fallback with a larger context window, if any
+        if self.execution_mode == BATCH_MODE:
+            self.context_limit = routes[0].context_window
+        else:
+            self.context_limit = max(route.context_window for route in routes)
+        self.prompt_fields = prompt_template.fields()
+        self.template_tokens = (sum(self.token_counter.count(text) for text in prompt_template.static_text())
+                                + 2 * TOKENS_PER_MESSAGE)
+        chunk_tokens = f"{self.batch_tokens} tokens" if self.batch_tokens else "no token budget"
+        self.log.emit(f"Chunks of up to {self.batch_size} rows and {chunk_tokens} ({self.token_counter.name}), "
+                      f"rows up to {self.context_limit} tokens")
+        logging.info(f"Chunks of up to {self.batch_size} rows and {chunk_tokens} ({self.token_counter.name}), "
+                     f"rows up to {self.context_limit} tokens")
+        # Responses are cached by content, so reruns and retries never pay twice for the same request
+        cache = ResponseCache(RESPONSE_CACHE_PATH) if self.use_cache else None
+        # The engine returns raw text, which is what gets cached; structured parsing happens per row
+        self.output_parser = output_parser
+        request_config = dict(self.model_config)
+        if self.response_format:
+            request_config['response_format'] = self.response_format
+        engine = AsyncRequestEngine(router, self.max_concurrency, cache=cache, model_config=request_config,
+                                    adaptive_concurrency=self.adaptive_concurrency, notify=self.log_warning,
+                                    hedging=self.hedging)
+        # Quota headers are read off every HTTP response of the run
+        self.http_client.response_listeners.append(engine.concurrency.observe_response)
+        # Batch results report their usage into the same totals as real-time responses
+        self.token_usage = engine.usage
+        self.loop = asyncio.get_running_loop()
+        self.engine = engine
+        self.log.emit(f"Max concurrent requests: {engine.max_concurrency} ({engine.concurrency.describe()}), "
+                      f"{router.describe()}")
+        logging.info(f"Max concurrent requests: {engine.max_concurrency} ({engine.concurrency.describe()}), "
+                     f"{router.describe()}")
+
+        # Identical rows are sent once and their result fanned out to every copy
+        dedup = RowDeduplicator()
+
+        # In batch mode rows are sent as provider batch jobs instead of one request each
+        batch_client = None
+        if self.execution_mode == BATCH_MODE:
+            # Batch jobs run on the primary model and are tied to the key that submitted them,
+            # so they always use its first key
+            api_key_name = split_key_names(self.model_config['api_key_name'])[0]
+            batch_client = BatchClient(self.load_api_key(api_key_name), self.model_config.get('base_url'),
+                                       http_client=self.http_client.client)
+            self.batch_store = BatchJobStore(os.path.join(self.output_dir, 'batch_jobs.json'))
+            self.log.emit("Execution mode: batch jobs")
+            logging.info("Execution mode: batch jobs")
+        if self.hedging.enabled and batch_client is None:
+            self.log.emit(f"Tail latency: {self.hedging.describe()}")
+            logging.info(f"Tail latency: {self.hedging.describe()}")
+        if self.pack_size > 1:
+            self.log.emit(f"Packing up to {self.pack_size} rows with at most {self.pack_row_tokens} tokens of values "
+                          f"per request")
+            logging.info(f"Packing up to {self.pack_size} rows with at most {self.pack_row_tokens} tokens of values "
+                         f"per request")
+
+        # Stages are connected by bounded queues so memory stays flat whatever the batch size
+        chunk_queue = asyncio.Queue(maxsize=CHUNK_QUEUE_SIZE)
+        request_queue = asyncio.Queue(maxsize=engine.max_concurrency * 2)
+        result_queue = asyncio.Queue(maxsize=engine.max_concurrency * 2)
+
+        stages = []
+        try:
+            if batch_client is not None:
+                # Jobs left by an earlier run are merged first, so their rows are not submitted twice
+                await self.resume_batches(batch_client)
+                workers = [self.batch_stage(request_queue, result_queue, batch_client)]
+            else:
+                workers = [self.request_stage(request_queue, result_queue, engine)
+                           for _ in range(engine.max_concurrency)]
+            producers = [
+                self.read_stage(chunk_queue),
+                self.render_stage(chunk_queue, request_queue, result_queue, prompt_template, dedup, len(workers)),
+            ] + workers
+            stages = [
+                asyncio.ensure_future(self.drain_stages(producers, result_queue)),
+                asyncio.ensure_future(self.write_stage(result_queue, engine, dedup)),
+            ]
+            await asyncio.gather(*stages)
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            raise
+        finally:
+            for journal in self.journals:
+                journal.close()
+            self.sink.close()
+            if cache is not None:
+                cache.close()
+            if batch_client is not None:
+                if self.batch_store.jobs:
+                    self.log.emit(f"{len(self.batch_store.jobs)} batch jobs still pending; "
+                                  f"they are collected on the next run.")
+                    logging.info(f"{len(self.batch_store.jobs)} batch jobs still pending.")
+                await batch_client.close()
+            await self.http_client.aclose()
+
+    async def drain_stages(self, producers: List[Any], result_queue: asyncio.Queue):
+        """Run the producing stages, wait for rows still in the retry queue or a batch job, then close the writer."""
+        await asyncio.gather(*producers)
+        while self.retry_tasks or self.batch_tasks:
+            await asyncio.wait(self.retry_tasks | self.batch_tasks)
+        await result_queue.put(END_OF_STREAM)
+
+    async def read_stage(self, chunk_queue: asyncio.Queue):
+        """Read several input files at once and interleave their chunks so every file gets its turn."""
+        readers = deque()
+        try:
             # Process CSV files
             csv_files = [f for f in os.listdir(self.input_dir) if f.endswith('.csv')]
-            total_files = len(csv_files)
+            # Progress is measured in bytes, which only needs the file sizes up front
+            self.byte_progress = ByteProgress(
+                sum(os.path.getsize(os.path.join(self.input_dir, f)) for f in csv_files)
+            )
+            pending_files = deque(enumerate(csv_files, start=1))
 
-            for idx, file_name in enumerate(csv_files, start=1):
-                if not self.is_running:
-                    self.log.emit("LLM Runner stopped.")
-                    logging.info("LLM Runner stopped by user.")
+            while pending_files or readers:
+                # Keep up to `parallel_files` files open; the request budget is shared by all of them
+                while pending_files and len(readers) < self.parallel_files:
+                    if not self.is_running:
+                        self.log.emit("LLM Runner stopped.")
+                        logging.info("LLM Runner stopped by user.")
+                        pending_files.clear()
+                        break
+                    idx, file_name = pending_files.popleft()
+                    file_queue = asyncio.Queue(maxsize=1)
+                    readers.append((file_queue, asyncio.ensure_future(
+                        self.read_file(idx, len(csv_files), file_name, file_queue)
+                    )))
+                if not readers:
                     break
 
-                # input_path = os.path.join(self.input_dir, file_name)
-                input_path = self.input_dir + '/' + file_name
-                self.log.emit(f"Processing file: {input_path}")
-                logging.info(f"Processing file: {input_path}")
-
-                try:
-                    # Read CSV in chunks
-                    chunksize = self.batch_size  # Define chunk size
-                    csv_iterator = pd.read_csv(
-                        input_path,
-                        chunksize=chunksize,
-                        encoding='utf-8',
-                        engine='python',  # Switch to Python engine
-                        # on_bad_lines='skip'  # Skip lines with errors
-                    )
-
-                    # Count total rows
-                    total_rows = 0
-                    for chunk in pd.read_csv(input_path, chunksize=1000):
-                        total_rows += chunk.shape[0]
-                except Exception as e:
-                    self.log.emit(f"Failed to read {input_path}: {str(e)}")
-                    logging.error(f"Failed to read {input_path}: {str(e)}")
-                    continue  # Skip to the next file
-
-                chunk_number = 0
-                processed_rows = 0
-                for chunk in csv_iterator:
+                # Round robin: one chunk from each open file in turn
+                file_queue, reader = readers.popleft()
+                item = await file_queue.get()
+                if item is END_OF_STREAM:
+                    await reader  # Surfaces errors raised by the reader
+                    continue
+                await chunk_queue.put(item)
+                readers.append((file_queue, reader))
+        finally:
+            for _, reader in readers:
+                reader.cancel()
+            await chunk_queue.put(END_OF_STREAM)
+
+    async def read_file(self, idx: int, file_count: int, file_name: str, file_queue: asyncio.Queue):
+        """Read one input file chunk by chunk and hand the chunks that still need work to the scheduler."""
+        try:
+            # input_path = os.path.join(self.input_dir, file_name)
+            input_path = self.input_dir + '/' + file_name
+            self.log.emit(f"Processing file: {input_path} ({idx} of {file_count})")
+            logging.info(f"Processing file: {input_path} ({idx} of {file_count})")
+
+            layout = self.file_layout(file_name)
+            legacy_outputs = bool(layout.get(LEGACY_OUTPUTS))
+            if legacy_outputs:
+                self.log.emit(f"Outputs of {file_name} predate the row journal; cutting it into chunks of "
+                              f"{self.batch_size} rows so they line up.")
+                logging.info(f"Outputs of {file_name} predate the row journal; cutting it by row count.")
+
+            input_file = None
+            try:
+                # Read only the prompt columns in chunks from a handle whose position tracks bytes consumed
+                input_file = open(input_path, 'rb')
+                # Parse a few hundred rows at a time and cut chunks from them by row cap and token budget
+                csv_iterator = CsvChunkReader(input_file, self.prompt['keys'], min(self.batch_size, READ_CHUNK_ROWS))
+                chunker = TokenBudgetChunker(csv_iterator, self.token_counter, self.prompt_fields,
+                                             self.template_tokens, self.batch_size,
+                                             0 if legacy_outputs else self.batch_tokens,
+                                             self.preprocessor if self.preprocessor.enabled else None)
+            except Exception as e:
+                if input_file is not None:
+                    input_file.close()
+                self.log.emit(f"Failed to read {input_path}: {str(e)}")
+                logging.error(f"Failed to read {input_path}: {str(e)}")
+                return  # Skip to the next file
+
+            # Rows answered by an earlier (possibly crashed) run are never sent again
+            journal = self.resumed_journals.pop(file_name, None)
+            if journal is None:
+                journal = RowJournal(self.journal_path(file_name), layout)
+                self.journals.append(journal)
+            if journal.results:
+                self.log.emit(f"Resuming {file_name}: {len(journal.results)} rows already answered.")
+                logging.info(f"Resuming {file_name}: {len(journal.results)} rows already answered.")
+            if journal.layout_changed:
+                # Every row in the old outputs is in the journal, so they are rebuilt at the new size
+                self.log.emit(f"Chunk size changed since the last run; rewriting outputs of {file_name} from the journal.")
+                logging.info(f"Chunk size changed since the last run; rewriting outputs of {file_name} from the journal.")
+                self.sink.reset_file(file_name)
+
+            file_state = FileState(file_name=file_name, index=idx, total_bytes=os.path.getsize(input_path),
+                                   journal=journal)
+            self.active_files[file_name] = file_state
+            chunk_number = 0
+            queued_chunks = 0
+            consumed_bytes = 0
+            with input_file:
+                while True:
                     if not self.is_running:
                         self.log.emit("LLM Runner stopped.")
                         logging.info("LLM Runner stopped by user.")
                         break
 
-                    self.log.emit(f"Processing rows {chunk_number * chunksize} to {(chunk_number + 1) * chunksize}")
-                    logging.info(f"Processing rows {chunk_number * chunksize} to {(chunk_number + 1) * chunksize}")
+                    # Parse the next chunk off the event loop so in-flight requests keep going
+                    try:
+                        chunk, row_tokens, tokens_saved = await asyncio.to_thread(chunker.next_chunk)
+                    except Exception as e:
+                        self.log.emit(f"Failed to read {input_path}: {str(e)}")
+                        logging.error(f"Failed to read {input_path}: {str(e)}")
+                        break
+                    if chunk is None:
+                        # Whatever the reader buffered past the last chunk is done too
+                        file_state.advance(file_state.total_bytes - consumed_bytes)
+                        self.byte_progress.advance(file_state.total_bytes - consumed_bytes, skipped=True)
+                        file_state.chunk_count = queued_chunks
+                        self.finish_file_if_done(file_state)
+                        break
+
+                    # Read-ahead makes this approximate per chunk, but it sums to the file size
+                    byte_span = min(input_file.tell(), file_state.total_bytes) - consumed_bytes
+                    consumed_bytes += byte_span
+
+                    start_row = int(chunk.index[0])
                     chunk_number += 1
 
-                    # Save processed results to output directory
-                    output_file_name = os.path.splitext(file_name)[0] + f'_{chunk_number:05d}' + '_processed.csv'
-                    output_path = os.path.join(self.output_dir, output_file_name)
+                    # Check if the sink already holds the chunk and pass it (outputs are written atomically).
+                    # Outputs holding failed rows are redone; those rows are missing from the journal. Outputs
+                    # from before the journal are trusted as they are.
+                    chunk_answered = legacy_outputs or all(row_id in journal for row_id in chunk.index)
+                    chunk_saved = self.sink.chunk_exists(file_name, chunk_number, chunk.index)
+                    if chunk_saved and chunk_answered and not journal.layout_changed:
+                        self.log.emit(f"Skipped chunk {chunk_number} of {file_name}. Already processed.")
+                        file_state.advance(byte_span)
+                        self.byte_progress.advance(byte_span, skipped=True)
+                        continue
 
-                    # Check if the file already exists and pass the chunk
-                    if os.path.exists(output_path):
-                        self.log.emit(f"Skipped {output_path}. Already processed.")
+                    self.log.emit(f"Processing rows {start_row} to {start_row + len(chunk)} of {file_name} "
+                                  f"(~{sum(row_tokens)} tokens)")
+                    logging.info(f"Processing rows {start_row} to {start_row + len(chunk)} of {file_name} "
+                                 f"(~{sum(row_tokens)} tokens)")
+                    chunk_state = ChunkState(file=file_state, chunk_number=chunk_number, start_row=start_row,
+                                             byte_span=byte_span, row_tokens=row_tokens)
+                    file_state.tokens_saved += tokens_saved
+                    self.tokens_saved += tokens_saved
+                    await file_queue.put((chunk_state, chunk))
+                    queued_chunks += 1
+        finally:
+            await file_queue.put(END_OF_STREAM)
+
+    async def render_stage(self, chunk_queue: asyncio.Queue, request_queue: asyncio.Queue, result_queue: asyncio.Queue,
+                           prompt_template: PromptRenderer, dedup: RowDeduplicator, worker_count: int):
+        """Turn each chunk into request jobs, sending only the first copy of identical rows."""
+        try:
+            while True:
+                item = await chunk_queue.get()
+                if item is END_OF_STREAM:
+                    break
+                chunk_state, chunk = item
+                # Short rows sharing a system message are packed together, within the chunk
+                packs: Dict[str, List[RowJob]] = {}
+
+                # Prepare messages for the batch
+                message_batch = self.prepare_message_batch(chunk, prompt_template)
+                chunk_state.results = [None] * len(message_batch)
+                chunk_state.remaining = len(message_batch)
+                journal = chunk_state.file.journal
+                for position, messages in enumerate(message_batch):
+                    row_id = chunk_state.start_row + position
+                    key = cache_key(self.model_config, messages)
+                    if row_id in journal:
+                        # Rows identical to a journaled one reuse its answer too
+                        dedup.remember(key, journal.get(row_id))
+                        await result_queue.put((RowJob(chunk=chunk_state, position=position, messages=None),
+                                                journal.get(row_id)))
+                        continue
+                    tokens = chunk_state.row_tokens[position]
+                    if tokens + EXPECTED_RESPONSE_TOKENS > self.context_limit:
+                        # No model of the chain can take the row, so it fails without spending a request
+                        chunk_state.file.oversized_rows += 1
+                        await result_queue.put((RowJob(chunk=chunk_state, position=position, messages=None),
+                                                RowFailure(f"Row of ~{tokens} tokens exceeds the context window "
+                                                           f"of {self.context_limit} tokens")))
+                        continue
+                    job = RowJob(chunk=chunk_state, position=position, messages=messages, key=key, tokens=tokens)
+                    claim = dedup.claim(job)
+                    if claim == LEADER:
+                        if self.pack_size > 1 and tokens - self.template_tokens <= self.pack_row_tokens:
+                            pack = packs.setdefault(messages[0].content, [])
+                            pack.append(job)
+                            if len(pack) == self.pack_size:
+                                await request_queue.put(self.make_pack(packs.pop(messages[0].content)))
+                        else:
+                            await request_queue.put(job)
                         continue
-                    # Prepare messages for the batch
-                    message_batch = self.prepare_message_batch(chunk, prompt_template)
+                    chunk_state.file.duplicate_rows += 1
+                    if claim == FINISHED:
+                        await result_queue.put((job, dedup.finished_result(job.key)))
+                    # Followers get their result when the leader's arrives
+                for pack in packs.values():
+                    await request_queue.put(self.make_pack(pack) if len(pack) > 1 else pack[0])
+        finally:
+            for _ in range(worker_count):
+                await request_queue.put(END_OF_STREAM)
 
-                    # Process the batch with retries
-                    results = self.process_batch_with_retries(model, output_parser, message_batch, retries=3)
+    async def request_stage(self, request_queue: asyncio.Queue, result_queue: asyncio.Queue,
+                            engine: AsyncRequestEngine):
+        """Worker that sends rendered rows to the model and parses the responses."""
+        while True:
+            job = await request_queue.get()
+            if job is END_OF_STREAM:
+                break
+            await self.send_job(engine, job, result_queue)
 
-                    # Update progress
-                    processed_rows += len(chunk)
-                    progress_percent = int((idx - 1) / total_files * 100 + (processed_rows / total_rows) / total_files * 100)
-                    self.progress.emit(progress_percent)
+    async def send_job(self, engine: AsyncRequestEngine, job: Union[RowJob, PackJob], result_queue: asyncio.Queue):
+        """Send a row or a pack of rows and queue their results, unless a retry was scheduled instead."""
+        # Once the runner stops, queued rows are not sent and their chunk is left unsaved
+        if not self.is_running:
+            for row_job in job.rows if isinstance(job, PackJob) else [job]:
+                await result_queue.put((row_job, SKIPPED))
+            return
+        if isinstance(job, PackJob):
+            await self.attempt_pack(engine, job, result_queue)
+            return
+        result = await self.attempt_row(engine, job, result_queue)
+        if result is not RETRY_SCHEDULED:
+            await result_queue.put((job, result))
 
-                    # Save processed results to output directory
-                    output_df = pd.DataFrame(results)
-                    output_file_name = os.path.splitext(file_name)[0] + f'_{chunk_number:05}' + '_processed.csv'
-                    output_path = os.path.join(self.output_dir, output_file_name)
+    async def write_stage(self, result_queue: asyncio.Queue, engine: AsyncRequestEngine, dedup: RowDeduplicator):
+        """Collect parsed rows and flush each chunk to its output file once all of its rows are back."""
+        while True:
+            item = await result_queue.get()
+            if item is END_OF_STREAM:
+                break
+            job, result = item
+            # Duplicates waiting on this row share its result
+            for row_job in [job] + dedup.complete(job, None if result is SKIPPED else result):
+                chunk_state = row_job.chunk
+                if result is SKIPPED:
+                    chunk_state.incomplete = True
+                else:
+                    chunk_state.results[row_job.position] = result
+                    chunk_state.file.journal.record(chunk_state.start_row + row_job.position, result)
+                chunk_state.remaining -= 1
+                if chunk_state.remaining == 0 and not chunk_state.incomplete:
+                    await asyncio.to_thread(self.save_chunk, chunk_state, engine)
+                    chunk_state.file.chunks_done += 1
+                    self.finish_file_if_done(chunk_state.file)
 
-                    try:
-                        output_df.to_csv(output_path, index=False)
-                        self.log.emit(f"Saved processed data to: {output_path}")
-                        logging.info(f"Saved processed data to: {output_path}")
-                    except Exception as e:
-                        self.log.emit(f"Failed to save {output_path}: {str(e)}")
-                        logging.error(f"Failed to save {output_path}: {str(e)}")
+    async def batch_stage(self, request_queue: asyncio.Queue, result_queue: asyncio.Queue, client: BatchClient):
+        """Write rendered rows to batch input files and submit each one once it reaches the provider's limits."""
+        jobs = {}
+        input_path = None
+        input_file = None
+        input_bytes = 0
+        batch_number = 0
+        run_stamp = time.strftime('%Y%m%d_%H%M%S')
+        try:
+            while True:
+                job = await request_queue.get()
+                if job is END_OF_STREAM:
+                    break
+                if not self.is_running:
+                    await result_queue.put((job, SKIPPED))
+                    continue
+                custom_id = make_custom_id(job.chunk.file.file_name, job.chunk.start_row + job.position)
+                line = request_line(custom_id, self.model_config, job.messages, self.response_format).encode('utf-8')
+                if jobs and (len(jobs) >= MAX_BATCH_REQUESTS or input_bytes + len(line) > MAX_BATCH_BYTES):
+                    input_file.close()
+                    await self.submit_batch(client, input_path, jobs, result_queue)
+                    jobs, input_file, input_bytes = {}, None, 0
+                if input_file is None:
+                    batch_number += 1
+                    input_path = os.path.join(self.output_dir, f'batch_input_{run_stamp}_{batch_number:03d}.jsonl')
+                    input_file = open(input_path, 'wb')
+                input_file.write(line)
+                input_bytes += len(line)
+                # The request lives in the input file now; only the job's place in its chunk is kept
+                job.messages = None
+                jobs[custom_id] = job
+        finally:
+            if input_file is not None:
+                input_file.close()
+        if not jobs:
+            return
+        if self.is_running:
+            await self.submit_batch(client, input_path, jobs, result_queue)
+        else:
+            os.remove(input_path)
+            for job in jobs.values():
+                await result_queue.put((job, SKIPPED))
 
-            self.log.emit("LLM Runner completed successfully.")
-            logging.info("LLM Runner completed successfully.")
-            self.finished_signal.emit()
+    async def submit_batch(self, client: BatchClient, input_path: str, jobs: Dict[str, RowJob],
+                           result_queue: asyncio.Queue):
+        try:
+            batch_id = await client.submit(input_path, {'input_file': os.path.basename(input_path)})
+        except Exception as e:
+            self.log.emit(f"Failed to submit batch job {input_path}: {str(e)}")
+            logging.error(f"Failed to submit batch job {input_path}: {str(e)}")
+            for job in jobs.values():
+                await result_queue.put((job, RowFailure(f"Batch submission failed: {str(e)}")))
+            return
+        finally:
+            os.remove(input_path)
+        self.batch_store.add(batch_id, len(jobs))
+        self.log.emit(f"Submitted batch job {batch_id} with {len(jobs)} requests.")
+        logging.info(f"Submitted batch job {batch_id} with {len(jobs)} requests.")
+        task = asyncio.ensure_future(self.collect_batch(client, batch_id, jobs, result_queue))
+        self.batch_tasks.add(task)
+        task.add_done_callback(self.batch_tasks.discard)
 
+    async def collect_batch(self, client: BatchClient, batch_id: str, jobs: Dict[str, RowJob],
+                            result_queue: asyncio.Queue):
+        """Wait for a submitted job and hand its rows to the writer like real-time results."""
+        batch = await self.wait_for_batch(client, batch_id)
+        lines = None
+        if batch is not None:
+            try:
+                lines = await client.results(batch)
+            except Exception as e:
+                self.log.emit(f"Failed to download results of batch job {batch_id}: {str(e)}")
+                logging.error(f"Failed to download results of batch job {batch_id}: {str(e)}")
+        if lines is None:
+            # The job stays in the store and is collected on the next run
+            for job in jobs.values():
+                await result_queue.put((job, SKIPPED))
+            return
+
+        for line in lines:
+            job = jobs.pop(line.get('custom_id'), None)
+            if job is not None:
+                await result_queue.put((job, self.parse_batch_line(line)))
+        # Rows of expired or cancelled jobs that never ran are sent again on the next run
+        for job in jobs.values():
+            await result_queue.put((job, RowFailure(f"Batch job {batch.status} before the row ran")))
+        self.batch_store.remove(batch_id)
+        self.log.emit(f"Batch job {batch_id} {batch.status}: {len(lines)} results merged.")
+        logging.info(f"Batch job {batch_id} {batch.status}: {len(lines)} results merged.")
+
+    async def resume_batches(self, client: BatchClient):
+        """Merge the results of jobs submitted by an earlier run into the row journals."""
+        if not self.batch_store.jobs:
+            return
+        self.log.emit(f"Collecting {len(self.batch_store.jobs)} batch jobs from an earlier run...")
+        logging.info(f"Collecting {len(self.batch_store.jobs)} batch jobs from an earlier run.")
+        for batch_id in list(self.batch_store.jobs):
+            batch = await self.wait_for_batch(client, batch_id)
+            if batch is None:
+                if not self.is_running:
+                    return
+                continue
+            try:
+                lines = await client.results(batch)
+            except Exception as e:
+                # The job stays in the store and is collected on the next run
+                self.log.emit(f"Failed to download results of batch job {batch_id}: {str(e)}")
+                logging.error(f"Failed to download results of batch job {batch_id}: {str(e)}")
+                continue
+            merged = 0
+            for line in lines:
+                file_name, row_id = parse_custom_id(line['custom_id'])
+                result = self.parse_batch_line(line)
+                if isinstance(result, RowFailure):
+                    continue
+                if file_name not in self.resumed_journals:
+                    self.resumed_journals[file_name] = RowJournal(self.journal_path(file_name),
+                                                                  self.file_layout(file_name))
+                    self.journals.append(self.resumed_journals[file_name])
+                self.resumed_journals[file_name].record(row_id, result)
+                merged += 1
+            for journal in self.resumed_journals.values():
+                journal.sync()
+            self.batch_store.remove(batch_id)
+            self.log.emit(f"Batch job {batch_id} {batch.status}: {merged} rows merged.")
+            logging.info(f"Batch job {batch_id} {batch.status}: {merged} rows merged.")
+
+    async def wait_for_batch(self, client: BatchClient, batch_id: str):
+        """Poll a batch job until it finishes; None if the runner was stopped or polling gave up first."""
+        delay = POLL_INITIAL_SECONDS
+        last_report = None
+        failures = 0
+        while True:
+            try:
+                batch = await client.retrieve(batch_id)
+                failures = 0
+                if batch.status in TERMINAL_STATUSES:
+                    return batch
+                counts = batch.request_counts
+                report = (batch.status, counts.completed if counts else 0)
+                if report != last_report:
+                    last_report = report
+                    self.log.emit(f"Batch job {batch_id}: {batch.status}"
+                                  + (f", {counts.completed}/{counts.total} done" if counts else ""))
+                    logging.info(f"Batch job {batch_id}: {batch.status}")
+            except Exception as e:
+                failures += 1
+                status_code = getattr(e, 'status_code', None)
+                if status_code == 404:
+                    # The provider does not know the job, so its rows are sent again on the next run
+                    self.log_warning(f"Batch job {batch_id} was not found and is dropped: {str(e)}")
+                    self.batch_store.remove(batch_id)
+                    return None
+                if status_code in POLL_FATAL_STATUS_CODES or failures >= MAX_POLL_FAILURES:
+                    self.log_warning(f"Gave up polling batch job {batch_id}; it is collected on the next run: "
+                                     f"{str(e)}")
+                    return None
+                # Polling is retried; the job keeps running on the provider's side
+                logging.warning(f"Failed to poll batch job {batch_id}: {str(e)}")
+            if not await self.sleep_while_running(delay):
+                return None
+            delay = min(delay * 2, POLL_MAX_SECONDS)
+
+    async def sleep_while_running(self, seconds: float) -> bool:
+        deadline = time.monotonic() + seconds
+        while self.is_running and time.monotonic() < deadline:
+            await asyncio.sleep(min(0.5, deadline - time.monotonic()))
+        return self.is_running
+
+    def parse_batch_line(self, line: Dict[str, Any]) -> Any:
+        text, error = response_text(line)
+        usage = response_usage(line)
+        if usage is not None:
+            self.token_usage.add(*usage)
+        if error is not None:
+            return RowFailure(error)
+        try:
+            return self.with_model(self.parse_result(text), self.model_names[0])
         except Exception as e:
-            self.log.emit(f"Critical error: {str(e)}")
-            logging.exception(f"Critical error: {str(e)}")
-            self.finished_signal.emit()
+            # Unparseable rows are left out of the journal and sent again on the next run
+            logging.error(f"Response parsing error: {str(e)}")
+            return RowFailure(f"Response parsing error: {str(e)}")
+
+    def journal_path(self, file_name: str) -> str:
+        return os.path.join(self.output_dir, os.path.splitext(file_name)[0] + '.journal.jsonl')
+
+    def finish_file_if_done(self, file_state: FileState):
+        if file_state.chunk_count is None or file_state.chunks_done < file_state.chunk_count:
+            return
+        file_state.journal.close()
+        self.active_files.pop(file_state.file_name, None)
+        try:
+            self.sink.finish_file(file_state.file_name)
+        except Exception as e:
+            self.log.emit(f"Failed to finalize output of {file_state.file_name}: {str(e)}")
+            logging.error(f"Failed to finalize output of {file_state.file_name}: {str(e)}")
+        summary = (f"{file_state.processed_rows} rows, "
+                   f"{file_state.duplicate_rows} calls saved by deduplication")
+        if file_state.tokens_saved:
+            summary += f", ~{file_state.tokens_saved} input tokens saved by preprocessing"
+        if file_state.oversized_rows:
+            summary += f", {file_state.oversized_rows} rows too long for any model"
+        self.log.emit(f"Finished file: {file_state.file_name} ({summary})")
+        logging.info(f"Finished file: {file_state.file_name} ({summary})")
+
+    def chunk_layout(self) -> Dict[str, Any]:
+        """How input files are cut into chunks; outputs written under another layout are rebuilt."""
+        if not self.batch_tokens:
+            return {'batch_size': self.batch_size}
+        # Preprocessing changes the token counts chunks are cut by
+        return {'batch_size': self.batch_size, 'batch_tokens': self.batch_tokens,
+                'tokenizer': self.token_counter.name, 'preprocessing': self.prompt.get('preprocessing', {})}
+
+    def file_layout(self, file_name: str) -> Dict[str, Any]:
+        """Chunk layout of one input file.
+
+        Chunk outputs written before the row journal existed were cut by row count
+        alone, and are only found by chunk number; such a file keeps being cut that
+        way, so its old outputs are neither requested again nor misnumbered.
+        """
+        journal_path = self.journal_path(file_name)
+        if os.path.exists(journal_path):
+            legacy_outputs = bool((RowJournal.stored_layout(journal_path) or {}).get(LEGACY_OUTPUTS))
+        else:
+            legacy_outputs = self.sink.has_chunk_outputs(file_name)
+        if legacy_outputs:
+            return {'batch_size': self.batch_size, LEGACY_OUTPUTS: True}
+        return self.chunk_layout()
+
+    def save_chunk(self, chunk_state: ChunkState, engine: AsyncRequestEngine):
+        file_state = chunk_state.file
+        # Failed rows stay in place with their error so output rows line up with input rows
+        rows = []
+        for position, result in enumerate(chunk_state.results):
+            row = {'source_file': file_state.file_name, 'row_index': chunk_state.start_row + position}
+            if isinstance(result, RowFailure):
+                row['error'] = result.error
+            elif isinstance(result, dict):
+                row.update(result)
+            else:
+                row['result'] = result
+            rows.append(row)
+
+        # Update progress
+        file_state.processed_rows += len(chunk_state.results)
+        file_state.advance(chunk_state.byte_span)
+        self.byte_progress.advance(chunk_state.byte_span)
+        self.progress.emit(self.byte_progress.percent())
+
+        # Save processed results to the output sink
+        try:
+            file_state.journal.sync()
+            output_path = self.sink.write_chunk(file_state.file_name, chunk_state.chunk_number, rows)
+            stats = f"{engine.stats()}, {self.http_client.stats()}"
+            self.log.emit(f"Saved processed data to: {output_path} ({stats})")
+            self.log.emit(f"Progress: {self.byte_progress.describe()} | " + ", ".join(
+                f"{active.file_name} {active.percent()}% ({active.processed_rows} rows)"
+                for active in list(self.active_files.values())
+            ))
+            logging.info(f"Saved processed data to: {output_path} ({stats})")
+        except Exception as e:
+            self.log.emit(f"Failed to save chunk {chunk_state.chunk_number} of {file_state.file_name}: {str(e)}")
+            logging.error(f"Failed to save chunk {chunk_state.chunk_number} of {file_state.file_name}: {str(e)}")
+
+    def log_warning(self, message: str):
+        self.log.emit(message)
+        logging.warning(message)
+
+    def stop(self, drain: bool = False):
+        """Stop the run from the GUI thread without waiting for it.
 
-    def stop(self):
+        Queued rows are not sent. Requests under way are cancelled, or with `drain`
+        the ones already sent are answered first. Every answered row is journaled
+        and skipped by the next run; chunks with unanswered rows are not written.
+        """
         self.is_running = False
-        self.log.emit("Stopping LLM Runner...")
-        logging.info("LLM Runner stopping...")
+        if drain:
+            self.log.emit("Draining LLM Runner: finishing requests already sent...")
+            logging.info("LLM Runner draining...")
+        else:
+            self.log.emit("Stopping LLM Runner...")
+            logging.info("LLM Runner stopping...")
+        if self.loop is not None and self.engine is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.engine.cancel_requests, drain)
+            except RuntimeError:
+                # The event loop already finished
+                pass
 
-    def initialize_prompt_template(self) -> ChatPromptTemplate:
+    def initialize_prompt_template(self) -> PromptRenderer:
         system_prompt_template = self.prompt['system_prompt_template']
         user_prompt_template = self.prompt['user_prompt_template']
         prompt_keys = self.prompt['keys']
-        prompt_template = ChatPromptTemplate.from_messages(
-            [("system", system_prompt_template), ("user", user_prompt_template)]
-        )
+        # Templates are compiled once and rendered per chunk from column arrays
+        # Providers cache the longest prompt prefix shared by recent requests, so row values in the
+        # system prompt make every request pay full price for the whole prompt
+        prompt_template = PromptRenderer(system_prompt_template, user_prompt_template, prompt_keys,
+                                         elided_keys=self.preprocessor.elided_keys,
+                                         cache_friendly=bool(self.prompt.get('cache_friendly_layout', False)))
+        row_fields = ', '.join(prompt_template.system_row_fields)
+        if prompt_template.moved_fields:
+            self.log.emit(f"Cache-friendly layout: moved {row_fields} from the system prompt to the user message")
+            logging.info(f"Cache-friendly layout: moved {row_fields} from the system prompt to the user message")
+        elif row_fields:
+            self.log_warning(f"The system prompt uses row variables ({row_fields}), so requests share no cacheable "
+                             f"prefix; set cache_friendly_layout on the prompt to move them to the user message.")
         return prompt_template
 
-    def initialize_model(self) -> ChatOpenAI:
-        llm_model = self.model_config['llm_model']
-        model_type = self.model_config['type']
-        api_key_name = self.model_config['api_key_name']
+    def initialize_models(self) -> Dict[str, Dict[str, ChatOpenAI]]:
+        """Model clients per model name of the chain, one per API key of that model."""
+        models = {}
+        for model_name, model_config in self.model_configs.items():
+            api_key_names = split_key_names(model_config['api_key_name'])
+            models[model_name] = {name: self.initialize_model(model_config, self.load_api_key(name))
+                                  for name in api_key_names}
+            if len(api_key_names) > 1:
+                self.log.emit(f"Model '{model_name}' uses a pool of {len(api_key_names)} API keys: "
+                              f"{', '.join(api_key_names)}")
+                logging.info(f"Model '{model_name}' uses a pool of {len(api_key_names)} API keys: "
+                             f"{', '.join(api_key_names)}")
+        return models
 
+    def initialize_model(self, model_config: Dict[str, Any], api_key: str) -> ChatOpenAI:
+        llm_model = model_config['llm_model']
+        model_type = model_config['type']
+
+        # Initialize the model
+        if llm_model == 'ChatGPT':
+            try:
+                # base_url points the model at another OpenAI-compatible endpoint. The client does not retry on
+                # its own: the retry queue, key pool and circuit breakers decide what happens to a failed request
+                model = ChatOpenAI(model=model_type, api_key=api_key, base_url=model_config.get('base_url'),
+                                   http_async_client=self.http_client.client, timeout=self.http_client.timeout,
+                                   max_retries=0)
+                logging.info(f"Initialized ChatOpenAI model: {model_type}")
+                if self.response_format:
+                    # Structured outputs make the response follow the prompt's schema
+                    model = model.bind(response_format=self.response_format)
+                    logging.info(f"Requesting schema-constrained output (strict: "
+                                 f"{self.response_format['json_schema']['strict']})")
+                return model
+            except Exception as e:
+                self.log.emit(f"Failed to initialize ChatOpenAI model: {str(e)}")
+                logging.error(f"Failed to initialize ChatOpenAI model: {str(e)}")
+                raise e
+        else:
+            self.log.emit(f"Model type '{llm_model}' not supported.")
+            logging.error(f"Model type '{llm_model}' not supported.")
+            raise NotImplementedError("Provided model type is not supported.")
+
+    def load_api_key(self, api_key_name: str) -> str:
         # Load or generate the encryption key
         if not os.path.exists(SECRET_KEY_PATH):
             self.log.emit(f"Secret key not found at {SECRET_KEY_PATH}.")
@@ -203,103 +970,161 @@ class LLMRunnerThread(QThread):
             self.log.emit(f"Failed to load or decrypt API key: {str(e)}")
             logging.error(f"Failed to load or decrypt API key: {str(e)}")
             raise e
+        return api_key
 
-        # Initialize the model
-        if llm_model == 'ChatGPT':
-            try:
-                model = ChatOpenAI(model=model_type, api_key=api_key)
-                logging.info(f"Initialized ChatOpenAI model: {model_type}")
-                return model
-            except Exception as e:
-                self.log.emit(f"Failed to initialize ChatOpenAI model: {str(e)}")
-                logging.error(f"Failed to initialize ChatOpenAI model: {str(e)}")
-                raise e
-        else:
-            self.log.emit(f"Model type '{llm_model}' not supported.")
-            logging.error(f"Model type '{llm_model}' not supported.")
-            raise NotImplementedError("Provided model type is not supported.")
-
-    def initialize_output_parser(self) -> StrOutputParser:
+    def initialize_output_parser(self) -> BaseOutputParser:
         if self.output_parser_type == 'StrOutputParser':
             return StrOutputParser()
+        elif self.output_parser_type == 'AnalysisDictParser':
+            return AnalysisDictParser(response_schema=self.output_schema)
         else:
             self.log.emit(f"Output parser '{self.output_parser_type}' not supported.")
             logging.error(f"Output parser '{self.output_parser_type}' not supported.")
             raise NotImplementedError("Provided output parser type is not supported.")
 
-    def prepare_message_batch(self, batch: pd.DataFrame, prompt_template: ChatPromptTemplate) -> List[List[Dict[str, str]]]:
-        message_batch = []
-        prompt_keys = self.prompt['keys']
-        for _, row in batch.iterrows():
-            # Create prompt for each row
-            prompt_data = {key: str(row.get(key, '')) for key in prompt_keys}
-            prompt = prompt_template.invoke(prompt_data)
-            messages = prompt.to_messages()
-            message_batch.append(messages)
-        return message_batch
-
-    def process_batch_with_retries(self, model: ChatOpenAI, parser: StrOutputParser, message_batch: List[List[Dict[str, str]]], retries: int = 3) -> List[Dict[str, Any]]:
-        attempt = 0
-        delay = 2  # Initial delay in seconds
-        parsed_results = []
-
-        while attempt < retries and self.is_running:
-            try:
-                # Process the batch through the model and parser
-                chain = model | parser
-                results = chain.batch(message_batch)  # Expected to return a list of JSON strings
+    def result_fields(self, output_parser: BaseOutputParser) -> Optional[Dict[str, str]]:
+        """Columns of a parsed result, so typed sinks can lay out their tables up front."""
+        if isinstance(output_parser, AnalysisDictParser):
+            return ANALYSIS_FIELDS
+        return fields_from_schema(self.output_schema)
 
-                # Parse the results
+    def prepare_message_batch(self, batch: pd.DataFrame, prompt_template: PromptRenderer) -> List[List[BaseMessage]]:
+        return prompt_template.render_batch(batch)
 
-                for i, result in enumerate(results):
-                    try:
-                        data_dict = ast.literal_eval(result)
-                        parsed_results.append(data_dict)
-                    except Exception as e:
-                        logging.info(f"result: {result}")
-                        logging.error(f"Response parsing error: {str(e)}")
-                        logging.info(f"Retrying for the problematic data.")
-                        self.log.emit(f"Retrying for the problematic data.")
-
-                        # Retry the specific error twice more
-                        specific_attempt = 0
-                        while specific_attempt < retries and self.is_running:
-                            re_result = chain.invoke(message_batch[i])
-                            try:
-                                specific_data_dict = ast.literal_eval(re_result)
-                                parsed_results.append(specific_data_dict)
-                                break
-                            except Exception as e:
-                                logging.info(f"result: {re_result}")
-                                logging.error(f"Response parsing error: {str(e)}")
-                                logging.info(f"Retrying for the problematic data {specific_attempt + 1} times.")
-                                self.log.emit(f"Retrying for the problematic data {specific_attempt + 1} times.")
-                            specific_attempt += 1
-                        if specific_attempt >= retries:
-                            logging.info(f"Failed to retrieve correct data format.")
-                            self.log.emit(f"Failed to retrieve correct data format.")
-
-                return parsed_results
+    def parse_result(self, result: str) -> Dict[str, Any]:
+        if isinstance(self.output_parser, StrOutputParser):
+            if self.output_schema:
+                data = json.loads(result)
+                validate_against_schema(data, self.output_schema)
+                return data
+            return ast.literal_eval(result)
+        # Structured parsers repair what they can and raise only for unrecoverable responses
+        return self.output_parser.parse(result)
 
+    def pack_chain(self, model: Any) -> Any:
+        """The model client asking for the packed output format, when packing is on."""
+        if self.pack_size <= 1:
+            return None
+        return model.bind(response_format=self.pack_response_format)
+
+    def make_pack(self, rows: List[RowJob]) -> PackJob:
+        messages = pack_messages([row_job.messages for row_job in rows])
+        # Every row of the pack gets its own share of the response
+        tokens = (sum(self.token_counter.count(message.content) for message in messages)
+                  + 2 * TOKENS_PER_MESSAGE + (len(rows) - 1) * EXPECTED_RESPONSE_TOKENS)
+        return PackJob(rows=rows, messages=messages, tokens=tokens)
+
+    def parse_packed_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        if isinstance(self.output_parser, StrOutputParser):
+            if self.output_schema:
+                validate_against_schema(result, self.output_schema)
+            return result
+        return self.output_parser.parse(json.dumps(result))
+
+    async def attempt_pack(self, engine: AsyncRequestEngine, pack: PackJob, result_queue: asyncio.Queue):
+        """Send several rows as one request and split the response back to them.
+
+        A failed request is retried as a pack; a response that does not match the
+        rows one to one sends every row again on its own, and a single result that
+        does not parse sends only its row again.
+        """
+        try:
+            result, model_name = await engine.invoke(pack.messages, tokens=pack.tokens, packed=True)
+        except RequestCancelled:
+            for row_job in pack.rows:
+                await result_queue.put((row_job, SKIPPED))
+            return
+        except Exception as e:
+            pack.attempts += 1
+            logging.warning(f"Packed request of {len(pack.rows)} rows failed on attempt {pack.attempts}: {str(e)}")
+            if pack.attempts < MAX_RETRIES:
+                self.schedule_retry(engine, pack, result_queue, RETRY_BASE_DELAY * (2 ** (pack.attempts - 1)))
+                return
+            self.unpack_to_rows(engine, pack.rows, result_queue, str(e))
+            return
+        try:
+            results = unpack_results(result, len(pack.rows))
+        except ValueError as e:
+            self.unpack_to_rows(engine, pack.rows, result_queue, str(e))
+            return
+        self.pack_requests += 1
+        for row_job, row_result in zip(pack.rows, results):
+            try:
+                parsed = self.with_model(self.parse_packed_result(row_result), model_name)
             except Exception as e:
-                attempt += 1
-                self.log.emit(f"Batch processing failed on attempt {attempt}: {str(e)}")
-                logging.warning(f"Batch processing failed on attempt {attempt}: {str(e)}")
-
-                if "rate limit" in str(e).lower():
-                    # Specific handling for rate limits
-                    wait_time = delay * (2 ** (attempt - 1))
-                    self.log.emit(f"Rate limit encountered. Waiting for {wait_time} seconds before retrying...")
-                    logging.warning(f"Rate limit encountered. Waiting for {wait_time} seconds before retrying...")
-                    time.sleep(wait_time)
-                else:
-                    # General exponential backoff
-                    self.log.emit(f"Retrying in {delay} seconds...")
-                    logging.info(f"Retrying in {delay} seconds...")
-                    time.sleep(delay)
-                    delay *= 2  # Exponential backoff
+                self.unpack_to_rows(engine, [row_job], result_queue, f"Response parsing error: {str(e)}")
+                continue
+            self.packed_rows += 1
+            await result_queue.put((row_job, parsed))
+
+    def unpack_to_rows(self, engine: AsyncRequestEngine, rows: List[RowJob], result_queue: asyncio.Queue,
+                       reason: str):
+        """Send rows a pack could not answer again as single-row requests."""
+        self.pack_fallbacks += len(rows)
+        logging.warning(f"Sending {len(rows)} packed rows one by one: {reason}")
+        for row_job in rows:
+            self.schedule_retry(engine, row_job, result_queue, 0)
+
+    async def attempt_row(self, engine: AsyncRequestEngine, job: RowJob, result_queue: asyncio.Queue) -> Any:
+        """Send one request for a row; a failed row goes to the retry queue instead of holding up a worker."""
+        try:
+            # A response that failed to parse is fetched fresh rather than from the cache
+            result, model_name = await engine.invoke(job.messages, refresh=job.format_attempts > 0,
+                                                      tokens=job.tokens)  # Expected to return a JSON string
+        except RequestCancelled:
+            return SKIPPED
+        except Exception as e:
+            job.attempts += 1
+            self.log.emit(f"Request failed on attempt {job.attempts}: {str(e)}")
+            logging.warning(f"Request failed on attempt {job.attempts}: {str(e)}")
+            if job.attempts >= MAX_RETRIES:
+                self.log.emit("All retry attempts failed for the current row.")
+                logging.error("All retry attempts failed for the current row.")
+                return RowFailure(str(e))
+
+            wait_time = RETRY_BASE_DELAY * (2 ** (job.attempts - 1))
+            if "rate limit" in str(e).lower():
+                # Specific handling for rate limits
+                self.log.emit(f"Rate limit encountered. Retrying the row in {wait_time} seconds...")
+                logging.warning(f"Rate limit encountered. Retrying the row in {wait_time} seconds...")
+            else:
+                # General exponential backoff
+                logging.info(f"Retrying the row in {wait_time} seconds...")
+            self.schedule_retry(engine, job, result_queue, wait_time)
+            return RETRY_SCHEDULED
+
+        # Parse the result
+        try:
+            return self.with_model(self.parse_result(result), model_name)
+        except Exception as e:
+            job.format_attempts += 1
+            logging.info(f"result: {result}")
+            logging.error(f"Response parsing error: {str(e)}")
+            if job.format_attempts > MAX_RETRIES:
+                logging.info(f"Failed to retrieve correct data format.")
+                self.log.emit(f"Failed to retrieve correct data format.")
+                return RowFailure(f"Response parsing error: {str(e)}")
+            logging.info(f"Retrying for the problematic data {job.format_attempts} times.")
+            self.log.emit(f"Retrying for the problematic data {job.format_attempts} times.")
+            self.schedule_retry(engine, job, result_queue, 0)
+            return RETRY_SCHEDULED
+
+    @staticmethod
+    def with_model(result: Any, model_name: Optional[str]) -> Dict[str, Any]:
+        """Tag a parsed row with the model that answered it."""
+        if not isinstance(result, dict):
+            result = {'result': result}
+        return {**result, 'model': model_name}
 
-        self.log.emit("All retry attempts failed for the current batch.")
-        logging.error("All retry attempts failed for the current batch.")
-        return []
+    def schedule_retry(self, engine: AsyncRequestEngine, job: Union[RowJob, PackJob], result_queue: asyncio.Queue,
+                       delay: float):
+        task = asyncio.ensure_future(self.retry_row(engine, job, result_queue, delay))
+        self.retry_tasks.add(task)
+        task.add_done_callback(self.retry_tasks.discard)
 
+    async def retry_row(self, engine: AsyncRequestEngine, job: Union[RowJob, PackJob], result_queue: asyncio.Queue,
+                        delay: float):
+        """Re-submit only this row (or pack) after its own backoff, concurrently with the rest of the run."""
+        # A stop ends the wait early; send_job then skips the row
+        await self.sleep_while_running(delay)
+        await self.send_job(engine, job, result_queue)
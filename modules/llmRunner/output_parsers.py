@@ -0,0 +1,209 @@
+import ast
+import json
+import re
+from typing import Any, Dict, Optional
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import BaseOutputParser
+
+CODE_FENCE = re.compile(r"```[a-zA-Z]*\s*(.*?)```", re.DOTALL)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+BARE_KEY = re.compile(r"([{,]\s*)([A-Za-z_][A-Za-z0-9_.\-]*)\s*:")
+KEY_MISSING_CLOSING_QUOTE = re.compile(r"([{,]\s*)(['\"])([A-Za-z_][A-Za-z0-9_.\-]*):")
+# The prompts interpolate {Date} unquoted, which yields values like 2020-01-02
+UNQUOTED_DATE = re.compile(r"(['\"]date['\"]\s*:\s*)([^'\"\s,}][^,}\n]*?)(\s*[,}\n])")
+JSON_LITERALS = {'true': 'True', 'false': 'False', 'null': 'None'}
+SMART_QUOTES = str.maketrans({'‘': "'", '’': "'", '“': '"', '”': '"'})
+JSON_TYPES = {
+    'object': dict, 'array': list, 'string': str, 'integer': int,
+    'number': (int, float), 'boolean': bool, 'null': type(None),
+}
+# Columns of a parsed analysis result and their storage types; score dicts are stored as JSON text
+ANALYSIS_FIELDS = {
+    'date': 'string', 'sentiment': 'double', 'reliability': 'double', 'relevance': 'string', 'prediction': 'string',
+}
+
+
+def validate_against_schema(value: Any, schema: Dict[str, Any], path: str = '$'):
+    """Check a parsed response against the subset of JSON Schema used by prompt output schemas."""
+    expected = schema.get('type')
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        python_types = []
+        for name in types:
+            python_type = JSON_TYPES[name]
+            python_types.extend(python_type if isinstance(python_type, tuple) else (python_type,))
+        # bool is an int in Python but not a number in JSON
+        is_bool_mismatch = isinstance(value, bool) and 'boolean' not in types
+        if is_bool_mismatch or not isinstance(value, tuple(python_types)):
+            raise OutputParserException(f"{path} should be {' or '.join(types)}, got {type(value).__name__}")
+    if 'enum' in schema and value not in schema['enum']:
+        raise OutputParserException(f"{path} should be one of {schema['enum']}, got {value!r}")
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                raise OutputParserException(f"{path} is missing '{key}'")
+        for key, property_schema in schema.get('properties', {}).items():
+            if key in value:
+                validate_against_schema(value[key], property_schema, f"{path}.{key}")
+    elif isinstance(value, list) and 'items' in schema:
+        for index, item in enumerate(value):
+            validate_against_schema(item, schema['items'], f"{path}[{index}]")
+
+
+def is_strict_schema(schema: Dict[str, Any]) -> bool:
+    """Whether a schema meets the provider's strict mode rules (closed objects, every property required)."""
+    if schema.get('type') == 'object' or 'properties' in schema:
+        properties = schema.get('properties', {})
+        if schema.get('additionalProperties') is not False or set(schema.get('required', [])) != set(properties):
+            return False
+        return all(is_strict_schema(property_schema) for property_schema in properties.values())
+    if 'items' in schema:
+        return is_strict_schema(schema['items'])
+    return True
+
+
+def schema_response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenAI `response_format` asking for output that follows `schema`."""
+    return {
+        'type': 'json_schema',
+        'json_schema': {'name': name, 'schema': schema, 'strict': is_strict_schema(schema)},
+    }
+
+
+def strip_code_fences(text: str) -> str:
+    match = CODE_FENCE.search(text)
+    return match.group(1) if match else text
+
+
+def extract_outermost_dict(text: str) -> Optional[str]:
+    """The first balanced {...} block, ignoring braces inside quotes; an unclosed block is closed."""
+    start = text.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    quote = None
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif quote:
+            if char == quote:
+                quote = None
+        elif char in ('"', "'"):
+            quote = char
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    end = text.rfind('}')
+    if quote and end > start:
+        # An unbalanced quote hid the closing brace; fall back to the last one
+        return text[start:end + 1]
+    # Output cut off before the closing braces
+    return text[start:] + '}' * max(depth, 1)
+
+
+def _replace_json_literals(text: str) -> str:
+    return re.sub(r"\b(true|false|null)\b", lambda match: JSON_LITERALS[match.group(1)], text)
+
+
+def _literal(text: str) -> Any:
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return json.loads(text)
+
+
+def _as_float(value: Any, name: str, low: float, high: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise OutputParserException(f"'{name}' is not a number: {value!r}")
+    return min(high, max(low, number))
+
+
+def _as_score_dict(value: Any, name: str, low: float, high: float) -> Dict[str, float]:
+    if value in (None, '', [], ()):
+        return {}
+    if isinstance(value, list):
+        # Schema-constrained responses list scores as [{'ticker': ..., 'score': ...}]
+        try:
+            value = {item['ticker']: item['score'] for item in value}
+        except (TypeError, KeyError):
+            raise OutputParserException(f"'{name}' is not a list of ticker scores: {value!r}")
+    if not isinstance(value, dict):
+        raise OutputParserException(f"'{name}' is not a dictionary: {value!r}")
+    return {str(ticker).strip().upper(): _as_float(score, name, low, high) for ticker, score in value.items()}
+
+
+def _score_lists(data: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    """`data` with {'TICKER': score} dicts turned into ticker/score lists where the schema declares those."""
+    shaped = dict(data)
+    for name, property_schema in schema.get('properties', {}).items():
+        item_properties = property_schema.get('items', {}).get('properties', {})
+        if isinstance(shaped.get(name), dict) and {'ticker', 'score'} <= set(item_properties):
+            shaped[name] = [{'ticker': ticker, 'score': score} for ticker, score in shaped[name].items()]
+    return shaped
+
+
+class AnalysisDictParser(BaseOutputParser[Dict[str, Any]]):
+    """Parses the sentiment/reliability/relevance/prediction dict requested by the stored prompts.
+
+    Responses are cleaned up locally (code fences, surrounding prose, JSON
+    literals, trailing commas, bare or half-quoted keys, missing closing braces)
+    and validated, so only responses that cannot be recovered are sent again.
+    """
+
+    repaired: int = 0
+    response_schema: Optional[Dict[str, Any]] = None  # The prompt's output schema, when it declares one
+
+    @property
+    def _type(self) -> str:
+        return 'analysis_dict'
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        candidate = extract_outermost_dict(strip_code_fences(text).translate(SMART_QUOTES))
+        if candidate is None:
+            raise OutputParserException(f"No dictionary found in response: {text[:200]!r}")
+
+        try:
+            data = _literal(candidate)
+        except Exception:
+            data = self._repair(candidate)
+            self.repaired += 1
+
+        if not isinstance(data, dict):
+            raise OutputParserException(f"Response is not a dictionary: {text[:200]!r}")
+        if self.response_schema:
+            # Score dicts as older prompts asked for them are accepted as well as the schema's lists
+            data = _score_lists(data, self.response_schema)
+            validate_against_schema(data, self.response_schema)
+        return self._validate(data)
+
+    def _repair(self, candidate: str) -> Any:
+        repaired = _replace_json_literals(candidate)
+        repaired = TRAILING_COMMA.sub(r"\1", repaired)
+        repaired = KEY_MISSING_CLOSING_QUOTE.sub(r"\1\2\3\2:", repaired)
+        repaired = BARE_KEY.sub(r"\1'\2':", repaired)
+        repaired = UNQUOTED_DATE.sub(r"\1'\2'\3", repaired)
+        try:
+            return _literal(repaired)
+        except Exception as e:
+            raise OutputParserException(f"Unrecoverable response: {str(e)}")
+
+    def _validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if 'sentiment' not in data:
+            raise OutputParserException("Response has no 'sentiment' score.")
+        return {
+            'date': '' if data.get('date') is None else str(data.get('date')),
+            'sentiment': _as_float(data['sentiment'], 'sentiment', -1.0, 1.0),
+            'reliability': _as_float(data.get('reliability', 0.0), 'reliability', 0.0, 1.0),
+            'relevance': _as_score_dict(data.get('relevance'), 'relevance', 0.0, 1.0),
+            'prediction': _as_score_dict(data.get('prediction'), 'prediction', -1.0, 1.0),
+        }
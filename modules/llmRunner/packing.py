@@ -0,0 +1,63 @@
+import json
+from typing import Any, Dict, List
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from modules.llmRunner.output_parsers import strip_code_fences
+
+# Rows whose values add at most this many tokens to the prompt are packed; longer rows are sent alone
+DEFAULT_PACK_ROW_TOKENS = 400
+
+RECORD_DELIMITER = "=== RECORD {index} ==="
+PACK_INSTRUCTIONS = (
+    "\n\n### Multiple Records\n"
+    "The user message holds {count} records, each starting with a line '=== RECORD <n> ==='. "
+    "Analyze every record on its own, exactly as instructed above for a single text. "
+    "Respond with one JSON object {{\"results\": [...]}} holding one result per record in record order, "
+    "each with an \"index\" field set to the record's number <n>."
+)
+
+
+class PackMismatch(ValueError):
+    """A packed response that cannot be matched back to its rows one to one."""
+
+
+def pack_messages(rows: List[List[BaseMessage]]) -> List[BaseMessage]:
+    """One request for several rows sharing a system message, with the user messages as numbered records."""
+    system_content = rows[0][0].content + PACK_INSTRUCTIONS.format(count=len(rows))
+    records = [RECORD_DELIMITER.format(index=index) + "\n" + messages[1].content
+               for index, messages in enumerate(rows, start=1)]
+    return [SystemMessage(content=system_content), HumanMessage(content="\n\n".join(records))]
+
+
+def pack_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Output schema of a pack: a list of the prompt's result objects, each with its record index."""
+    item = dict(schema)
+    item['properties'] = {'index': {'type': 'integer'}, **schema.get('properties', {})}
+    item['required'] = ['index'] + [name for name in schema.get('required', []) if name != 'index']
+    return {
+        'type': 'object',
+        'properties': {'results': {'type': 'array', 'items': item}},
+        'required': ['results'],
+        'additionalProperties': False,
+    }
+
+
+def unpack_results(text: str, count: int) -> List[Dict[str, Any]]:
+    """The result of each record of a packed response, in record order, without the index field."""
+    try:
+        data = json.loads(strip_code_fences(text))
+    except json.JSONDecodeError as e:
+        raise PackMismatch(f"Packed response is not JSON: {str(e)}")
+    results = data.get('results') if isinstance(data, dict) else data
+    if not isinstance(results, list) or not all(isinstance(result, dict) for result in results):
+        raise PackMismatch("Packed response has no list of results.")
+    if len(results) != count:
+        raise PackMismatch(f"Packed response has {len(results)} results for {count} records.")
+    by_index = {}
+    for position, result in enumerate(results, start=1):
+        index = result.pop('index', position)
+        if not isinstance(index, int) or not 1 <= index <= count or index in by_index:
+            raise PackMismatch(f"Packed response has an invalid or repeated record index {index!r}.")
+        by_index[index] = result
+    return [by_index[index] for index in range(1, count + 1)]
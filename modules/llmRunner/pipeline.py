@@ -0,0 +1,106 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Sentinel passed down the stage queues once a stage has no more work
+END_OF_STREAM = None
+
+# Result of a row that was never sent because the runner stopped
+SKIPPED = object()
+
+# Returned by a request attempt whose row went to the retry queue
+RETRY_SCHEDULED = object()
+
+
+@dataclass
+class RowFailure:
+    """Outcome of a row that exhausted its retries; it keeps its place in the output."""
+    error: str
+
+
+@dataclass
+class FileState:
+    """Progress bookkeeping for one input file."""
+    file_name: str
+    index: int
+    total_bytes: int
+    processed_rows: int = 0
+    chunk_count: Optional[int] = None  # Known once the whole file has been read
+    chunks_done: int = 0
+    duplicate_rows: int = 0
+    journal: Any = None  # RowJournal of rows already answered
+    done_bytes: int = 0
+    oversized_rows: int = 0
+    tokens_saved: int = 0
+
+    def advance(self, byte_count: int):
+        self.done_bytes += byte_count
+
+    def percent(self) -> int:
+        return min(100, int(self.done_bytes / max(self.total_bytes, 1) * 100))
+
+
+@dataclass
+class ChunkState:
+    """Rows of one output flush unit (up to `batch_size` rows and `batch_tokens` tokens) and their results."""
+    file: FileState
+    chunk_number: int
+    start_row: int
+    byte_span: int = 0
+    row_tokens: List[int] = field(default_factory=list)  # Estimated prompt tokens per row
+    results: List[Optional[Dict[str, Any]]] = field(default_factory=list)
+    remaining: int = 0
+    incomplete: bool = False
+
+
+@dataclass
+class RowJob:
+    """One rendered request waiting to be sent to the model."""
+    chunk: ChunkState
+    position: int
+    messages: Any
+    key: str = ''
+    tokens: int = 0
+    attempts: int = 0
+    format_attempts: int = 0
+
+
+@dataclass
+class PackJob:
+    """Several short rows sent as one request; rows its response cannot answer are sent again alone."""
+    rows: List[RowJob]
+    messages: Any
+    tokens: int = 0
+    attempts: int = 0
+
+
+class ByteProgress:
+    """Run progress and ETA measured in input bytes consumed, so no counting pass is needed."""
+
+    def __init__(self, total_bytes: int):
+        self.total_bytes = max(total_bytes, 1)
+        self.done_bytes = 0
+        self.worked_bytes = 0
+        self.started = time.monotonic()
+
+    def advance(self, byte_count: int, skipped: bool = False):
+        self.done_bytes += byte_count
+        if not skipped:
+            self.worked_bytes += byte_count
+
+    def percent(self) -> int:
+        return min(100, int(self.done_bytes / self.total_bytes * 100))
+
+    def eta_seconds(self) -> Optional[float]:
+        """Remaining time at the rate of bytes actually processed (skipped chunks excluded)."""
+        elapsed = time.monotonic() - self.started
+        if self.worked_bytes <= 0 or elapsed <= 0:
+            return None
+        return (self.total_bytes - self.done_bytes) / (self.worked_bytes / elapsed)
+
+    def describe(self) -> str:
+        eta = self.eta_seconds()
+        if eta is None:
+            return f"{self.percent()}% done"
+        hours, remainder = divmod(int(eta), 3600)
+        return f"{self.percent()}% done, ETA {hours}h {remainder // 60:02d}m"
@@ -0,0 +1,124 @@
+import html
+import re
+from typing import Any, Dict, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from modules.llmRunner.token_budget import TokenCounter
+
+# Cell values that mean "no value" once read as text
+EMPTY_VALUES = {'', 'nan', 'none', 'null'}
+
+TRUNCATE_MODES = ('head', 'tail', 'head_tail')
+TRUNCATION_MARKER = ' [...] '
+
+SCRIPT_PATTERN = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+# Only tags and comments; a '<' or '>' in running text (e.g. "revenue < 5%") is kept
+TAG_PATTERN = re.compile(r'<!--.*?-->|<[/!]?[A-Za-z][^<>]{0,1000}>', re.DOTALL)
+INLINE_SPACE_PATTERN = re.compile(r'[ \t\r\f\v\u00a0]+')
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n+')
+
+KEY_OPTIONS = ('strip_markup', 'compact_whitespace', 'boilerplate', 'max_tokens', 'truncate', 'elide_empty')
+
+
+def is_empty(value: str) -> bool:
+    return value.strip().lower() in EMPTY_VALUES
+
+
+def strip_markup(text: str) -> str:
+    """Drop HTML tags, scripts and styles and decode entities, keeping block breaks as new lines."""
+    text = SCRIPT_PATTERN.sub(' ', text)
+    text = re.sub(r'<(br|/p|/div|/li|/h[1-6])\b[^>]*>', '\n', text, flags=re.IGNORECASE)
+    return html.unescape(TAG_PATTERN.sub(' ', text))
+
+
+def compact_whitespace(text: str) -> str:
+    """Collapse runs of spaces and blank lines; paragraphs stay separated by one empty line."""
+    lines = [INLINE_SPACE_PATTERN.sub(' ', line).strip() for line in text.split('\n')]
+    return BLANK_LINES_PATTERN.sub('\n\n', '\n'.join(lines)).strip()
+
+
+class KeyPreprocessor:
+    """Cleanup and truncation of one prompt key, as configured under the prompt's `preprocessing` in prompts.json.
+
+    Options: `strip_markup`, `compact_whitespace`, `boilerplate` (regexes of whole
+    lines to drop, e.g. "^Advertisement$"), `max_tokens` with `truncate` (head,
+    tail or head_tail) and `elide_empty`, which drops the template section of an
+    empty value.
+    """
+
+    def __init__(self, key: str, options: Dict[str, Any]):
+        unknown = set(options) - set(KEY_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing options for '{key}': {', '.join(sorted(unknown))}")
+        self.key = key
+        self.strip_markup = bool(options.get('strip_markup', False))
+        self.compact_whitespace = bool(options.get('compact_whitespace', False))
+        self.boilerplate = [re.compile(pattern, re.IGNORECASE) for pattern in options.get('boilerplate', [])]
+        self.max_tokens = int(options.get('max_tokens') or 0)
+        self.truncate = options.get('truncate', 'head')
+        if self.truncate not in TRUNCATE_MODES:
+            raise ValueError(f"Truncation of '{key}' must be one of {', '.join(TRUNCATE_MODES)}.")
+        self.elide_empty = bool(options.get('elide_empty', False))
+
+    def clean(self, value: str) -> str:
+        if self.elide_empty and is_empty(value):
+            return ''
+        if self.strip_markup:
+            value = strip_markup(value)
+        if self.boilerplate:
+            value = '\n'.join(line for line in value.split('\n')
+                              if not any(pattern.search(line.strip()) for pattern in self.boilerplate))
+        if self.compact_whitespace:
+            value = compact_whitespace(value)
+        return value
+
+    def cut(self, value: str, counter: TokenCounter) -> str:
+        """Keep at most `max_tokens` tokens of the value, from its start, its end or both."""
+        if not self.max_tokens or len(value) <= self.max_tokens or counter.count(value) <= self.max_tokens:
+            return value
+        if self.truncate == 'head':
+            return counter.head(value, self.max_tokens) + TRUNCATION_MARKER.rstrip()
+        if self.truncate == 'tail':
+            return TRUNCATION_MARKER.lstrip() + counter.tail(value, self.max_tokens)
+        half = self.max_tokens // 2
+        return counter.head(value, self.max_tokens - half) + TRUNCATION_MARKER + counter.tail(value, half)
+
+
+class InputPreprocessor:
+    """Applies the prompt's per-key preprocessing to parsed chunks before they are budgeted and rendered."""
+
+    def __init__(self, config: Dict[str, Dict[str, Any]], keys: List[str], counter: TokenCounter):
+        unknown = set(config) - set(keys)
+        if unknown:
+            raise ValueError(f"Preprocessing is configured for keys that are not prompt keys: "
+                             f"{', '.join(sorted(unknown))}")
+        self.keys = [KeyPreprocessor(key, options) for key, options in config.items()]
+        self.counter = counter
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.keys)
+
+    @property
+    def elided_keys(self) -> Set[str]:
+        return {key.key for key in self.keys if key.elide_empty}
+
+    def describe(self) -> str:
+        return "Preprocessing " + ", ".join(key.key for key in self.keys)
+
+    def process(self, batch: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+        """The batch with its configured columns cleaned and truncated, and the input tokens that saved per row."""
+        saved = np.zeros(len(batch), dtype=np.int64)
+        for key in self.keys:
+            if key.key not in batch.columns:
+                continue
+            values = batch[key.key].astype(str).tolist()
+            processed = [key.cut(key.clean(value), self.counter) for value in values]
+            changed = [position for position, (value, new) in enumerate(zip(values, processed)) if new != value]
+            if changed:
+                saved[changed] += (self.counter.count_column([values[position] for position in changed])
+                                   - self.counter.count_column([processed[position] for position in changed]))
+            batch[key.key] = processed
+        return batch, saved
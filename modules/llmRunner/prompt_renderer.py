@@ -0,0 +1,159 @@
+from string import Formatter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# A compiled template is a list of (literal_text, field_name, format_spec) parts
+CompiledTemplate = List[Tuple[str, str, str]]
+
+# In the cache-friendly layout, row values in the system prompt are replaced by a reference
+# and given in the user message instead
+MOVED_FIELD_REFERENCE = "<{field}>"
+MOVED_FIELDS_NOTE = "\n\nValues written as <Name> above are given in the user message."
+MOVED_FIELD_HEADING = "### {field}\n"
+
+
+def compile_template(template: str) -> CompiledTemplate:
+    """Split an f-string style prompt template (as used by ChatPromptTemplate) into parts once."""
+    parts = []
+    for literal_text, field_name, format_spec, conversion in Formatter().parse(template):
+        if conversion:
+            raise ValueError(f"Conversion '!{conversion}' is not supported in prompt templates.")
+        parts.append((literal_text, field_name or '', format_spec or ''))
+    return parts
+
+
+def template_fields(compiled: CompiledTemplate) -> List[str]:
+    return [field_name for _, field_name, _ in compiled if field_name]
+
+
+def split_sections(compiled: CompiledTemplate) -> List[CompiledTemplate]:
+    """Split a compiled template at its blank lines; joining the sections with one restores it."""
+    sections = [[]]
+    for literal_text, field_name, format_spec in compiled:
+        pieces = literal_text.split('\n\n')
+        sections[-1].append((pieces[0], '', ''))
+        for piece in pieces[1:]:
+            sections.append([(piece, '', '')])
+        if field_name:
+            sections[-1].append(('', field_name, format_spec))
+    return sections
+
+
+def move_row_fields(system_parts: CompiledTemplate,
+                    user_parts: CompiledTemplate) -> Tuple[CompiledTemplate, CompiledTemplate]:
+    """Rewrite the templates so the system prompt has no row variables.
+
+    Each variable of the system template becomes a `<Name>` reference; variables
+    the user template does not already show get a section of their own at its start.
+    """
+    system_text = ''.join(literal_text + (MOVED_FIELD_REFERENCE.format(field=field_name) if field_name else '')
+                          for literal_text, field_name, _ in system_parts)
+    user_fields = set(template_fields(user_parts))
+    header, added = [], set()
+    for _, field_name, format_spec in system_parts:
+        if field_name and field_name not in user_fields and field_name not in added:
+            added.add(field_name)
+            header.append((('\n\n' if header else '') + MOVED_FIELD_HEADING.format(field=field_name),
+                           field_name, format_spec))
+    if header:
+        header.append(('\n\n', '', ''))
+    return [(system_text + MOVED_FIELDS_NOTE, '', '')], header + user_parts
+
+
+class PromptRenderer:
+    """Renders system/user messages for whole chunks from column arrays.
+
+    Templates from prompts.json are parsed once. A system prompt without row
+    variables becomes one shared message object; otherwise its static text parts are
+    reused and only the variable fields are filled per row. With `cache_friendly`,
+    row variables are moved out of the system prompt (see `move_row_fields`) so
+    every request starts with the same bytes and providers can reuse their cached
+    prefix. For keys in `elided_keys`, a blank-line separated section whose values
+    are all empty is left out of the message, heading included.
+    """
+
+    def __init__(self, system_template: str, user_template: str, keys: Sequence[str],
+                 elided_keys: Iterable[str] = (), cache_friendly: bool = False):
+        self.keys = list(keys)
+        self.elided_keys = set(elided_keys)
+        self.system_parts = compile_template(system_template)
+        self.user_parts = compile_template(user_template)
+        # Row variables of the system template, which make every request's prefix different
+        self.system_row_fields = list(dict.fromkeys(template_fields(self.system_parts)))
+        self.moved_fields = []
+        if cache_friendly and self.system_row_fields:
+            self.system_parts, self.user_parts = move_row_fields(self.system_parts, self.user_parts)
+            self.moved_fields = self.system_row_fields
+        self.system_sections = self._sections(self.system_parts)
+        self.user_sections = self._sections(self.user_parts)
+
+        unknown = set(template_fields(self.system_parts) + template_fields(self.user_parts)) - set(self.keys)
+        if unknown:
+            raise ValueError(f"Prompt template uses variables that are not prompt keys: {', '.join(sorted(unknown))}")
+
+        self.static_system_message = None
+        if not template_fields(self.system_parts):
+            self.static_system_message = SystemMessage(content=''.join(part[0] for part in self.system_parts))
+
+    def fields(self) -> List[str]:
+        """Prompt keys in the order the templates use them, once per occurrence."""
+        return template_fields(self.system_parts) + template_fields(self.user_parts)
+
+    def static_text(self) -> List[str]:
+        """Literal text of the system and user templates, without the row values."""
+        return [''.join(part[0] for part in parts) for parts in (self.system_parts, self.user_parts)]
+
+    def _sections(self, parts: CompiledTemplate) -> Optional[List[CompiledTemplate]]:
+        if not self.elided_keys.intersection(template_fields(parts)):
+            return None
+        return split_sections(parts)
+
+    def _fill_sections(self, sections: List[CompiledTemplate], values: Dict[str, str]) -> str:
+        kept = []
+        for section in sections:
+            fields = template_fields(section)
+            if fields and all(field in self.elided_keys and not values[field].strip() for field in fields):
+                continue
+            kept.append(self._fill(section, values))
+        return '\n\n'.join(kept)
+
+    def _render(self, parts: CompiledTemplate, sections: Optional[List[CompiledTemplate]],
+                values: Dict[str, str]) -> str:
+        if sections is None:
+            return self._fill(parts, values)
+        return self._fill_sections(sections, values)
+
+    @staticmethod
+    def _fill(parts: CompiledTemplate, values: Dict[str, str]) -> str:
+        pieces = []
+        for literal_text, field_name, format_spec in parts:
+            pieces.append(literal_text)
+            if field_name:
+                value = values[field_name]
+                pieces.append(format(value, format_spec) if format_spec else value)
+        return ''.join(pieces)
+
+    def columns(self, batch: pd.DataFrame) -> Dict[str, List[str]]:
+        """Prompt values per key as plain string lists; absent columns render as ''."""
+        row_count = len(batch)
+        columns = {}
+        for key in self.keys:
+            if key in batch.columns:
+                columns[key] = batch[key].astype(str).tolist()
+            else:
+                columns[key] = [''] * row_count
+        return columns
+
+    def render_batch(self, batch: pd.DataFrame) -> List[List[BaseMessage]]:
+        columns = self.columns(batch)
+        message_batch = []
+        for row_values in zip(*(columns[key] for key in self.keys)):
+            values = dict(zip(self.keys, row_values))
+            system_message = self.static_system_message or SystemMessage(
+                content=self._render(self.system_parts, self.system_sections, values)
+            )
+            user_message = HumanMessage(content=self._render(self.user_parts, self.user_sections, values))
+            message_batch.append([system_message, user_message])
+        return message_batch
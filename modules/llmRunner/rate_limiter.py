@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+# Rough characters-per-token ratio used when no tokenizer is involved
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(messages: List[Any]) -> int:
+    """Cheap token estimate for a list of chat messages."""
+    total_chars = 0
+    for message in messages:
+        content = getattr(message, 'content', message)
+        total_chars += len(str(content))
+    return total_chars // CHARS_PER_TOKEN + 1
+
+
+class TokenBucket:
+    """Bucket that refills continuously up to `capacity` units per minute."""
+
+    def __init__(self, capacity_per_minute: int):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (requests above capacity wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Client-side pacing against requests-per-minute and tokens-per-minute limits.
+
+    A limit of 0 (or a missing value) disables that bucket. Waiters are served in
+    arrival order so large requests are not starved by small ones.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.lock = asyncio.Lock()
+        self.wait_seconds = 0.0
+
+    @classmethod
+    def from_model_config(cls, model_config: Dict[str, Any]) -> 'RateLimiter':
+        return cls(rpm=int(model_config.get('rpm', 0) or 0), tpm=int(model_config.get('tpm', 0) or 0))
+
+    @property
+    def enabled(self) -> bool:
+        return self.request_bucket is not None or self.token_bucket is not None
+
+    def estimated_wait(self, tokens: int = 0) -> float:
+        """Seconds a request of `tokens` estimated tokens would wait right now, without reserving anything."""
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket:
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until one request of `tokens` estimated tokens fits in both budgets."""
+        if not self.enabled:
+            return
+        async with self.lock:
+            while True:
+                wait = self.estimated_wait(tokens)
+                if wait <= 0:
+                    break
+                self.wait_seconds += wait
+                await asyncio.sleep(wait)
+            if self.request_bucket:
+                self.request_bucket.consume(1)
+            if self.token_bucket:
+                self.token_bucket.consume(tokens)
+
+    def describe(self) -> str:
+        rpm = int(self.request_bucket.capacity) if self.request_bucket else 'unlimited'
+        tpm = int(self.token_bucket.capacity) if self.token_bucket else 'unlimited'
+        return f"RPM {rpm}, TPM {tpm}"
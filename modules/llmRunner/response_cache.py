@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Model settings that change the response and therefore belong in the cache key
+GENERATION_PARAMS = ('temperature', 'top_p', 'max_tokens', 'seed', 'response_format')
+
+DEFAULT_MAX_CACHE_BYTES = 1024 ** 3  # 1 GiB
+
+
+def cache_key(model_config: Dict[str, Any], messages: List[Any]) -> str:
+    """Content address of a request: model type, generation parameters and rendered messages."""
+    payload = {
+        'model': model_config.get('type'),
+        'params': {name: model_config[name] for name in GENERATION_PARAMS if name in model_config},
+        'messages': [[getattr(m, 'type', ''), getattr(m, 'content', m)] for m in messages],
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """On-disk SQLite store of raw model responses with least-recently-used eviction by size."""
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(responses)")]
+        if 'model' not in columns:
+            # Caches written before responses recorded their model
+            self.connection.execute("ALTER TABLE responses ADD COLUMN model TEXT")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        """The cached response and the model that produced it, or None."""
+        row = self.connection.execute("SELECT response, model FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0], row[1]
+
+    def put(self, key: str, response: str, model: Optional[str] = None):
+        size = len(response.encode('utf-8')) + len(key)
+        previous = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if previous:
+            self.total_bytes -= previous[0]
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, last_used, model) VALUES (?, ?, ?, ?, ?)",
+            (key, response, size, time.time(), model)
+        )
+        self.total_bytes += size
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """Drop least recently used responses until the cache is back under 90% of its size cap."""
+        target = self.max_bytes * 0.9
+        rows = self.connection.execute("SELECT key, size FROM responses ORDER BY last_used ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def stats(self) -> str:
+        return f"cache hits {self.hits}, misses {self.misses}, {self.total_bytes / 1024 ** 2:.1f} MiB"
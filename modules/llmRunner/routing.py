@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from modules.llmRunner.key_pool import ApiKeyPool
+from modules.llmRunner.token_budget import context_window
+
+# Outcomes of the most recent requests a breaker judges a model by
+BREAKER_WINDOW = 20
+BREAKER_MIN_REQUESTS = 10
+BREAKER_ERROR_RATE = 0.5
+# Median latency above this trips the breaker; a model can set its own `max_latency` in seconds
+BREAKER_MAX_LATENCY = 60.0
+BREAKER_OPEN_SECONDS = 30.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    """Stops traffic to a model whose recent requests mostly fail or are too slow.
+
+    An open breaker lets a single probe request through after `open_seconds`;
+    the probe closes it again on success or reopens it on failure.
+    """
+
+    def __init__(self, max_latency: float = BREAKER_MAX_LATENCY, open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.max_latency = max_latency
+        self.open_seconds = open_seconds
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)  # (succeeded, latency)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.reason = ''
+
+    def seconds_until_probe(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allows(self) -> bool:
+        """Whether a request may go out now; moving an expired open breaker to half-open."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.seconds_until_probe() == 0:
+            self.state = HALF_OPEN
+        return self.state == HALF_OPEN and not self.probing
+
+    def start(self):
+        if self.state == HALF_OPEN:
+            self.probing = True
+
+    def abandon(self):
+        """A request ended without an outcome (e.g. cancelled); a pending probe may be sent again."""
+        self.probing = False
+
+    def record(self, succeeded: bool, latency: float) -> Optional[str]:
+        """Record an outcome and return the new state when it changed."""
+        if self.state == HALF_OPEN and self.probing:
+            self.probing = False
+            if succeeded:
+                self.state = CLOSED
+                self.outcomes.clear()
+                return CLOSED
+            return self._open("probe request failed")
+        if self.state != CLOSED:
+            return None
+        self.outcomes.append((succeeded, latency))
+        if len(self.outcomes) < BREAKER_MIN_REQUESTS:
+            return None
+        error_rate = sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+        latencies = sorted(latency for _, latency in self.outcomes)
+        median_latency = latencies[len(latencies) // 2]
+        if error_rate >= BREAKER_ERROR_RATE:
+            return self._open(f"error rate {error_rate:.0%} over the last {len(self.outcomes)} requests")
+        if median_latency > self.max_latency:
+            return self._open(f"median latency {median_latency:.1f}s over the last {len(self.outcomes)} requests")
+        return None
+
+    def _open(self, reason: str) -> str:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.reason = reason
+        self.outcomes.clear()
+        return OPEN
+
+
+class ModelRoute:
+    """One model of a chain with its API keys and circuit breaker."""
+
+    def __init__(self, name: str, model_config: Dict[str, Any], key_pool: ApiKeyPool):
+        self.name = name
+        self.model_config = model_config
+        self.key_pool = key_pool
+        self.breaker = CircuitBreaker(max_latency=float(model_config.get('max_latency', BREAKER_MAX_LATENCY)))
+        self.context_window = context_window(model_config)
+        self.requests = 0
+
+
+class ModelRouter:
+    """Sends each request to the first model of the chain whose breaker is closed.
+
+    The primary model is listed first and fallbacks follow in the chain's order, so
+    traffic returns to the primary as soon as its breaker closes again.
+    """
+
+    def __init__(self, routes: List[ModelRoute], notify: Callable[[str], None] = None):
+        if not routes:
+            raise ValueError("A model router needs at least one model.")
+        self.routes = routes
+        self.notify = notify or logging.warning
+
+    @property
+    def enabled(self) -> bool:
+        return any(route.key_pool.enabled for route in self.routes)
+
+    @property
+    def wait_seconds(self) -> float:
+        return sum(route.key_pool.wait_seconds for route in self.routes)
+
+    async def select(self, tokens: int = 0) -> ModelRoute:
+        """First healthy model whose context window holds a request of `tokens` tokens."""
+        routes = [route for route in self.routes if route.context_window >= tokens]
+        if not routes:
+            raise ValueError(f"A request of ~{tokens} tokens exceeds the context window of every model in the chain.")
+        while True:
+            for route in routes:
+                if route.breaker.allows():
+                    route.breaker.start()
+                    route.requests += 1
+                    return route
+            # Every model that fits is tripped; wait for the first one to take a probe request
+            await asyncio.sleep(max(0.1, min(route.breaker.seconds_until_probe() for route in routes)))
+
+    def record(self, route: ModelRoute, succeeded: bool, latency: float):
+        change = route.breaker.record(succeeded, latency)
+        if change == OPEN:
+            healthy = [other.name for other in self.routes if other.breaker.state == CLOSED]
+            target = f"routing to '{healthy[0]}'" if healthy else "no healthy model left"
+            self.notify(f"Model '{route.name}' taken out of rotation ({route.breaker.reason}); {target}.")
+        elif change == CLOSED:
+            self.notify(f"Model '{route.name}' is healthy again.")
+
+    def describe(self) -> str:
+        description = self.routes[0].key_pool.describe()
+        if len(self.routes) > 1:
+            description += f", fallbacks {', '.join(route.name for route in self.routes[1:])}"
+        return description
+
+    def stats(self) -> str:
+        parts = []
+        for route in self.routes:
+            part = f"{route.name} {route.requests} req"
+            if route.breaker.state != CLOSED:
+                part += f" ({route.breaker.state})"
+            parts.append(part)
+        return "models " + ", ".join(parts)
@@ -0,0 +1,216 @@
+import glob
+import json
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from modules.llmRunner.journal import atomic_write_csv
+
+OUTPUT_FORMATS = ["CSV", "Parquet", "SQLite"]
+
+# Result columns are described as {name: storage type}, using Arrow type names
+SQLITE_TYPES = {'string': 'TEXT', 'double': 'REAL', 'int64': 'INTEGER', 'bool': 'INTEGER'}
+SCHEMA_TYPES = {'number': 'double', 'integer': 'int64', 'boolean': 'bool'}
+# Columns every sink stores next to the result fields
+META_COLUMNS = ('source_file', 'row_index', 'model', 'error')
+
+
+def fields_from_schema(schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """Result columns for a prompt output schema; nested values are stored as JSON text."""
+    if not schema or not schema.get('properties'):
+        return None
+    return {name: SCHEMA_TYPES.get(property_schema.get('type'), 'string')
+            for name, property_schema in schema['properties'].items()}
+
+
+def encode_value(value: Any) -> Any:
+    """Scalars are kept, nested dicts and lists become JSON text."""
+    if isinstance(value, (dict, list, tuple, set)):
+        return json.dumps(list(value) if isinstance(value, (tuple, set)) else value, ensure_ascii=False, default=str)
+    return value
+
+
+def typed_rows(rows: List[Dict[str, Any]], fields: Optional[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Rows in a fixed column layout: the declared fields, or the whole result as JSON when none are declared."""
+    typed = []
+    for row in rows:
+        result = {key: value for key, value in row.items() if key not in META_COLUMNS}
+        entry = {'source_file': row['source_file'], 'row_index': row['row_index'], 'model': row.get('model')}
+        if fields:
+            for name in fields:
+                entry[name] = encode_value(result.get(name))
+        else:
+            entry['result'] = json.dumps(result, ensure_ascii=False, default=str) if result else None
+        entry['error'] = row.get('error')
+        typed.append(entry)
+    return typed
+
+
+class CsvSink:
+    """One `<file>_<chunk>_processed.csv` per flushed chunk, written atomically."""
+
+    name = "CSV"
+
+    def __init__(self, output_dir: str, fields: Optional[Dict[str, str]] = None):
+        self.output_dir = output_dir
+
+    def chunk_path(self, file_name: str, chunk_number: int) -> str:
+        output_file_name = os.path.splitext(file_name)[0] + f'_{chunk_number:05d}' + '_processed.csv'
+        return os.path.join(self.output_dir, output_file_name)
+
+    def chunk_exists(self, file_name: str, chunk_number: int, row_ids: Sequence[int]) -> bool:
+        return os.path.exists(self.chunk_path(file_name, chunk_number))
+
+    def chunk_outputs(self, file_name: str) -> List[str]:
+        pattern = os.path.join(glob.escape(self.output_dir),
+                               glob.escape(os.path.splitext(file_name)[0]) + '_[0-9]*_processed.csv')
+        return glob.glob(pattern)
+
+    def has_chunk_outputs(self, file_name: str) -> bool:
+        """Whether outputs found by chunk number exist for the file."""
+        return bool(self.chunk_outputs(file_name))
+
+    def reset_file(self, file_name: str):
+        """Remove chunk outputs cut with another batch size."""
+        for stale_path in self.chunk_outputs(file_name):
+            os.remove(stale_path)
+
+    def write_chunk(self, file_name: str, chunk_number: int, rows: List[Dict[str, Any]]) -> str:
+        output_path = self.chunk_path(file_name, chunk_number)
+        atomic_write_csv(pd.DataFrame(rows), output_path)
+        return output_path
+
+    def finish_file(self, file_name: str):
+        pass
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    """One `<file>_processed.parquet` per input, with every flushed chunk appended as a row group.
+
+    A Parquet file is only readable once its footer is written, so rows go to a
+    `.partial` file that is renamed when the input file is finished. After a
+    crash the partial file is rebuilt; journaled rows replay without model calls.
+    """
+
+    name = "Parquet"
+
+    def __init__(self, output_dir: str, fields: Optional[Dict[str, str]] = None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("The Parquet output format requires the 'pyarrow' package.")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.output_dir = output_dir
+        self.fields = fields
+        columns = [('source_file', pyarrow.string()), ('row_index', pyarrow.int64()), ('model', pyarrow.string())]
+        if fields:
+            columns += [(name, pyarrow.type_for_alias(field_type)) for name, field_type in fields.items()]
+        else:
+            columns.append(('result', pyarrow.string()))
+        columns.append(('error', pyarrow.string()))
+        self.schema = pyarrow.schema(columns)
+        self.writers = {}
+
+    def file_path(self, file_name: str) -> str:
+        return os.path.join(self.output_dir, os.path.splitext(file_name)[0] + '_processed.parquet')
+
+    def chunk_exists(self, file_name: str, chunk_number: int, row_ids: Sequence[int]) -> bool:
+        # The whole file is rewritten on every run, see the class docstring
+        return False
+
+    def has_chunk_outputs(self, file_name: str) -> bool:
+        return False
+
+    def reset_file(self, file_name: str):
+        pass
+
+    def write_chunk(self, file_name: str, chunk_number: int, rows: List[Dict[str, Any]]) -> str:
+        final_path = self.file_path(file_name)
+        if file_name not in self.writers:
+            self.writers[file_name] = self.pq.ParquetWriter(final_path + '.partial', self.schema)
+        table = self.pa.Table.from_pylist(typed_rows(rows, self.fields), schema=self.schema)
+        self.writers[file_name].write_table(table)
+        return final_path + '.partial'
+
+    def finish_file(self, file_name: str):
+        writer = self.writers.pop(file_name, None)
+        if writer is not None:
+            writer.close()
+            os.replace(self.file_path(file_name) + '.partial', self.file_path(file_name))
+
+    def close(self):
+        # Unfinished files keep their .partial name
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+class SQLiteSink:
+    """All results of a run in `llm_results.sqlite`, keyed by input file name and row index."""
+
+    name = "SQLite"
+
+    def __init__(self, output_dir: str, fields: Optional[Dict[str, str]] = None):
+        self.path = os.path.join(output_dir, 'llm_results.sqlite')
+        self.fields = fields
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.columns = ['source_file', 'row_index', 'model'] + (list(fields) if fields else ['result']) + ['error']
+        column_types = {name: SQLITE_TYPES[field_type] for name, field_type in (fields or {}).items()}
+        definitions = {name: f'"{name}" {column_types.get(name, "TEXT")}' for name in self.columns[2:]}
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS results (source_file TEXT NOT NULL, row_index INTEGER NOT NULL, "
+            f"{', '.join(definitions.values())}, PRIMARY KEY (source_file, row_index))"
+        )
+        existing = {row[1] for row in self.connection.execute("PRAGMA table_info(results)")}
+        for name, definition in definitions.items():
+            if name not in existing:
+                # Databases written by an earlier version or with other result fields
+                self.connection.execute(f"ALTER TABLE results ADD COLUMN {definition}")
+        self.connection.commit()
+
+    def chunk_exists(self, file_name: str, chunk_number: int, row_ids: Sequence[int]) -> bool:
+        if not len(row_ids):
+            return False
+        count = self.connection.execute(
+            "SELECT COUNT(*) FROM results WHERE source_file = ? AND row_index BETWEEN ? AND ? AND error IS NULL",
+            (file_name, int(min(row_ids)), int(max(row_ids)))
+        ).fetchone()[0]
+        return count == len(row_ids)
+
+    def has_chunk_outputs(self, file_name: str) -> bool:
+        # Rows are stored by row index, whatever chunks they were written in
+        return False
+
+    def reset_file(self, file_name: str):
+        pass
+
+    def write_chunk(self, file_name: str, chunk_number: int, rows: List[Dict[str, Any]]) -> str:
+        placeholders = ', '.join('?' for _ in self.columns)
+        quoted_columns = ', '.join(f'"{name}"' for name in self.columns)
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO results ({quoted_columns}) VALUES ({placeholders})",
+            [tuple(row[name] for name in self.columns) for row in typed_rows(rows, self.fields)]
+        )
+        self.connection.commit()
+        return self.path
+
+    def finish_file(self, file_name: str):
+        pass
+
+    def close(self):
+        self.connection.close()
+
+
+def create_sink(output_format: str, output_dir: str, fields: Optional[Dict[str, str]] = None):
+    sinks = {'CSV': CsvSink, 'Parquet': ParquetSink, 'SQLite': SQLiteSink}
+    if output_format not in sinks:
+        raise NotImplementedError(f"Output format '{output_format}' is not supported.")
+    return sinks[output_format](output_dir, fields)
@@ -0,0 +1,157 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from modules.llmRunner.ingestion import CsvChunkReader
+from modules.llmRunner.rate_limiter import CHARS_PER_TOKEN
+
+# Context windows by model type prefix; the longest matching prefix wins.
+# A model can set its own `context_window` in data/models.json.
+CONTEXT_WINDOWS = {
+    'gpt-4.1': 1047576,
+    'gpt-4o': 128000,
+    'gpt-4-turbo': 128000,
+    'gpt-4-32k': 32768,
+    'gpt-4': 8192,
+    'gpt-3.5-turbo': 16385,
+    'o1': 200000,
+    'o3': 200000,
+    'o4': 200000,
+}
+DEFAULT_CONTEXT_WINDOW = 128000
+
+# Chat formatting tokens added per message on top of its content
+TOKENS_PER_MESSAGE = 4
+
+# Rows parsed from the CSV at a time; chunks are cut from these by token budget
+READ_CHUNK_ROWS = 500
+
+
+def context_window(model_config: Dict[str, Any]) -> int:
+    configured = int(model_config.get('context_window') or 0)
+    if configured:
+        return configured
+    model_type = str(model_config.get('type', ''))
+    matches = [prefix for prefix in CONTEXT_WINDOWS if model_type.startswith(prefix)]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+class TokenCounter:
+    """Counts tokens with the model's tiktoken encoding, or estimates them from characters.
+
+    tiktoken ships with langchain-openai but downloads its encodings on first use,
+    so offline machines without a cached encoding fall back to the estimate.
+    """
+
+    def __init__(self, model_type: str):
+        self.encoding = None
+        try:
+            import tiktoken
+            try:
+                self.encoding = tiktoken.encoding_for_model(model_type)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding('o200k_base')
+        except Exception as e:
+            logging.warning(f"Tokenizer unavailable ({str(e)}); estimating tokens from characters.")
+
+    @property
+    def name(self) -> str:
+        return f"tiktoken {self.encoding.name}" if self.encoding is not None else "character estimate"
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return len(text) // CHARS_PER_TOKEN + 1
+        return len(self.encoding.encode_ordinary(text))
+
+    def head(self, text: str, max_tokens: int) -> str:
+        """The first `max_tokens` tokens of `text`."""
+        if self.encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return self.encoding.decode(self.encoding.encode_ordinary(text)[:max_tokens])
+
+    def tail(self, text: str, max_tokens: int) -> str:
+        """The last `max_tokens` tokens of `text`."""
+        if max_tokens <= 0:
+            return ''
+        if self.encoding is None:
+            return text[-max_tokens * CHARS_PER_TOKEN:]
+        return self.encoding.decode(self.encoding.encode_ordinary(text)[-max_tokens:])
+
+    def count_column(self, values: List[str]) -> np.ndarray:
+        if self.encoding is None:
+            return np.fromiter((len(value) // CHARS_PER_TOKEN + 1 for value in values), dtype=np.int64,
+                               count=len(values))
+        return np.fromiter((len(tokens) for tokens in self.encoding.encode_ordinary_batch(values)),
+                           dtype=np.int64, count=len(values))
+
+
+class TokenBudgetChunker:
+    """Cuts an input file into chunks of at most `max_rows` rows and `max_tokens` estimated prompt tokens.
+
+    Chunk sizes follow the length of the rows, so a chunk of long articles holds
+    fewer rows than one of short posts and memory and TPM use per chunk stay even.
+    A row over the token budget on its own becomes a chunk by itself. A
+    `max_tokens` of 0 cuts by row count only. Parsed rows go through the
+    `preprocessor` first, so budgets count the text actually sent.
+    """
+
+    def __init__(self, reader: CsvChunkReader, counter: TokenCounter, fields: List[str], template_tokens: int,
+                 max_rows: int, max_tokens: int = 0, preprocessor: Any = None):
+        self.reader = reader
+        self.preprocessor = preprocessor
+        self.counter = counter
+        self.fields = fields  # Prompt keys in the order they appear in the templates, with repeats
+        self.template_tokens = template_tokens
+        self.max_rows = max_rows
+        self.max_tokens = max_tokens or np.iinfo(np.int64).max
+        self.buffer: Optional[pd.DataFrame] = None
+        self.buffer_tokens: Optional[np.ndarray] = None
+        self.buffer_saved: Optional[np.ndarray] = None
+        self.position = 0
+
+    def row_tokens(self, batch: pd.DataFrame) -> np.ndarray:
+        """Estimated prompt tokens of each row: the template text plus every value it is filled with."""
+        tokens = np.full(len(batch), self.template_tokens, dtype=np.int64)
+        for key in self.fields:
+            if key in batch.columns:
+                tokens += self.counter.count_column(batch[key].astype(str).tolist())
+        return tokens
+
+    def next_chunk(self) -> Tuple[Optional[pd.DataFrame], List[int], int]:
+        """The next chunk, the estimated tokens of its rows and the tokens preprocessing removed from them.
+
+        Returns (None, [], 0) once the file is exhausted.
+        """
+        pieces, row_tokens = [], []
+        rows, used, saved = 0, 0, 0
+        while rows < self.max_rows:
+            if self.buffer is None or self.position >= len(self.buffer):
+                self.buffer = self.reader.next_chunk()
+                if self.buffer is None:
+                    break
+                if self.preprocessor is not None:
+                    self.buffer, self.buffer_saved = self.preprocessor.process(self.buffer)
+                else:
+                    self.buffer_saved = np.zeros(len(self.buffer), dtype=np.int64)
+                self.buffer_tokens = self.row_tokens(self.buffer)
+                self.position = 0
+            remaining = self.buffer_tokens[self.position:]
+            fitting = int(np.searchsorted(np.cumsum(remaining) + used, self.max_tokens, side='right'))
+            take = min(fitting, self.max_rows - rows)
+            if take == 0:
+                if rows:
+                    break
+                take = 1
+            pieces.append(self.buffer.iloc[self.position:self.position + take])
+            row_tokens.extend(int(tokens) for tokens in remaining[:take])
+            used += int(remaining[:take].sum())
+            saved += int(self.buffer_saved[self.position:self.position + take].sum())
+            rows += take
+            self.position += take
+            if take < len(remaining):
+                break
+        if not pieces:
+            return None, [], 0
+        return pd.concat(pieces) if len(pieces) > 1 else pieces[0], row_tokens, saved
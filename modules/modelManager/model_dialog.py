@@ -3,7 +3,7 @@
 from PyQt6.QtWidgets import (
     QPushButton, QHBoxLayout,
     QMessageBox, QDialog, QFormLayout, QLineEdit, QComboBox,
-    QInputDialog, QLabel
+    QInputDialog, QLabel, QSpinBox
 )
 from PyQt6.QtCore import Qt
 
@@ -46,6 +46,8 @@ class ModelDialog(QDialog):
         self.api_key_name_input.setEditable(True)
         self.api_key_name_input.addItems(self.existing_api_key_names)
         self.api_key_name_input.setCurrentText(self.model.get('api_key_name', ''))
+        self.api_key_name_input.setToolTip("Several key names separated by commas form a key pool; "
+                                           "requests are balanced across them and each key gets the rate limits below.")
         layout.addRow("API Key Name:", self.api_key_name_input)
 
         # # API Key
@@ -59,6 +61,23 @@ class ModelDialog(QDialog):
         self.type_input.setText(self.model.get('type', ''))
         layout.addRow("Model Type:", self.type_input)
 
+        # Rate Limits (0 = unlimited)
+        self.rpm_input = QSpinBox()
+        self.rpm_input.setRange(0, 100000000)
+        self.rpm_input.setValue(int(self.model.get('rpm', 0)))
+        layout.addRow("Requests per Minute per Key (0 = unlimited):", self.rpm_input)
+
+        self.tpm_input = QSpinBox()
+        self.tpm_input.setRange(0, 2000000000)
+        self.tpm_input.setValue(int(self.model.get('tpm', 0)))
+        layout.addRow("Tokens per Minute per Key (0 = unlimited):", self.tpm_input)
+
+        # Context Window (0 = known size of the model type)
+        self.context_window_input = QSpinBox()
+        self.context_window_input.setRange(0, 100000000)
+        self.context_window_input.setValue(int(self.model.get('context_window', 0)))
+        layout.addRow("Context Window in Tokens (0 = from model type):", self.context_window_input)
+
         # Buttons
         button_layout = QHBoxLayout()
         self.save_button = QPushButton("Save")
@@ -115,4 +134,7 @@ class ModelDialog(QDialog):
             "type": self.type_input.text().strip(),
             "llm_model": self.llm_model_input.currentText().strip(),
             "api_key_name": self.api_key_name_input.currentText().strip(),
+            "rpm": self.rpm_input.value(),
+            "tpm": self.tpm_input.value(),
+            "context_window": self.context_window_input.value(),
         }
@@ -102,6 +102,8 @@ class ModelManagerWidget(AbstractWidget):
             f"Type: {model.get('type', 'N/A')}\n"
             f"LLM Model: {model.get('llm_model', 'N/A')}\n"
             f"API Key Name: {model.get('api_key_name', 'N/A')}\n"
+            f"Requests per Minute: {model.get('rpm', 0) or 'unlimited'}\n"
+            f"Tokens per Minute: {model.get('tpm', 0) or 'unlimited'}\n"
         )
         self.details_display.setText(details)
 
@@ -122,6 +124,9 @@ class ModelManagerWidget(AbstractWidget):
                 "type": model_data['type'],
                 "llm_model": model_data['llm_model'],
                 "api_key_name": api_key_name,
+                "rpm": model_data['rpm'],
+                "tpm": model_data['tpm'],
+                "context_window": model_data['context_window'],
             }
             self.save_models()
             self.populate_model_list()
@@ -151,11 +156,15 @@ class ModelManagerWidget(AbstractWidget):
             if new_name != model_name:
                 del self.models[model_name]
 
-            # Update model configuration
+            # Update model configuration, keeping settings the dialog does not edit
             self.models[new_name] = {
+                **model,
                 "type": updated_data['type'],
                 "llm_model": updated_data['llm_model'],
                 "api_key_name": new_api_key_name,
+                "rpm": updated_data['rpm'],
+                "tpm": updated_data['tpm'],
+                "context_window": updated_data['context_window'],
             }
             self.save_models()
             self.populate_model_list()
@@ -1,7 +1,9 @@
+import json
+
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QFormLayout, QLineEdit, QLabel,
     QPushButton, QHBoxLayout, QTextEdit, QMessageBox, QListWidget, QListWidgetItem,
-    QInputDialog
+    QInputDialog, QCheckBox
 )
 
 class PromptDialog(QDialog):
@@ -43,6 +45,22 @@ class PromptDialog(QDialog):
             self.user_prompt_input.setText(self.prompt_data['user_prompt_template'])
         form_layout.addRow(QLabel("User Prompt Template:"), self.user_prompt_input)
 
+        # Cache-friendly layout: row variables of the system prompt are sent in the user message
+        self.cache_friendly_checkbox = QCheckBox("Keep the system prompt identical for every row")
+        self.cache_friendly_checkbox.setToolTip(
+            "Moves row variables used in the system prompt to the user message, so providers can cache the prompt prefix"
+        )
+        self.cache_friendly_checkbox.setChecked(bool(self.prompt_data.get('cache_friendly_layout', False)))
+        form_layout.addRow(QLabel("Cache-Friendly Layout:"), self.cache_friendly_checkbox)
+
+        # Output JSON Schema (optional)
+        self.output_schema_input = QTextEdit()
+        self.output_schema_input.setFixedSize(600, 150)
+        self.output_schema_input.setPlaceholderText("Optional JSON schema the model output must follow")
+        if self.prompt_data.get('output_schema'):
+            self.output_schema_input.setText(json.dumps(self.prompt_data['output_schema'], indent=2))
+        form_layout.addRow(QLabel("Output JSON Schema:"), self.output_schema_input)
+
         # Keys Section
         self.keys_label = QLabel("Keys:")
         self.keys_list = QListWidget()
@@ -125,6 +143,14 @@ class PromptDialog(QDialog):
             QMessageBox.warning(self, "Input Error", "User Prompt Template cannot be empty.")
             return
         # Removed the check for keys being non-empty
+        output_schema = self.output_schema_input.toPlainText().strip()
+        if output_schema:
+            try:
+                if not isinstance(json.loads(output_schema), dict):
+                    raise ValueError("the schema must be a JSON object")
+            except ValueError as e:
+                QMessageBox.warning(self, "Input Error", f"Output JSON Schema is not valid: {e}")
+                return
 
         # Additional validations can be added here
 
@@ -135,5 +161,7 @@ class PromptDialog(QDialog):
             "prompt_name": self.name_input.text().strip(),
             "system_prompt_template": self.system_prompt_input.toPlainText().strip(),
             "user_prompt_template": self.user_prompt_input.toPlainText().strip(),
-            "keys": [self.keys_list.item(i).text() for i in range(self.keys_list.count())]
+            "keys": [self.keys_list.item(i).text() for i in range(self.keys_list.count())],
+            "cache_friendly_layout": self.cache_friendly_checkbox.isChecked(),
+            "output_schema": json.loads(self.output_schema_input.toPlainText().strip() or 'null')
         }
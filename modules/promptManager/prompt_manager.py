@@ -72,6 +72,10 @@ class PromptManagerWidget(AbstractWidget):
             f"User Prompt Template:\n{prompt.get('user_prompt_template', '')}\n\n"
             f"Keys: {keys_formatted}"
         )
+        if prompt.get('output_schema'):
+            details += f"\n\nOutput JSON Schema:\n{json.dumps(prompt['output_schema'], indent=2)}"
+        if prompt.get('cache_friendly_layout'):
+            details += "\n\nCache-Friendly Layout: row variables are moved out of the system prompt"
         self.details_display.setText(details)
 
     def add_prompt(self):
@@ -99,6 +103,10 @@ class PromptManagerWidget(AbstractWidget):
                 # "prompt": ChatPromptTemplate.from_messages([("system", system_prompt), ("user", user_prompt)])
                 # Removed 'prompt' as it's not JSON-serializable
             }
+            if prompt_data['output_schema']:
+                self.prompts[prompt_name]["output_schema"] = prompt_data['output_schema']
+            if prompt_data['cache_friendly_layout']:
+                self.prompts[prompt_name]["cache_friendly_layout"] = True
 
             self.save_prompts()
             self.populate_prompt_list()
@@ -120,7 +128,9 @@ class PromptManagerWidget(AbstractWidget):
                 "prompt_name": prompt_name,
                 "system_prompt_template": prompt.get("system_prompt_template", ""),
                 "user_prompt_template": prompt.get("user_prompt_template", ""),
-                "keys": prompt.get("keys", [])
+                "keys": prompt.get("keys", []),
+                "output_schema": prompt.get("output_schema"),
+                "cache_friendly_layout": prompt.get("cache_friendly_layout", False)
             }
         )
         if dialog.exec() == QDialog.DialogCode.Accepted:
@@ -138,14 +148,20 @@ class PromptManagerWidget(AbstractWidget):
             if new_prompt_name != prompt_name:
                 del self.prompts[prompt_name]
 
-            # Update prompt configuration
+            # Update prompt configuration, keeping settings the dialog does not edit
             self.prompts[new_prompt_name] = {
+                **prompt,
                 "system_prompt_template": system_prompt,
                 "user_prompt_template": user_prompt,
                 "keys": keys
                 # "prompt": ChatPromptTemplate.from_messages([("system", system_prompt), ("user", user_prompt)])
                 # Removed 'prompt' as it's not JSON-serializable
             }
+            if updated_data['output_schema']:
+                self.prompts[new_prompt_name]["output_schema"] = updated_data['output_schema']
+            else:
+                self.prompts[new_prompt_name].pop("output_schema", None)
+            self.prompts[new_prompt_name]["cache_friendly_layout"] = updated_data['cache_friendly_layout']
 
             self.save_prompts()
             self.populate_prompt_list()
@@ -0,0 +1,167 @@
+"""Shared fixtures: a copy of the app's data directory and a local chat completions endpoint."""
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pytest
+from cryptography.fernet import Fernet
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def analysis_content(body: Dict[str, Any]) -> str:
+    """A valid analysis result for any request."""
+    return json.dumps({'date': '2020-01-01', 'sentiment': 0.3, 'reliability': 0.5, 'relevance': [],
+                       'prediction': []})
+
+
+class FakeChatServer:
+    """Chat completions endpoint whose `responder(body, api_key)` returns (status, content or error, headers)."""
+
+    def __init__(self, responder: Callable[[Dict[str, Any], str], Tuple[int, str, Dict[str, str]]] = None):
+        self.responder = responder or (lambda body, api_key: (200, analysis_content(body), {}))
+        self.requests: Counter = Counter()  # Per API key
+        self.usage = {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}  # Reported per response
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                api_key = self.headers.get('Authorization', '').removeprefix('Bearer ')
+                server.requests[api_key] += 1
+                status, text, headers = server.responder(body, api_key)
+                if status == 200:
+                    payload = {
+                        'id': 'chatcmpl-' + uuid.uuid4().hex, 'object': 'chat.completion',
+                        'created': int(time.time()), 'model': body.get('model'),
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                                     'finish_reason': 'stop'}],
+                        'usage': server.usage,
+                    }
+                else:
+                    payload = {'error': {'message': text, 'type': 'error', 'code': None}}
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """A copy of the stored prompts, models and chains as the working directory."""
+    shutil.copytree(os.path.join(REPO_DIR, 'data'), tmp_path / 'data')
+    shutil.copy(os.path.join(REPO_DIR, 'secret.key'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def chat_server():
+    server = FakeChatServer()
+    yield server
+    server.stop()
+
+
+def store_api_keys(app_dir, keys: Dict[str, str]):
+    """Save plain `keys` by name, encrypted as the API key manager does."""
+    fernet = Fernet((app_dir / 'secret.key').read_bytes())
+    path = app_dir / 'data' / 'api_keys.json'
+    stored = json.loads(path.read_text())
+    for name, key in keys.items():
+        stored[name] = {'api_key': fernet.encrypt(key.encode()).decode(), 'description': ''}
+    path.write_text(json.dumps(stored))
+
+
+def update_model(app_dir, model_name: str, **settings):
+    path = app_dir / 'data' / 'models.json'
+    models = json.loads(path.read_text())
+    models[model_name].update(settings)
+    path.write_text(json.dumps(models))
+
+
+def write_articles(directory, rows: int, file_name: str = 'articles.csv', bodies: Optional[List[str]] = None):
+    """An input file for the base prompt with `rows` distinct articles, unless `bodies` are given."""
+    os.makedirs(directory, exist_ok=True)
+    bodies = bodies or [f"Body of article {i}" for i in range(rows)]
+    pd.DataFrame({
+        'Date': [f"2020-01-{i % 28 + 1:02d}" for i in range(len(bodies))],
+        'Article': bodies,
+        'Article_title': [f"Title {i}" for i in range(len(bodies))],
+        'Url': [f"https://example.com/{i}" for i in range(len(bodies))],
+    }).to_csv(os.path.join(directory, file_name), index=False)
+
+
+def make_runner(input_dir, output_dir, logs: List[str], chain_name: str = 'base_chain', **options):
+    from PyQt6.QtCore import Qt
+    from modules.llmRunner.llm_runner_thread import LLMRunnerThread
+
+    with open('data/chains.json', 'r', encoding='utf-8') as f:
+        chain = json.load(f)[chain_name]
+    os.makedirs(output_dir, exist_ok=True)
+    runner = LLMRunnerThread(chain, str(input_dir), str(output_dir), options.pop('batch_size', 20), **options)
+    runner.log.connect(logs.append, Qt.ConnectionType.DirectConnection)
+    return runner
+
+
+class FakeChain:
+    """Stands in for a model client: answers with `responder(messages)` after `delay` seconds."""
+
+    def __init__(self, responder: Callable[[Any], str] = None, delay: float = 0.0):
+        self.responder = responder or (lambda messages: analysis_content({}))
+        self.delay = delay
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        from langchain_core.messages import AIMessage
+
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return AIMessage(content=self.responder(messages))
+
+
+def make_engine(chains: Dict[str, List[Any]] = None, max_concurrency: int = 4, **options):
+    """An engine over models named like `chains`, each with one API key per chain in its list."""
+    from modules.llmRunner.async_engine import AsyncRequestEngine
+    from modules.llmRunner.key_pool import ApiKeyPool, PooledKey
+    from modules.llmRunner.rate_limiter import RateLimiter
+    from modules.llmRunner.routing import ModelRoute, ModelRouter
+
+    chains = chains or {'base': [FakeChain()]}
+    routes = []
+    for model_name, model_chains in chains.items():
+        keys = [PooledKey(f"{model_name}-{index}", chain, RateLimiter(), pack_chain=chain)
+                for index, chain in enumerate(model_chains)]
+        routes.append(ModelRoute(model_name, {'type': model_name}, ApiKeyPool(keys)))
+    return AsyncRequestEngine(ModelRouter(routes), max_concurrency, model_config={'type': 'base'}, **options)
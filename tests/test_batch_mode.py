@@ -0,0 +1,134 @@
+"""Batch mode end to end against the local fake batch server: submit, poll, merge and resume."""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import Qt
+
+import modules.llmRunner.llm_runner_thread as llm_runner_thread
+from modules.llmRunner.batch_jobs import BATCH_MODE
+from modules.llmRunner.fake_batch_server import FakeBatchServer
+from modules.llmRunner.llm_runner_thread import LLMRunnerThread
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROWS = 12
+
+
+def analysis(body):
+    return json.dumps({'date': '2020-01-01', 'sentiment': 0.3, 'reliability': 0.5, 'relevance': [],
+                       'prediction': []})
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """A copy of the stored models and chains, with the batch model pointed at a fake server."""
+    shutil.copytree(os.path.join(REPO_DIR, 'data'), tmp_path / 'data')
+    shutil.copy(os.path.join(REPO_DIR, 'secret.key'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(llm_runner_thread, 'POLL_INITIAL_SECONDS', 0.2)
+    monkeypatch.setattr(llm_runner_thread, 'POLL_MAX_SECONDS', 0.5)
+
+    server = FakeBatchServer(analysis).start()
+    models_path = tmp_path / 'data' / 'models.json'
+    models = json.loads(models_path.read_text())
+    models['base']['base_url'] = server.base_url
+    models_path.write_text(json.dumps(models))
+
+    input_dir = tmp_path / 'in'
+    output_dir = tmp_path / 'out'
+    input_dir.mkdir()
+    output_dir.mkdir()
+    pd.DataFrame({
+        'Date': [f"2020-01-{i + 1:02d}" for i in range(ROWS)],
+        'Article': [f"Body of article {i}" for i in range(ROWS)],
+        'Article_title': [f"Title {i}" for i in range(ROWS)],
+        'Url': [f"https://example.com/{i}" for i in range(ROWS)],
+    }).to_csv(input_dir / 'articles.csv', index=False)
+    yield server, str(input_dir), str(output_dir)
+    server.stop()
+
+
+def make_runner(input_dir, output_dir, logs):
+    with open('data/chains.json', 'r', encoding='utf-8') as f:
+        chain = json.load(f)['base_chain']
+    runner = LLMRunnerThread(chain, input_dir, output_dir, 20, output_format='SQLite', execution_mode=BATCH_MODE)
+    runner.log.connect(logs.append, Qt.ConnectionType.DirectConnection)
+    return runner
+
+
+def stored_jobs(output_dir):
+    path = os.path.join(output_dir, 'batch_jobs.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def result_counts(output_dir):
+    connection = sqlite3.connect(os.path.join(output_dir, 'llm_results.sqlite'))
+    try:
+        return connection.execute('SELECT COUNT(*), SUM(error IS NOT NULL) FROM results').fetchone()
+    finally:
+        connection.close()
+
+
+def test_batch_job_is_submitted_polled_and_merged(workspace):
+    server, input_dir, output_dir = workspace
+    server.complete_after = 0.5
+    logs = []
+    make_runner(input_dir, output_dir, logs).run()
+
+    assert "LLM Runner completed successfully." in logs
+    assert len(server.batches) == 1
+    assert result_counts(output_dir) == (ROWS, 0)
+    assert stored_jobs(output_dir) == {}
+
+
+def test_stopped_run_resumes_its_batch_job(workspace):
+    server, input_dir, output_dir = workspace
+    server.complete_after = 3.0
+    logs = []
+    runner = make_runner(input_dir, output_dir, logs)
+
+    def stop_after_submission():
+        deadline = time.monotonic() + 30
+        while not stored_jobs(output_dir) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        runner.stop()
+
+    stopper = threading.Thread(target=stop_after_submission)
+    stopper.start()
+    runner.run()
+    stopper.join()
+    assert len(stored_jobs(output_dir)) == 1
+
+    time.sleep(server.complete_after)
+    logs = []
+    make_runner(input_dir, output_dir, logs).run()
+
+    assert any("rows merged" in message for message in logs)
+    # The rows came from the first job, not from a second submission
+    assert len(server.batches) == 1
+    assert result_counts(output_dir) == (ROWS, 0)
+    assert stored_jobs(output_dir) == {}
+
+
+def test_unknown_batch_job_is_dropped(workspace):
+    server, input_dir, output_dir = workspace
+    with open(os.path.join(output_dir, 'batch_jobs.json'), 'w', encoding='utf-8') as f:
+        json.dump({'batch_unknown': {'requests': ROWS, 'submitted': 0}}, f)
+    logs = []
+    make_runner(input_dir, output_dir, logs).run()
+
+    assert any("batch_unknown was not found" in message for message in logs)
+    assert "LLM Runner completed successfully." in logs
+    assert result_counts(output_dir) == (ROWS, 0)
+    assert stored_jobs(output_dir) == {}
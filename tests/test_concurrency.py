@@ -0,0 +1,112 @@
+"""Adaptive concurrency: slow start, halving on rate limits, latency cuts and quota headers."""
+import asyncio
+
+from modules.llmRunner.concurrency import INITIAL_LIMIT, MIN_LATENCY_SAMPLES, AdaptiveConcurrency
+
+
+def fill(concurrency: AdaptiveConcurrency):
+    """Requests occupying every slot, as growth only happens at the limit."""
+    concurrency.in_use = concurrency.current
+
+
+def test_slow_start_grows_by_one_per_success_at_the_limit():
+    concurrency = AdaptiveConcurrency(32)
+    assert concurrency.current == INITIAL_LIMIT
+    for _ in range(INITIAL_LIMIT):
+        fill(concurrency)
+        concurrency.on_success(0.1)
+    assert concurrency.current == 2 * INITIAL_LIMIT
+
+
+def test_no_growth_below_the_limit():
+    concurrency = AdaptiveConcurrency(32)
+    concurrency.in_use = 1
+    for _ in range(10):
+        concurrency.on_success(0.1)
+    assert concurrency.current == INITIAL_LIMIT
+
+
+def test_rate_limit_halves_once_per_round_trip_and_ends_slow_start():
+    concurrency = AdaptiveConcurrency(32)
+    concurrency.limit = 16.0
+    concurrency.on_rate_limit()
+    concurrency.on_rate_limit()
+    assert concurrency.current == 8
+    assert not concurrency.slow_start
+
+    concurrency.last_decrease -= 10
+    concurrency.on_rate_limit()
+    assert concurrency.current == 4
+
+
+def test_retry_after_holds_growth():
+    concurrency = AdaptiveConcurrency(32)
+    concurrency.on_rate_limit(retry_after=30)
+    before = concurrency.limit
+    fill(concurrency)
+    concurrency.on_success(0.1)
+    assert concurrency.limit == before
+
+
+def test_latency_well_above_the_baseline_cuts_the_limit():
+    concurrency = AdaptiveConcurrency(32)
+    concurrency.limit = 20.0
+    for _ in range(MIN_LATENCY_SAMPLES):
+        concurrency.on_success(0.1)
+    assert concurrency.baseline_p95 is not None
+    for _ in range(MIN_LATENCY_SAMPLES * 2):
+        concurrency.on_success(1.0)
+    assert concurrency.current < 20
+
+
+def test_limit_stays_between_one_and_max():
+    concurrency = AdaptiveConcurrency(3)
+    for _ in range(20):
+        fill(concurrency)
+        concurrency.on_success(0.1)
+    assert concurrency.current == 3
+    for _ in range(10):
+        concurrency.last_decrease = 0.0
+        concurrency.on_rate_limit()
+    assert concurrency.current == 1
+
+
+def test_response_headers_follow_quota_but_not_429s():
+    concurrency = AdaptiveConcurrency(32)
+    # 429s the engine never saw (e.g. retried by a client) say nothing about the run's requests
+    concurrency.observe_response(429, {'retry-after': '30'})
+    assert concurrency.current == INITIAL_LIMIT
+    assert concurrency.decreases == 0
+
+    concurrency.observe_response(200, {'x-ratelimit-remaining-requests': '10',
+                                       'x-ratelimit-limit-requests': '1000'})
+    assert concurrency.quota_low
+    fill(concurrency)
+    concurrency.on_success(0.1)
+    assert concurrency.current == INITIAL_LIMIT
+
+
+def test_fixed_limit_ignores_signals():
+    concurrency = AdaptiveConcurrency(8, adaptive=False)
+    concurrency.on_rate_limit()
+    fill(concurrency)
+    concurrency.on_success(0.1)
+    assert concurrency.current == 8
+
+
+def test_waiters_get_slots_as_they_free_up():
+    async def scenario():
+        concurrency = AdaptiveConcurrency(1, adaptive=False)
+        order = []
+
+        async def request(name):
+            async with concurrency:
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request(name) for name in 'abc'))
+        return order, concurrency.in_use
+
+    order, in_use = asyncio.run(scenario())
+    assert order == ['a', 'b', 'c']
+    assert in_use == 0
@@ -0,0 +1,70 @@
+"""Exact deduplication: one request per distinct rendered row, its result fanned out to every copy."""
+import glob
+
+import pandas as pd
+
+from conftest import make_runner, store_api_keys, update_model
+from modules.llmRunner.dedup import FINISHED, FOLLOWER, LEADER, RowDeduplicator
+from modules.llmRunner.pipeline import RowFailure, RowJob
+
+
+def job(key: str, position: int = 0) -> RowJob:
+    return RowJob(chunk=None, position=position, messages=None, key=key)
+
+
+def test_copies_wait_on_the_leader_and_reuse_its_result():
+    dedup = RowDeduplicator()
+    leader, follower = job('a', 0), job('a', 1)
+    assert dedup.claim(leader) == LEADER
+    assert dedup.claim(follower) == FOLLOWER
+    assert dedup.claim(job('b', 2)) == LEADER
+
+    assert dedup.complete(leader, {'score': 1}) == [follower]
+    assert dedup.claim(job('a', 3)) == FINISHED
+    assert dedup.finished_result('a') == {'score': 1}
+
+
+def test_failed_leader_is_not_remembered():
+    dedup = RowDeduplicator()
+    leader = job('a')
+    dedup.claim(leader)
+    dedup.complete(leader, RowFailure("timeout"))
+    assert dedup.claim(job('a', 1)) == LEADER
+
+
+def test_only_the_current_leader_completes():
+    dedup = RowDeduplicator()
+    leader = job('a')
+    dedup.claim(leader)
+    dedup.claim(job('a', 1))
+    assert dedup.complete(job('a', 2), {'score': 1}) == []
+    assert len(dedup.complete(leader, {'score': 1})) == 1
+
+
+def test_finished_results_are_bounded():
+    dedup = RowDeduplicator(max_finished=2)
+    for key in 'abc':
+        dedup.remember(key, {'key': key})
+    assert list(dedup.finished) == ['b', 'c']
+
+
+def test_duplicate_rows_across_chunks_and_files_are_sent_once(app_dir, chat_server):
+    store_api_keys(app_dir, {'test': 'key-test'})
+    update_model(app_dir, 'base', api_key_name='test', base_url=chat_server.base_url)
+    input_dir = app_dir / 'in'
+    input_dir.mkdir()
+    for file_name in ('a.csv', 'b.csv'):
+        pd.DataFrame({
+            'Date': ['2020-01-01'] * 12,
+            'Article': [f"Body {i % 3}" for i in range(12)],
+            'Article_title': ['Title'] * 12,
+            'Url': ['https://example.com'] * 12,
+        }).to_csv(input_dir / file_name, index=False)
+    logs = []
+    make_runner(input_dir, app_dir / 'out', logs, batch_size=5, use_cache=False).run()
+
+    assert "LLM Runner completed successfully." in logs
+    assert chat_server.requests['key-test'] == 3
+    output = pd.concat(pd.read_csv(path) for path in glob.glob(str(app_dir / 'out' / '*_processed.csv')))
+    assert len(output) == 24
+    assert output['sentiment'].notna().all()
@@ -0,0 +1,89 @@
+"""Hedged requests and deadlines: a slow request gets a second copy, and no request outlives its deadline."""
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from conftest import FakeChain, make_engine
+from modules.llmRunner.hedging import MIN_LATENCY_SAMPLES, DeadlineExceeded, HedgePolicy
+
+MESSAGES = [HumanMessage(content="Shares rose 5%.")]
+
+
+class SlowFirstCall(FakeChain):
+    """Answers its first call after `first_delay` seconds and the others at once."""
+
+    def __init__(self, first_delay: float):
+        super().__init__()
+        self.first_delay = first_delay
+
+    async def ainvoke(self, messages):
+        self.delay = self.first_delay if self.calls == 0 else 0.0
+        return await super().ainvoke(messages)
+
+
+def warmed_up(policy: HedgePolicy, latency: float = 0.01) -> HedgePolicy:
+    policy.latencies.extend([latency] * MIN_LATENCY_SAMPLES)
+    policy.requests = 100
+    return policy
+
+
+def test_hedge_delay_follows_recent_latencies():
+    policy = HedgePolicy(percentile=50)
+    assert policy.delay() is None
+    policy.latencies.extend([0.1] * (MIN_LATENCY_SAMPLES - 2) + [1.0, 2.0])
+    assert policy.delay() == pytest.approx(0.1)
+    assert HedgePolicy().delay() is None
+
+
+def test_slow_request_is_answered_by_its_second_copy():
+    chain = SlowFirstCall(first_delay=2.0)
+    policy = warmed_up(HedgePolicy(percentile=95, max_percent=5))
+    engine = make_engine({'base': [chain]}, hedging=policy)
+
+    started = time.monotonic()
+    result, model_name = asyncio.run(engine.invoke(MESSAGES))
+    assert time.monotonic() - started < 1.0
+    assert model_name == 'base'
+    assert chain.calls == 2
+    assert (policy.hedges, policy.hedge_wins) == (1, 1)
+    # The cancelled copy gave back its key and slot
+    assert engine.in_flight == 0
+    assert engine.router.routes[0].key_pool.keys[0].in_flight == 0
+
+
+def test_hedges_stay_within_their_share_of_requests():
+    chain = SlowFirstCall(first_delay=0.2)
+    policy = warmed_up(HedgePolicy(percentile=95, max_percent=5))
+    policy.hedges = 5
+    engine = make_engine({'base': [chain]}, hedging=policy)
+
+    asyncio.run(engine.invoke(MESSAGES))
+    assert chain.calls == 1
+    assert policy.hedges == 5
+
+
+def test_request_past_its_deadline_fails():
+    chain = FakeChain(delay=2.0)
+    policy = HedgePolicy(deadline=0.1)
+    engine = make_engine({'base': [chain]}, hedging=policy)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(engine.invoke(MESSAGES))
+    assert policy.deadline_misses == 1
+    assert engine.in_flight == 0
+    assert engine.pending == {}
+
+
+def test_timeout_of_the_request_itself_is_not_a_deadline_miss():
+    def timed_out(messages):
+        raise asyncio.TimeoutError()
+
+    policy = HedgePolicy(deadline=5)
+    engine = make_engine({'base': [FakeChain(timed_out)]}, hedging=policy)
+
+    with pytest.raises(asyncio.TimeoutError) as raised:
+        asyncio.run(engine.invoke(MESSAGES))
+    assert not isinstance(raised.value, DeadlineExceeded)
+    assert policy.deadline_misses == 0
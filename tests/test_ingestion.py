@@ -0,0 +1,82 @@
+"""CSV ingestion: only the prompt columns, row ids across chunks, and the python engine fallback."""
+import gc
+import io
+
+import pandas as pd
+import pytest
+
+from conftest import make_runner, store_api_keys, update_model, write_articles
+from modules.llmRunner.ingestion import CsvChunkReader
+
+CSV = (
+    'Date,Article,Extra,subreddit\n'
+    '2020-01-01,"Quoted, with comma",1,stocks\n'
+    '2020-01-02,"Line one\nline two",2,stocks\n'
+    '2020-01-03,,3,investing\n'
+    '2020-01-04,"He said ""buy""",4,stocks\n'
+    '2020-01-05,Plain,5,investing\n'
+)
+
+
+def read_all(reader: CsvChunkReader):
+    chunks = []
+    while True:
+        chunk = reader.next_chunk()
+        if chunk is None:
+            return chunks
+        chunks.append(chunk)
+
+
+def test_only_prompt_columns_are_read_with_row_ids_across_chunks():
+    reader = CsvChunkReader(io.BytesIO(CSV.encode('utf-8')), ['Date', 'Article', 'subreddit', 'Missing'], 2)
+    chunks = read_all(reader)
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    rows = pd.concat(chunks)
+    assert sorted(rows.columns) == ['Article', 'Date', 'subreddit']
+    assert list(rows.index) == [0, 1, 2, 3, 4]
+    assert list(rows['Article']) == ['Quoted, with comma', 'Line one\nline two', '', 'He said "buy"', 'Plain']
+    assert str(chunks[0]['subreddit'].dtype) == 'category'
+
+
+def test_reading_resumes_with_the_python_engine_after_a_parser_error():
+    reader = CsvChunkReader(io.BytesIO(CSV.encode('utf-8')), ['Date', 'Article'], 2)
+    first = reader.next_chunk()
+
+    class FailingReader:
+        """The C reader, failing on its next chunk."""
+
+        def __init__(self, c_reader):
+            self.c_reader = c_reader
+
+        def __next__(self):
+            raise pd.errors.ParserError("C error: out of memory")
+
+        def close(self):
+            self.c_reader.close()
+
+    reader.iterator = FailingReader(reader.iterator)
+    rest = read_all(reader)
+    # The failed reader is gone without taking the input file with it
+    gc.collect()
+    assert not reader.input_file.closed
+
+    assert reader.engine == 'python'
+    rows = pd.concat([first] + rest)
+    assert list(rows.index) == [0, 1, 2, 3, 4]
+    assert list(rows['Date']) == [f"2020-01-0{day}" for day in range(1, 6)]
+
+
+@pytest.mark.filterwarnings('error::ResourceWarning', 'error::pytest.PytestUnraisableExceptionWarning')
+def test_unreadable_file_is_skipped_and_closed(app_dir, chat_server):
+    store_api_keys(app_dir, {'test': 'key-test'})
+    update_model(app_dir, 'base', api_key_name='test', base_url=chat_server.base_url)
+    write_articles(app_dir / 'in', 3)
+    (app_dir / 'in' / 'empty.csv').write_text('')
+    logs = []
+    make_runner(app_dir / 'in', app_dir / 'out', logs, use_cache=False).run()
+    gc.collect()
+
+    assert any(message.startswith("Failed to read") and 'empty.csv' in message for message in logs)
+    assert "LLM Runner completed successfully." in logs
+    assert chat_server.requests['key-test'] == 3
@@ -0,0 +1,113 @@
+"""Resuming a run: rows answered before are neither requested nor written twice."""
+import glob
+import json
+import os
+import time
+
+import pandas as pd
+
+from conftest import analysis_content, make_runner, store_api_keys, update_model, write_articles
+from modules.llmRunner.journal import RowJournal
+from modules.llmRunner.pipeline import RowFailure
+
+ROWS = 50
+BATCH_SIZE = 20
+
+
+def setup_model(app_dir, chat_server):
+    store_api_keys(app_dir, {'test': 'key-test'})
+    update_model(app_dir, 'base', api_key_name='test', base_url=chat_server.base_url)
+
+
+def chunk_outputs(output_dir):
+    return sorted(glob.glob(os.path.join(output_dir, 'articles_*_processed.csv')))
+
+
+def test_outputs_from_before_the_journal_keep_their_row_count_chunks(app_dir, chat_server):
+    setup_model(app_dir, chat_server)
+    write_articles(app_dir / 'in', ROWS)
+    output_dir = app_dir / 'out'
+    os.makedirs(output_dir)
+    # Two full chunks of rows 0-39 written by a version that cut files by row count and kept no journal
+    legacy = {'date': '2020-01-01', 'sentiment': 0.1, 'reliability': 0.2, 'relevance': '[]', 'prediction': '[]'}
+    for chunk_number in (1, 2):
+        pd.DataFrame([legacy] * BATCH_SIZE).to_csv(output_dir / f'articles_{chunk_number:05d}_processed.csv',
+                                                  index=False)
+
+    logs = []
+    # A token budget that would cut the file into chunks of a few rows each
+    make_runner(app_dir / 'in', output_dir, logs, batch_size=BATCH_SIZE, batch_tokens=400, use_cache=False).run()
+
+    assert "LLM Runner completed successfully." in logs
+    assert sum(chat_server.requests.values()) == ROWS - 2 * BATCH_SIZE
+    outputs = chunk_outputs(output_dir)
+    assert [os.path.basename(path) for path in outputs] == [f'articles_{n:05d}_processed.csv' for n in (1, 2, 3)]
+    assert list(pd.read_csv(outputs[2])['row_index']) == list(range(2 * BATCH_SIZE, ROWS))
+    with open(output_dir / 'articles.journal.jsonl', 'r', encoding='utf-8') as f:
+        assert json.loads(f.readline())['legacy_outputs'] is True
+
+    # The next run finds the file in the same layout and has nothing left to do
+    logs = []
+    make_runner(app_dir / 'in', output_dir, logs, batch_size=BATCH_SIZE, batch_tokens=400, use_cache=False).run()
+    assert sum(chat_server.requests.values()) == ROWS - 2 * BATCH_SIZE
+    assert sum("Already processed" in message for message in logs) == 3
+    assert len(chunk_outputs(output_dir)) == 3
+
+
+def test_journal_keeps_answered_rows_only(tmp_path):
+    path = str(tmp_path / 'articles.journal.jsonl')
+    journal = RowJournal(path, {'batch_size': 20})
+    journal.record(0, {'score': 1})
+    journal.record(1, RowFailure("timeout"))
+    journal.record(2, None)
+    journal.record(0, {'score': 2})
+    journal.close()
+    # A crash can cut the last line short
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"row": 3, "res')
+
+    journal = RowJournal(path, {'batch_size': 20})
+    assert journal.results == {0: {'score': 1}}
+    assert not journal.layout_changed
+    journal.close()
+
+
+def test_journal_notices_a_new_chunk_layout(tmp_path):
+    path = str(tmp_path / 'articles.journal.jsonl')
+    RowJournal(path, {'batch_size': 20}).close()
+    journal = RowJournal(path, {'batch_size': 10})
+    assert journal.layout_changed
+    journal.close()
+    assert RowJournal.stored_layout(path) == {'batch_size': 10}
+
+
+def test_stopped_run_resumes_without_requesting_answered_rows(app_dir, chat_server):
+    setup_model(app_dir, chat_server)
+    write_articles(app_dir / 'in', ROWS)
+    output_dir = app_dir / 'out'
+    logs = []
+    runner = make_runner(app_dir / 'in', output_dir, logs, batch_size=BATCH_SIZE, max_concurrency=2,
+                         use_cache=False)
+
+    def responder(body, api_key):
+        if sum(chat_server.requests.values()) >= 15:
+            runner.stop()
+        time.sleep(0.02)
+        return 200, analysis_content(body), {}
+
+    chat_server.responder = responder
+    runner.run()
+    journal = RowJournal(str(output_dir / 'articles.journal.jsonl'), runner.chunk_layout())
+    answered = len(journal.results)
+    journal.close()
+    assert 0 < answered < ROWS
+
+    chat_server.requests.clear()
+    logs = []
+    make_runner(app_dir / 'in', output_dir, logs, batch_size=BATCH_SIZE, use_cache=False).run()
+
+    assert f"Resuming articles.csv: {answered} rows already answered." in logs
+    assert sum(chat_server.requests.values()) == ROWS - answered
+    output = pd.concat(pd.read_csv(path) for path in chunk_outputs(output_dir))
+    assert list(output['row_index']) == list(range(ROWS))
+    assert output['sentiment'].notna().all()
@@ -0,0 +1,107 @@
+"""API key pool: cooldowns for rate-limited and rejected keys, and a healthy key carrying the run."""
+import asyncio
+import glob
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from conftest import make_runner, store_api_keys, update_model, write_articles
+from modules.llmRunner.key_pool import (
+    AUTH_ERROR_COOLDOWN, MAX_RATE_LIMIT_COOLDOWN, RATE_LIMIT_COOLDOWN, ApiKeyPool, PooledKey
+)
+from modules.llmRunner.rate_limiter import RateLimiter
+
+RETRY_AFTER = 30
+ROWS = 30
+
+
+def test_rate_limited_key_is_rotated_out(app_dir, chat_server):
+    def responder(body, api_key):
+        if api_key == 'key-a':
+            return 429, "Rate limit reached for requests", {'Retry-After': str(RETRY_AFTER)}
+        return 200, '{"date": "2020-01-01", "sentiment": 0.3, "reliability": 0.5, "relevance": [], ' \
+                    '"prediction": []}', {}
+
+    chat_server.responder = responder
+    store_api_keys(app_dir, {'a': 'key-a', 'b': 'key-b'})
+    update_model(app_dir, 'base', api_key_name='a,b', base_url=chat_server.base_url)
+    write_articles(app_dir / 'in', ROWS)
+    logs = []
+    started = time.monotonic()
+    make_runner(app_dir / 'in', app_dir / 'out', logs, use_cache=False).run()
+    elapsed = time.monotonic() - started
+
+    assert "LLM Runner completed successfully." in logs
+    # The client does not sit out the Retry-After on its own; the pool sends the rows to the other key
+    assert elapsed < RETRY_AFTER / 2
+    # Only requests sent before the first 429 came back reach the limited key
+    assert chat_server.requests['key-a'] <= 4
+    assert chat_server.requests['key-b'] >= ROWS
+    assert any("API key 'a' taken out of rotation" in message for message in logs)
+    output = pd.concat(pd.read_csv(path) for path in glob.glob(str(app_dir / 'out' / '*.csv')))
+    assert len(output) == ROWS
+    assert 'error' not in output or output['error'].isna().all()
+
+
+class ProviderError(Exception):
+    """An error response as the OpenAI client raises it."""
+
+    def __init__(self, status_code: int, headers=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def make_pool(*names):
+    notes = []
+    pool = ApiKeyPool([PooledKey(name, None, RateLimiter()) for name in names], notify=notes.append)
+    return pool, notes
+
+
+def test_retry_after_sets_the_cooldown():
+    pool, notes = make_pool('a', 'b')
+    key = asyncio.run(pool.acquire(0))
+    pool.release(key, ProviderError(429, {'retry-after-ms': '12000'}))
+
+    assert key.cooling_seconds() == pytest.approx(12, abs=0.5)
+    assert notes == ["API key 'a' taken out of rotation for 12s (rate_limited)."]
+    # Requests go to the other key meanwhile
+    assert asyncio.run(pool.acquire(0)).name == 'b'
+
+
+def test_cooldown_doubles_per_consecutive_rate_limit_until_a_success():
+    pool, _ = make_pool('a')
+    key = pool.keys[0]
+    cooldowns = []
+    for _ in range(7):
+        key.in_flight += 1
+        key.available_at = 0.0
+        pool.release(key, ProviderError(429))
+        cooldowns.append(round(key.cooling_seconds()))
+    assert cooldowns == [RATE_LIMIT_COOLDOWN * 2 ** n for n in range(5)] + [MAX_RATE_LIMIT_COOLDOWN] * 2
+
+    key.in_flight += 1
+    pool.release(key)
+    assert key.consecutive_rate_limits == 0
+
+
+def test_other_errors_leave_the_key_in_rotation():
+    pool, notes = make_pool('a')
+    key = asyncio.run(pool.acquire(0))
+    pool.release(key, ProviderError(500))
+    assert key.cooling_seconds() == 0
+    assert (key.in_flight, key.failures, notes) == (0, 1, [])
+
+
+def test_rejected_keys_sit_out_and_a_fully_rejected_pool_fails():
+    pool, _ = make_pool('a', 'b')
+    for key in pool.keys:
+        key.in_flight += 1
+        pool.release(key, ProviderError(401))
+        assert key.rejected
+        assert key.cooling_seconds() == pytest.approx(AUTH_ERROR_COOLDOWN, abs=1)
+
+    with pytest.raises(RuntimeError, match="Every API key in the pool was rejected"):
+        asyncio.run(pool.acquire(0))
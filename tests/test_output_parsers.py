@@ -0,0 +1,82 @@
+"""AnalysisDictParser: malformed responses repaired locally, unrecoverable ones rejected."""
+import pytest
+from langchain_core.exceptions import OutputParserException
+
+from modules.llmRunner.output_parsers import AnalysisDictParser, extract_outermost_dict
+
+EXPECTED = {
+    'date': '2020-01-02',
+    'sentiment': 0.5,
+    'reliability': 0.8,
+    'relevance': {'AAPL': 0.9},
+    'prediction': {'AAPL': 0.2},
+}
+CLEAN = "{'date': '2020-01-02', 'sentiment': 0.5, 'reliability': 0.8, 'relevance': {'AAPL': 0.9}, " \
+        "'prediction': {'AAPL': 0.2}}"
+
+
+@pytest.mark.parametrize('text', [
+    CLEAN,
+    '{"date": "2020-01-02", "sentiment": 0.5, "reliability": 0.8, "relevance": {"AAPL": 0.9}, '
+    '"prediction": {"AAPL": 0.2}}',
+    f"```python\n{CLEAN}\n```",
+    f"Here is the analysis:\n{CLEAN}\nLet me know if you need more.",
+    CLEAN.replace("'", '“', 1).replace("'", '”', 1),
+])
+def test_well_formed_responses_parse_without_repair(text):
+    parser = AnalysisDictParser()
+    assert parser.parse(text) == EXPECTED
+    assert parser.repaired == 0
+
+
+@pytest.mark.parametrize('text', [
+    # JSON literals next to Python ones
+    "{'date': '2020-01-02', 'sentiment': 0.5, 'reliability': 0.8, 'relevance': {'AAPL': 0.9}, "
+    "'prediction': {'AAPL': 0.2}, 'verified': true}",
+    # JSON with trailing commas
+    '{"date": "2020-01-02", "sentiment": 0.5, "reliability": 0.8, "relevance": {"AAPL": 0.9,}, '
+    '"prediction": {"AAPL": 0.2}, "verified": false,}',
+    # Bare keys
+    "{date: '2020-01-02', sentiment: 0.5, reliability: 0.8, relevance: {'AAPL': 0.9}, prediction: {'AAPL': 0.2}}",
+    # Keys missing their closing quote
+    "{'date: '2020-01-02', 'sentiment: 0.5, 'reliability': 0.8, 'relevance': {'AAPL': 0.9}, "
+    "'prediction': {'AAPL': 0.2}}",
+    # The date interpolated unquoted from the prompt
+    "{'date': 2020-01-02, 'sentiment': 0.5, 'reliability': 0.8, 'relevance': {'AAPL': 0.9}, "
+    "'prediction': {'AAPL': 0.2}}",
+])
+def test_malformed_responses_are_repaired_locally(text):
+    parser = AnalysisDictParser()
+    assert parser.parse(text) == EXPECTED
+    assert parser.repaired == 1
+
+
+def test_output_cut_off_before_the_closing_braces_is_closed():
+    assert extract_outermost_dict("{'a': {'b': 1}") == "{'a': {'b': 1}}"
+    parser = AnalysisDictParser()
+    assert parser.parse(CLEAN[:-2])['relevance'] == {'AAPL': 0.9}
+
+
+def test_braces_inside_strings_do_not_end_the_dictionary():
+    assert extract_outermost_dict("{'a': '}', 'b': 1} trailing }") == "{'a': '}', 'b': 1}"
+
+
+def test_scores_are_clamped_and_tickers_normalised():
+    parsed = AnalysisDictParser().parse(
+        "{'sentiment': '1.7', 'reliability': -2, 'relevance': {' aapl ': 3}, 'prediction': None}"
+    )
+    assert parsed == {'date': '', 'sentiment': 1.0, 'reliability': 0.0, 'relevance': {'AAPL': 1.0},
+                      'prediction': {}}
+
+
+@pytest.mark.parametrize('text', [
+    "I cannot rate this article.",
+    "['not', 'a', 'dict']",
+    "{'reliability': 0.8}",
+    "{'sentiment': 'very positive'}",
+    "{'sentiment': 0.5, 'relevance': 'AAPL'}",
+    "{'sentiment': 0.5, 'relevance': {'AAPL': 0.9]]}",
+])
+def test_unrecoverable_responses_are_rejected(text):
+    with pytest.raises(OutputParserException):
+        AnalysisDictParser().parse(text)
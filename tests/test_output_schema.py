@@ -0,0 +1,77 @@
+"""Prompt output schemas: strict response formats, schema checks, and score dicts accepted as lists."""
+import json
+import os
+
+import pytest
+from langchain_core.exceptions import OutputParserException
+
+from conftest import REPO_DIR, analysis_content, make_runner, store_api_keys, update_model, write_articles
+from modules.llmRunner.output_parsers import (
+    AnalysisDictParser, is_strict_schema, schema_response_format, validate_against_schema
+)
+
+with open(os.path.join(REPO_DIR, 'data', 'prompts.json'), 'r', encoding='utf-8') as f:
+    SCHEMA = json.load(f)['base_prompt']['output_schema']
+
+
+def test_stored_schema_is_strict():
+    assert schema_response_format('base_prompt', SCHEMA) == {
+        'type': 'json_schema',
+        'json_schema': {'name': 'base_prompt', 'schema': SCHEMA, 'strict': True},
+    }
+
+
+def test_open_or_partly_required_objects_are_not_strict():
+    closed = {'type': 'object', 'properties': {'a': {'type': 'number'}}, 'required': ['a'],
+              'additionalProperties': False}
+    assert is_strict_schema(closed)
+    assert not is_strict_schema({**closed, 'additionalProperties': True})
+    assert not is_strict_schema({**closed, 'required': []})
+    assert not is_strict_schema({'type': 'array', 'items': {**closed, 'required': []}})
+
+
+@pytest.mark.parametrize('value, message', [
+    ({'sentiment': 0.5}, "$ is missing 'date'"),
+    ({'date': '', 'sentiment': True, 'reliability': 1, 'relevance': [], 'prediction': []},
+     "$.sentiment should be number, got bool"),
+    ({'date': '', 'sentiment': 0.5, 'reliability': 1, 'relevance': [{'ticker': 'AAPL'}], 'prediction': []},
+     "$.relevance[0] is missing 'score'"),
+])
+def test_responses_that_break_the_schema_are_rejected(value, message):
+    with pytest.raises(OutputParserException, match=message.replace('$', r'\$').replace('[', r'\[')):
+        validate_against_schema(value, SCHEMA)
+
+
+def test_score_lists_and_score_dicts_parse_alike():
+    parser = AnalysisDictParser(response_schema=SCHEMA)
+    as_lists = parser.parse(json.dumps({
+        'date': '2020-01-02', 'sentiment': 0.5, 'reliability': 0.8,
+        'relevance': [{'ticker': 'AAPL', 'score': 0.9}], 'prediction': [{'ticker': 'AAPL', 'score': 0.2}],
+    }))
+    as_dicts = parser.parse(json.dumps({
+        'date': '2020-01-02', 'sentiment': 0.5, 'reliability': 0.8,
+        'relevance': {'AAPL': 0.9}, 'prediction': {'AAPL': 0.2},
+    }))
+    assert as_lists == as_dicts
+    assert as_lists['relevance'] == {'AAPL': 0.9}
+
+
+def test_requests_carry_the_prompt_schema(app_dir, chat_server):
+    formats = []
+
+    def responder(body, api_key):
+        formats.append(body.get('response_format'))
+        return 200, analysis_content(body), {}
+
+    chat_server.responder = responder
+    store_api_keys(app_dir, {'test': 'key-test'})
+    update_model(app_dir, 'base', api_key_name='test', base_url=chat_server.base_url)
+    write_articles(app_dir / 'in', 2)
+    logs = []
+    make_runner(app_dir / 'in', app_dir / 'out', logs, use_cache=False).run()
+
+    assert "LLM Runner completed successfully." in logs
+    assert len(formats) == 2
+    assert all(response_format['type'] == 'json_schema' for response_format in formats)
+    assert formats[0]['json_schema']['schema'] == SCHEMA
+    assert formats[0]['json_schema']['strict'] is True
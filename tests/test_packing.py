@@ -0,0 +1,105 @@
+"""Multi-row packing: several short rows per request, split back to rows or sent alone when misaligned."""
+import glob
+import json
+import re
+
+import pandas as pd
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from conftest import analysis_content, make_runner, store_api_keys, update_model, write_articles
+from modules.llmRunner.packing import PackMismatch, pack_messages, pack_schema, unpack_results
+
+ROWS = 10
+PACK_SIZE = 4
+
+
+def result(index, sentiment):
+    return {'index': index, 'sentiment': sentiment}
+
+
+def test_rows_are_packed_as_numbered_records_under_one_system_message():
+    rows = [[SystemMessage(content="Rate the text."), HumanMessage(content=f"Text {index}")] for index in range(3)]
+    system, user = pack_messages(rows)
+    assert system.content.startswith("Rate the text.\n\n### Multiple Records\nThe user message holds 3 records")
+    assert user.content == "=== RECORD 1 ===\nText 0\n\n=== RECORD 2 ===\nText 1\n\n=== RECORD 3 ===\nText 2"
+
+
+def test_pack_schema_wraps_the_prompt_schema_with_an_index():
+    schema = {'type': 'object', 'properties': {'sentiment': {'type': 'number'}}, 'required': ['sentiment'],
+              'additionalProperties': False}
+    item = pack_schema(schema)['properties']['results']['items']
+    assert list(item['properties']) == ['index', 'sentiment']
+    assert item['required'] == ['index', 'sentiment']
+    assert item['additionalProperties'] is False
+
+
+def test_results_are_returned_in_record_order():
+    text = json.dumps({'results': [result(2, 0.2), result(1, 0.1), result(3, 0.3)]})
+    assert unpack_results(text, 3) == [{'sentiment': 0.1}, {'sentiment': 0.2}, {'sentiment': 0.3}]
+    # Results without an index are taken in order
+    assert unpack_results(f"```json\n{json.dumps([{'sentiment': 0.1}])}\n```", 1) == [{'sentiment': 0.1}]
+
+
+@pytest.mark.parametrize('text', [
+    "not json",
+    json.dumps({'answer': 1}),
+    json.dumps({'results': [result(1, 0.1), 'text']}),
+    json.dumps({'results': [result(1, 0.1)]}),
+    json.dumps({'results': [result(1, 0.1), result(1, 0.2)]}),
+    json.dumps({'results': [result(1, 0.1), result(3, 0.2)]}),
+    json.dumps({'results': [result(1, 0.1), result('2', 0.2)]}),
+])
+def test_misaligned_results_are_rejected(text):
+    with pytest.raises(PackMismatch):
+        unpack_results(text, 2)
+
+
+def run_packed(app_dir, chat_server, drop_last_result: bool = False):
+    requests = []
+
+    def responder(body, api_key):
+        content = body['messages'][-1]['content']
+        articles = [int(number) for number in re.findall(r"Body of article (\d+)", content)]
+        requests.append(articles)
+        if len(articles) == 1:
+            return 200, analysis_content(body), {}
+        results = [{**json.loads(analysis_content(body)), 'index': index, 'sentiment': article / 100}
+                   for index, article in enumerate(articles, start=1)]
+        if drop_last_result:
+            results = results[:-1]
+        return 200, json.dumps({'results': results}), {}
+
+    chat_server.responder = responder
+    store_api_keys(app_dir, {'test': 'key-test'})
+    update_model(app_dir, 'base', api_key_name='test', base_url=chat_server.base_url)
+    chains_path = app_dir / 'data' / 'chains.json'
+    chains = json.loads(chains_path.read_text())
+    chains['base_chain']['pack_size'] = PACK_SIZE
+    chains_path.write_text(json.dumps(chains))
+    write_articles(app_dir / 'in', ROWS)
+    logs = []
+    make_runner(app_dir / 'in', app_dir / 'out', logs, use_cache=False).run()
+    assert "LLM Runner completed successfully." in logs
+    output = pd.concat(pd.read_csv(path) for path in sorted(glob.glob(str(app_dir / 'out' / '*_processed.csv'))))
+    return requests, logs, output
+
+
+def test_packed_rows_are_split_back_to_their_own_rows(app_dir, chat_server):
+    requests, logs, output = run_packed(app_dir, chat_server)
+
+    assert sorted(len(articles) for articles in requests) == [2, 4, 4]
+    assert "Packing sent 10 rows in 3 requests; 0 rows fell back to single requests." in logs
+    assert list(output['row_index']) == list(range(ROWS))
+    assert list(output['sentiment']) == [row / 100 for row in range(ROWS)]
+
+
+def test_rows_of_a_misaligned_pack_are_sent_alone(app_dir, chat_server):
+    requests, logs, output = run_packed(app_dir, chat_server, drop_last_result=True)
+
+    assert sum(len(articles) > 1 for articles in requests) == 3
+    assert sorted(articles[0] for articles in requests if len(articles) == 1) == list(range(ROWS))
+    assert "Packing sent 0 rows in 0 requests; 10 rows fell back to single requests." in logs
+    assert list(output['row_index']) == list(range(ROWS))
+    assert output['sentiment'].notna().all()
+    assert 'error' not in output.columns
@@ -0,0 +1,68 @@
+"""Per-key input preprocessing: markup, whitespace, boilerplate, truncation and empty values."""
+import pandas as pd
+import pytest
+
+from modules.llmRunner.preprocessing import InputPreprocessor, KeyPreprocessor, compact_whitespace, strip_markup
+from modules.llmRunner.token_budget import TokenCounter
+
+
+@pytest.fixture
+def counter():
+    counter = TokenCounter('gpt-4o-mini')
+    # Character estimates keep the expected cuts independent of the tokenizer
+    counter.encoding = None
+    return counter
+
+
+def test_strip_markup_removes_tags_scripts_and_entities():
+    text = '<div><h1>Title</h1><p>First &amp; <b>bold</b></p><script>var x = 1;</script><!-- note -->Last</div>'
+    assert compact_whitespace(strip_markup(text)) == "Title\nFirst & bold\nLast"
+
+
+def test_strip_markup_keeps_angle_brackets_in_text():
+    text = "Revenue < 5% of sales, margin > 2% and x<y, but <br/>a tag"
+    assert compact_whitespace(strip_markup(text)) == "Revenue < 5% of sales, margin > 2% and x<y, but\na tag"
+
+
+def test_compact_whitespace_keeps_one_blank_line_between_paragraphs():
+    assert compact_whitespace("  a \t b \n\n\n\n c  d \n") == "a b\n\nc d"
+
+
+def test_boilerplate_lines_are_dropped():
+    key = KeyPreprocessor('body', {'boilerplate': ['^\\[deleted\\]$', '^Advertisement$']})
+    assert key.clean("[deleted]\nText\nadvertisement\nMore") == "Text\nMore"
+
+
+TEXT = ''.join(chr(ord('a') + index % 26) for index in range(100))
+
+
+@pytest.mark.parametrize('mode, expected', [
+    # The character estimate takes four characters per token
+    ('head', TEXT[:40] + ' [...]'),
+    ('tail', '[...] ' + TEXT[-40:]),
+    ('head_tail', TEXT[:20] + ' [...] ' + TEXT[-20:]),
+])
+def test_truncation_keeps_the_configured_end(counter, mode, expected):
+    key = KeyPreprocessor('body', {'max_tokens': 10, 'truncate': mode})
+    assert key.cut(TEXT, counter) == expected
+    assert key.cut(TEXT[:30], counter) == TEXT[:30]
+
+
+def test_unknown_options_and_keys_are_rejected(counter):
+    with pytest.raises(ValueError):
+        KeyPreprocessor('body', {'strip_html': True})
+    with pytest.raises(ValueError):
+        KeyPreprocessor('body', {'max_tokens': 10, 'truncate': 'middle'})
+    with pytest.raises(ValueError):
+        InputPreprocessor({'missing': {'compact_whitespace': True}}, ['body'], counter)
+
+
+def test_process_cleans_configured_columns_and_counts_saved_tokens(counter):
+    preprocessor = InputPreprocessor({'body': {'strip_markup': True, 'compact_whitespace': True,
+                                               'elide_empty': True}}, ['body', 'title'], counter)
+    batch = pd.DataFrame({'body': ['<p>Hello    world</p>' + ' ' * 40, 'nan'], 'title': ['<b>x</b>', 'y']})
+    processed, saved = preprocessor.process(batch)
+    assert list(processed['body']) == ['Hello world', '']
+    assert list(processed['title']) == ['<b>x</b>', 'y']
+    assert saved[0] > 0
+    assert preprocessor.elided_keys == {'body'}
@@ -0,0 +1,72 @@
+"""Cache-friendly prompt layout: one shared system message per run, and cached input tokens reported."""
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from conftest import make_runner, store_api_keys, update_model, write_articles
+from modules.llmRunner.async_engine import TokenUsage
+from modules.llmRunner.prompt_renderer import PromptRenderer
+
+ROWS = pd.DataFrame({'Date': ['2020-01-01', '2020-01-02'], 'Article': ['First', 'Second']})
+
+
+def test_row_variables_move_from_the_system_prompt_to_the_user_message():
+    renderer = PromptRenderer("Rate the text written on {Date}.", "### Article\n{Article}", ['Date', 'Article'],
+                              cache_friendly=True)
+    first, second = renderer.render_batch(ROWS)
+
+    assert renderer.moved_fields == ['Date']
+    assert first[0] is second[0]
+    assert first[0].content == ("Rate the text written on <Date>.\n\n"
+                                "Values written as <Name> above are given in the user message.")
+    assert first[1].content == "### Date\n2020-01-01\n\n### Article\nFirst"
+
+
+def test_values_the_user_message_already_shows_are_not_repeated():
+    renderer = PromptRenderer("Rate the text written on {Date}.", "{Date}: {Article}", ['Date', 'Article'],
+                              cache_friendly=True)
+    assert renderer.render_batch(ROWS)[1][1].content == "2020-01-02: Second"
+
+
+def test_without_the_layout_every_row_has_its_own_system_message():
+    renderer = PromptRenderer("Rate the text written on {Date}.", "{Article}", ['Date', 'Article'])
+    first, second = renderer.render_batch(ROWS)
+
+    assert renderer.system_row_fields == ['Date'] and renderer.moved_fields == []
+    assert [first[0].content, second[0].content] == ["Rate the text written on 2020-01-01.",
+                                                     "Rate the text written on 2020-01-02."]
+
+
+def test_usage_counts_cached_input_tokens():
+    usage = TokenUsage()
+    usage.add_message(AIMessage(content='', usage_metadata={
+        'input_tokens': 150, 'output_tokens': 10, 'total_tokens': 160, 'input_token_details': {'cache_read': 120},
+    }))
+    usage.add_message(AIMessage(content='', usage_metadata={'input_tokens': 50, 'output_tokens': 10,
+                                                            'total_tokens': 60}))
+    usage.add_message(AIMessage(content=''))
+
+    assert usage.responses == 2
+    assert usage.describe() == "input tokens 200 (60% cached), output tokens 20"
+
+
+def test_stored_prompt_shares_its_system_message_and_reports_cached_tokens(app_dir, chat_server):
+    system_messages = set()
+
+    def responder(body, api_key):
+        system_messages.add(body['messages'][0]['content'])
+        return 200, '{"date": "", "sentiment": 0.1, "reliability": 0.5, "relevance": [], "prediction": []}', {}
+
+    chat_server.responder = responder
+    chat_server.usage = {'prompt_tokens': 1000, 'completion_tokens': 20, 'total_tokens': 1020,
+                         'prompt_tokens_details': {'cached_tokens': 900}}
+    store_api_keys(app_dir, {'test': 'key-test'})
+    update_model(app_dir, 'base', api_key_name='test', base_url=chat_server.base_url)
+    write_articles(app_dir / 'in', 5)
+    logs = []
+    make_runner(app_dir / 'in', app_dir / 'out', logs, use_cache=False).run()
+
+    assert "LLM Runner completed successfully." in logs
+    assert "Cache-friendly layout: moved Date from the system prompt to the user message" in logs
+    assert len(system_messages) == 1
+    assert '2020-01-0' not in system_messages.pop()
+    assert "Provider-reported usage: input tokens 5000 (90% cached), output tokens 100" in logs
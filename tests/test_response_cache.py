@@ -0,0 +1,74 @@
+"""Response cache keys and storage, and collapsing of identical requests in flight."""
+import asyncio
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from conftest import FakeChain, make_engine
+from modules.llmRunner.response_cache import ResponseCache, cache_key
+
+MESSAGES = [SystemMessage(content="Rate the text."), HumanMessage(content="Shares rose 5%.")]
+
+
+def test_cache_key_follows_model_parameters_and_messages():
+    model = {'type': 'gpt-4o-mini', 'api_key_name': 'a', 'rpm': 100}
+    key = cache_key(model, MESSAGES)
+    # Settings that do not change the response share the key
+    assert cache_key({'type': 'gpt-4o-mini', 'api_key_name': 'b'}, MESSAGES) == key
+    assert cache_key({'type': 'gpt-4o'}, MESSAGES) != key
+    assert cache_key({**model, 'temperature': 0.5}, MESSAGES) != key
+    assert cache_key(model, [MESSAGES[0], HumanMessage(content="Shares fell 5%.")]) != key
+    # The same text in another role is another request
+    assert cache_key(model, [SystemMessage(content="Rate the text."), SystemMessage(content="Shares rose 5%.")]) != key
+
+
+def test_cache_stores_responses_with_their_model(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    assert cache.get('key') is None
+    cache.put('key', 'response', 'base')
+    cache.close()
+
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    assert cache.get('key') == ('response', 'base')
+    assert (cache.hits, cache.misses) == (1, 0)
+    cache.close()
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), max_bytes=300)
+    for index in range(3):
+        cache.put(f"key-{index}", 'x' * 90)
+    cache.get('key-0')
+    cache.put('key-3', 'x' * 90)
+    assert cache.get('key-1') is None
+    assert cache.get('key-0') is not None
+    assert cache.total_bytes <= 300
+    cache.close()
+
+
+def test_cached_response_is_not_sent_again(tmp_path):
+    chain = FakeChain()
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    engine = make_engine({'base': [chain]}, cache=cache)
+
+    first = asyncio.run(engine.invoke(MESSAGES))
+    second = asyncio.run(engine.invoke(MESSAGES))
+    assert first == second
+    assert chain.calls == 1
+    # A refresh skips the cached copy
+    asyncio.run(engine.invoke(MESSAGES, refresh=True))
+    assert chain.calls == 2
+    cache.close()
+
+
+def test_identical_requests_in_flight_share_one_call_without_a_cache():
+    chain = FakeChain(delay=0.05)
+    engine = make_engine({'base': [chain]})
+
+    async def scenario():
+        return await asyncio.gather(*(engine.invoke(MESSAGES) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert chain.calls == 1
+    assert engine.collapsed == 4
+    assert all(result == results[0] for result in results)
+    assert engine.pending == {}
@@ -0,0 +1,46 @@
+"""Per-row failure isolation: a failing row is retried on its own and never holds up or fails its chunk."""
+import glob
+import re
+
+import pandas as pd
+
+import modules.llmRunner.llm_runner_thread as llm_runner_thread
+from conftest import analysis_content, make_runner, store_api_keys, update_model, write_articles
+
+ROWS = 20
+
+
+def test_failing_rows_are_retried_alone_and_keep_their_place(app_dir, chat_server, monkeypatch):
+    monkeypatch.setattr(llm_runner_thread, 'RETRY_BASE_DELAY', 0.01)
+    attempts = {}
+
+    def responder(body, api_key):
+        article = re.search(r"Body of article (\d+)", body['messages'][-1]['content']).group(1)
+        attempts[article] = attempts.get(article, 0) + 1
+        # Article 3 always fails, article 7 only on its first attempt
+        if article == '3' or (article == '7' and attempts[article] == 1):
+            return 500, "The server had an error while processing your request.", {}
+        return 200, analysis_content(body), {}
+
+    chat_server.responder = responder
+    store_api_keys(app_dir, {'test': 'key-test'})
+    update_model(app_dir, 'base', api_key_name='test', base_url=chat_server.base_url)
+    write_articles(app_dir / 'in', ROWS)
+    logs = []
+    make_runner(app_dir / 'in', app_dir / 'out', logs, batch_size=10, use_cache=False).run()
+
+    assert "LLM Runner completed successfully." in logs
+    assert attempts['3'] == llm_runner_thread.MAX_RETRIES
+    assert attempts['7'] == 2
+    assert all(count == 1 for article, count in attempts.items() if article not in ('3', '7'))
+    output = pd.concat(pd.read_csv(path) for path in sorted(glob.glob(str(app_dir / 'out' / '*_processed.csv'))))
+    assert list(output['row_index']) == list(range(ROWS))
+    failed = output[output['error'].notna()]
+    assert list(failed['row_index']) == [3]
+    assert output[output['error'].isna()]['sentiment'].notna().all()
+
+    # The failed row is the only one sent again by the next run
+    attempts.clear()
+    logs = []
+    make_runner(app_dir / 'in', app_dir / 'out', logs, batch_size=10, use_cache=False).run()
+    assert attempts == {'3': llm_runner_thread.MAX_RETRIES}
@@ -0,0 +1,105 @@
+"""Model failover: circuit breakers take failing models out of rotation and probe them back in."""
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+import modules.llmRunner.key_pool as key_pool
+from conftest import FakeChain, analysis_content, make_engine
+from modules.llmRunner.routing import BREAKER_MIN_REQUESTS, CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def test_breaker_opens_on_errors_and_closes_after_a_good_probe():
+    breaker = CircuitBreaker(open_seconds=0.05)
+    for index in range(BREAKER_MIN_REQUESTS - 1):
+        assert breaker.record(index % 2 == 0, 0.1) is None
+    assert breaker.record(False, 0.1) == OPEN
+    assert not breaker.allows()
+
+    time.sleep(0.06)
+    assert breaker.allows()
+    assert breaker.state == HALF_OPEN
+    breaker.start()
+    # Only the probe goes out while the breaker is half-open
+    assert not breaker.allows()
+    assert breaker.record(True, 0.1) == CLOSED
+    assert breaker.allows()
+
+
+def test_failed_or_abandoned_probes():
+    breaker = CircuitBreaker(open_seconds=0.05)
+    breaker._open("test")
+    time.sleep(0.06)
+    breaker.allows()
+    breaker.start()
+    breaker.abandon()
+    assert breaker.allows()
+    breaker.start()
+    assert breaker.record(False, 0.1) == OPEN
+    assert breaker.reason == "probe request failed"
+
+
+def test_slow_model_trips_its_breaker():
+    breaker = CircuitBreaker(max_latency=1.0)
+    changes = [breaker.record(True, 2.0) for _ in range(BREAKER_MIN_REQUESTS)]
+    assert changes[-1] == OPEN
+    assert breaker.reason.startswith("median latency 2.0s")
+
+
+def test_requests_fail_over_and_return_to_the_primary():
+    healthy = {'primary': False}
+
+    def primary_responder(messages):
+        if not healthy['primary']:
+            raise RuntimeError("Error code: 500")
+        return analysis_content({})
+
+    primary, fallback = FakeChain(primary_responder), FakeChain()
+    notes = []
+    engine = make_engine({'primary': [primary], 'fallback': [fallback]})
+    engine.router.notify = notes.append
+    engine.router.routes[0].breaker.open_seconds = 0.05
+
+    async def send(index):
+        try:
+            return (await engine.invoke([HumanMessage(content=f"Row {index}")]))[1]
+        except RuntimeError:
+            return None
+
+    async def scenario():
+        models = [await send(index) for index in range(BREAKER_MIN_REQUESTS + 3)]
+        healthy['primary'] = True
+        await asyncio.sleep(0.06)
+        models.append(await send('probe'))
+        return models
+
+    models = asyncio.run(scenario())
+    assert models == [None] * BREAKER_MIN_REQUESTS + ['fallback'] * 3 + ['primary']
+    assert primary.calls == BREAKER_MIN_REQUESTS + 1
+    assert notes[0].startswith("Model 'primary' taken out of rotation (error rate 100%")
+    assert notes[0].endswith("routing to 'fallback'.")
+    assert notes[-1] == "Model 'primary' is healthy again."
+
+
+def test_rate_limits_do_not_trip_the_breaker(monkeypatch):
+    monkeypatch.setattr(key_pool, 'RATE_LIMIT_COOLDOWN', 0)
+
+    def rate_limited(messages):
+        raise RuntimeError("Error code: 429 - rate limit")
+
+    engine = make_engine({'base': [FakeChain(rate_limited)]})
+    route = engine.router.routes[0]
+    for index in range(BREAKER_MIN_REQUESTS + 1):
+        with pytest.raises(RuntimeError):
+            asyncio.run(engine.invoke([HumanMessage(content=f"Row {index}")]))
+    assert route.breaker.state == CLOSED
+
+
+def test_requests_skip_models_whose_context_window_is_too_small():
+    small, large = FakeChain(), FakeChain()
+    engine = make_engine({'small': [small], 'large': [large]})
+    engine.router.routes[0].context_window = 1000
+    result, model_name = asyncio.run(engine.invoke([HumanMessage(content="x" * 8000)]))
+    assert model_name == 'large'
+    assert small.calls == 0